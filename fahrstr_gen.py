@@ -1,20 +1,26 @@
 #!/usr/bin/env python3
 
 from fahrstr_gen import modulverwaltung
+from fahrstr_gen import modulcache
 from fahrstr_gen.konstanten import *
-from fahrstr_gen.strecke import ist_fahrstr_start_sig
-from fahrstr_gen.fahrstr_suche import FahrstrassenSuche
+from fahrstr_gen.strecke import ist_fahrstr_start_sig, writeuglyxml, zwischenspeicher_log
+from fahrstr_gen.fahrstr_suche import FahrstrassenSuche, Bedingung
 from fahrstr_gen.fahrstr_graph import FahrstrGraph
+from fahrstr_gen.fahrstrasse import fahrstrasse_aus_daten
+from fahrstr_gen.segment_graph import SegmentGraph
 from fahrstr_gen.vorsignal_graph import VorsignalGraph
 from fahrstr_gen.flankenschutz_graph import FlankenschutzGraph
 
-import xml.etree.ElementTree as ET
+from fahrstr_gen.xmlbackend import ET
 import argparse
+import multiprocessing
 import operator
 import os
 import re
 import sys
+import tempfile
 from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
 
 import logging
 import tkinter
@@ -25,6 +31,8 @@ import tkinter.ttk
 logging.COMPAT = 15
 logging.addLevelName(logging.COMPAT, 'COMPAT')
 
+LOG_FORMAT = '%(relativeCreated)d:%(levelname)s:%(message)s'
+
 def refpunkt_fmt(refpunkt, print_signal=False):
     pfad = refpunkt[1]
     normpath = modulverwaltung.normalize_zusi_relpath(pfad)
@@ -77,9 +85,14 @@ def fahrstr_sort_key(fahrstrasse):
         return (nat_sort_key(fahrstrasse.start.signal().signalbeschreibung()), [])
 
 def finde_fahrstrassenkonfig(alte_args):
-    neue_args = namedtuple('args', ['dateiname', 'modus', 'alternative_fahrwege', 'bedingungen', 'flankenschutz', 'fahrstr_typen', 'keine_alternative_fahrwege', 'kein_flankenschutz'])
+    neue_args = namedtuple('args', ['dateiname', 'modus', 'alternative_fahrwege', 'bedingungen', 'flankenschutz', 'fahrstr_typen', 'keine_alternative_fahrwege', 'kein_flankenschutz', 'vorladen_tiefe', 'modulcache', 'cache_verzeichnis', 'jobs', 'max_fahrstrassen'])
     neue_args.dateiname = alte_args.dateiname
     neue_args.modus = alte_args.modus
+    neue_args.vorladen_tiefe = alte_args.vorladen_tiefe
+    neue_args.modulcache = alte_args.modulcache
+    neue_args.cache_verzeichnis = alte_args.cache_verzeichnis
+    neue_args.jobs = alte_args.jobs
+    neue_args.max_fahrstrassen = alte_args.max_fahrstrassen
     if alte_args.bedingungen is None and os.path.exists(alte_args.dateiname.replace(".st3", ".fahrstr_gen.xml")):
         neue_args.bedingungen = alte_args.dateiname.replace(".st3", ".fahrstr_gen.xml")
     elif alte_args.bedingungen == "" or alte_args.dateiname == "null":
@@ -111,42 +124,49 @@ def finde_fahrstrassenkonfig(alte_args):
     
     return neue_args
 
-def finde_fahrstrassen(args):
+def lade_module(args):
     modulverwaltung.module = dict()
     modulverwaltung.dieses_modul = None
+    modulverwaltung.cache_verzeichnis = None if args.modulcache == 'aus' else (args.cache_verzeichnis or modulcache.standard_verzeichnis())
+    modulverwaltung.cache_neu_aufbauen = (args.modulcache == 'neu')
 
     dieses_modul_relpath = modulverwaltung.get_zusi_relpath(os.path.realpath(args.dateiname))
-    modulverwaltung.dieses_modul = modulverwaltung.get_modul_by_name(dieses_modul_relpath, "")
+    modulverwaltung.dieses_modul = modulverwaltung.get_modul_by_name(dieses_modul_relpath, "", vollstaendig=True)
 
-    loeschfahrstrassen_namen = [n.get("FahrstrName", "") for n in modulverwaltung.dieses_modul.root.findall("./Strecke/LoeschFahrstrasse")]
+    modulverwaltung.lade_nachbarmodule(modulverwaltung.dieses_modul, args.vorladen_tiefe)
 
-    fahrstrassen = []
+# Legt fuer jeden Fahrstrassentyp eine Fahrstrassensuche samt Fahrstrassengraph an: Typ -> (FahrstrassenSuche, FahrstrGraph)
+def neue_fahrstrassensuchen(args, fahrstr_typen):
+    loeschfahrstrassen_namen = [n.get("FahrstrName", "") for n in modulverwaltung.dieses_modul.root.findall("./Strecke/LoeschFahrstrasse")]
 
     bedingungen = dict()
     if args.bedingungen is not None:
         for bedingung in ET.parse(args.bedingungen).getroot().findall("Bedingung"):
-            bedingungen[bedingung.attrib["EinzelFahrstrName"]] = bedingung
+            bedingungen[bedingung.attrib["EinzelFahrstrName"]] = Bedingung(bedingung)
 
     vorsignal_graph = VorsignalGraph()
     flankenschutz_graph = FlankenschutzGraph()
-
-    fahrstr_typen = []
-    for s in map(lambda s: s.lower().strip(), args.fahrstr_typen.split(",")):
-        if s.startswith("r"):
-            fahrstr_typen.append(FAHRSTR_TYP_RANGIER)
-        elif s.startswith("z"):
-            fahrstr_typen.append(FAHRSTR_TYP_ZUG)
-        elif (s.startswith("a") and s != "auto") or s.startswith("l"):
-            fahrstr_typen.append(FAHRSTR_TYP_ANZEIGE)
-
+    if args.flankenschutz and modulverwaltung.cache_verzeichnis is not None:
+        # Nur fuer Nachbarmodule, die nicht zurueckgeschrieben werden koennen: Die Tabelle eines zurueckgeschriebenen Moduls
+        # (v.a. dieses_modul im Modus "schreibe") waere beim naechsten Lauf ungueltig. Dort wird bei Bedarf einzeln gesucht.
+        flankenschutz_graph.lade_tabellen([m for m in modulverwaltung.module.values() if m is not None and not m.vollstaendig],
+                modulverwaltung.cache_verzeichnis, modulverwaltung.cache_neu_aufbauen)
+    segment_graph = SegmentGraph()  # von den Fahrstrassengraphen aller Typen gemeinsam benutzt
+
+    result = dict()
     for fahrstr_typ in fahrstr_typen:
-        logging.debug("Generiere Fahrstrassen vom Typ {}".format(str_fahrstr_typ(fahrstr_typ)))
         fahrstr_suche = FahrstrassenSuche(fahrstr_typ, args.alternative_fahrwege, bedingungen,
                 vorsignal_graph if fahrstr_typ in [FAHRSTR_TYP_ZUG, FAHRSTR_TYP_ANZEIGE] else None,
                 flankenschutz_graph if args.flankenschutz and (fahrstr_typ in [FAHRSTR_TYP_ZUG, FAHRSTR_TYP_ANZEIGE]) else None,
                 loeschfahrstrassen_namen)
-        graph = FahrstrGraph(fahrstr_typ)
+        result[fahrstr_typ] = (fahrstr_suche, FahrstrGraph(fahrstr_typ, segment_graph))
+    return result
 
+# Liefert die Startpunkte der Fahrstrassensuche in der Reihenfolge, in der die Fahrstrassen erzeugt werden:
+# [(Fahrstrassentyp, Elementnummer, Richtung)]
+def get_startpunkte(fahrstr_typen):
+    result = []
+    for fahrstr_typ in fahrstr_typen:
         for nr, str_element in sorted(modulverwaltung.dieses_modul.streckenelemente.items(), key=lambda t: t[0]):
             if str_element in modulverwaltung.dieses_modul.referenzpunkte:
                 for richtung in [NORM, GEGEN]:
@@ -155,22 +175,217 @@ def finde_fahrstrassen(args):
                             or (r.reftyp == REFTYP_SIGNAL and ist_fahrstr_start_sig(r.signal(), fahrstr_typ))
                             for r in modulverwaltung.dieses_modul.referenzpunkte[str_element] if r.element_richtung.richtung == richtung
                         ):
+                        result.append((fahrstr_typ, nr, richtung))
+    return result
+
+def suche_fahrstrassen(fahrstrassensuchen, startpunkt):
+    fahrstr_typ, nr, richtung = startpunkt
+    fahrstr_suche, graph = fahrstrassensuchen[fahrstr_typ]
+    knoten = graph.get_knoten(modulverwaltung.dieses_modul.streckenelemente[nr])
+    assert knoten is not None
+    return fahrstr_suche.get_fahrstrassen(knoten, richtung)
+
+# Parallele Fahrstrassensuche (Option --jobs): Die Startpunkte werden in Bloecken auf einen Prozesspool verteilt.
+# Jeder Prozess laedt die Module selbst (bzw. uebernimmt sie beim Start per fork) und liefert die Fahrstrassen
+# in der Darstellung von Fahrstrasse.zu_daten zurueck.
+# Erweitert die Suche eine Signalmatrix, haengen alle folgenden Ergebnisse von dieser Aenderung ab. Ab dem ersten
+# Startpunkt, bei dem das passiert, wird daher im Hauptprozess seriell weitergesucht, damit das Ergebnis (inklusive
+# der Zeilen- und Spaltennummern erweiterter Matrizen) identisch mit dem der seriellen Suche ist.
+_prozess_fahrstrassensuchen = None
+_prozess_log_puffer = None
+
+# Sammelt die Log-Meldungen eines Prozesses, damit der Hauptprozess sie in der Reihenfolge der Startpunkte ausgeben kann.
+# Meldungen beim Aufbau zwischengespeicherter Daten (Logger strecke.zwischenspeicher_log) werden pro Prozess durchgezaehlt
+# (Attribut "wiederholung"), damit der Hauptprozess die mehrfach aufgebauten verwerfen kann.
+class _LogPuffer(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+        self.anzahl = defaultdict(int)
+
+    def emit(self, record):
+        # Meldung vorab formatieren, damit der Record ohne die (evtl. nicht uebertragbaren) Argumente zurueckgegeben werden kann.
+        if record.exc_info:
+            self.format(record)  # setzt record.exc_text
+        record.msg = record.getMessage()
+        record.args = None
+        record.exc_info = None
+        if record.name == zwischenspeicher_log.name:
+            self.anzahl[(record.levelno, record.msg)] += 1
+            record.wiederholung = self.anzahl[(record.levelno, record.msg)]
+        self.records.append(record)
+
+    def entnehmen(self):
+        result, self.records = self.records, []
+        return result
+
+def _prozess_init(args, fahrstr_typen, log_level):
+    global _prozess_fahrstrassensuchen, _prozess_log_puffer
+    # Meldungen werden nicht direkt ausgegeben, sondern gepuffert. Meldungen beim Laden und Initialisieren
+    # hat der Hauptprozess bereits selbst ausgegeben, sie werden verworfen.
+    _prozess_log_puffer = _LogPuffer()
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(_prozess_log_puffer)
+    root_logger.setLevel(log_level)
+
+    if modulverwaltung.dieses_modul is None:
+        # Prozess wurde nicht per fork gestartet
+        lade_module(args)
+    _prozess_fahrstrassensuchen = neue_fahrstrassensuchen(args, fahrstr_typen)
+
+# Gibt pro Startpunkt die Fahrstrassen als Daten (oder None, wenn dabei ein Modul geaendert wurde)
+# zusammen mit den waehrenddessen erzeugten Log-Meldungen zurueck.
+def _prozess_suche_fahrstrassen(startpunkte):
+    result = []
+    _prozess_log_puffer.entnehmen()
+    for startpunkt in startpunkte:
+        if any(modul is not None and modul.geaendert for modul in modulverwaltung.module.values()):
+            result.append((None, []))
+            continue
+        fahrstrassen = suche_fahrstrassen(_prozess_fahrstrassensuchen, startpunkt)
+        geaendert = any(modul is not None and modul.geaendert for modul in modulverwaltung.module.values())
+        result.append((None if geaendert else [f.zu_daten() for f in fahrstrassen], _prozess_log_puffer.entnehmen()))
+    return result
+
+# Sucht die Fahrstrassen ab den angegebenen Startpunkten parallel. Liefert pro Startpunkt die Fahrstrassen als Daten
+# und die Log-Meldungen der Suche, fuer die Startpunkte ab dem ersten, bei dem eine Signalmatrix erweitert wurde, jedoch nichts.
+def suche_fahrstrassen_parallel(args, fahrstr_typen, startpunkte):
+    prozess_args = argparse.Namespace(**{name: getattr(args, name) for name in
+            ['dateiname', 'cache_verzeichnis', 'vorladen_tiefe', 'bedingungen', 'alternative_fahrwege', 'flankenschutz']})
+    # Ein neu aufzubauender Cache wurde bereits vom Hauptprozess geschrieben.
+    prozess_args.modulcache = 'aus' if args.modulcache == 'aus' else 'an'
+    blockgroesse = max(1, len(startpunkte) // (4 * args.jobs))
+    bloecke = [startpunkte[i:i + blockgroesse] for i in range(0, len(startpunkte), blockgroesse)]
+
+    anzahl = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=_prozess_init, initargs=(prozess_args, fahrstr_typen, logging.getLogger().level)) as prozesse:
+        for block_ergebnis in prozesse.map(_prozess_suche_fahrstrassen, bloecke):
+            for daten, log_records in block_ergebnis:
+                if daten is None:
+                    logging.debug("Signalmatrix bei paralleler Suche erweitert, suche ab Startpunkt {} seriell weiter".format(anzahl + 1))
+                    return
+                anzahl += 1
+                yield daten, log_records
+
+# Sortierschluessel fuer Startpunkte passend zu fahrstr_sort_key: Alle Fahrstrassen ab einem Startsignal haben denselben
+# Schluessel, Aufgleisfahrstrassen (sortiert nach Zielsignal) stehen vor allen anderen.
+def startpunkt_sort_key(startpunkt):
+    fahrstr_typ, nr, richtung = startpunkt
+    refpunkt = modulverwaltung.dieses_modul.streckenelemente[nr].refpunkt(richtung, REFTYP_SIGNAL)
+    if refpunkt is None or not ist_fahrstr_start_sig(refpunkt.signal(), fahrstr_typ):
+        return (0, [])
+    return (1, nat_sort_key(refpunkt.signal().signalbeschreibung()))
+
+# Liefert die Fahrstrassen ab den angegebenen Startpunkten in deren Reihenfolge, jeweils als Liste pro Startpunkt.
+# Bei paralleler Suche werden die Log-Meldungen der Prozesse an derselben Stelle ausgegeben wie bei serieller Suche.
+def suche_fahrstrassen_pro_startpunkt(args, fahrstr_typen, startpunkte, fahrstrassensuchen):
+    anzahl = 0
+    fahrstr_typ = None
+    if args.jobs > 1 and len(startpunkte) > 1:
+        ausgegeben = defaultdict(int)  # (Level, Text) -> Anzahl ausgegebener Meldungen beim Aufbau zwischengespeicherter Daten
+        for startpunkt, (daten, log_records) in zip(startpunkte, suche_fahrstrassen_parallel(args, fahrstr_typen, startpunkte)):
+            if startpunkt[0] != fahrstr_typ:
+                fahrstr_typ = startpunkt[0]
+                logging.debug("Generiere Fahrstrassen vom Typ {}".format(str_fahrstr_typ(fahrstr_typ)))
+            for record in log_records:
+                wiederholung = getattr(record, "wiederholung", None)
+                if wiederholung is not None:
+                    # Meldung hat ein anderer Prozess schon beim Aufbau derselben Daten ausgegeben
+                    if wiederholung <= ausgegeben[(record.levelno, record.msg)]:
+                        continue
+                    ausgegeben[(record.levelno, record.msg)] = wiederholung
+                logging.getLogger(record.name).handle(record)
+            anzahl += 1
+            yield [fahrstrasse_aus_daten(d) for d in daten]
+
+    if anzahl < len(startpunkte):
+        if fahrstrassensuchen is None:
+            fahrstrassensuchen = neue_fahrstrassensuchen(args, fahrstr_typen)
+        for startpunkt in startpunkte[anzahl:]:
+            if startpunkt[0] != fahrstr_typ:
+                fahrstr_typ = startpunkt[0]
+                logging.debug("Generiere Fahrstrassen vom Typ {}".format(str_fahrstr_typ(fahrstr_typ)))
+            yield suche_fahrstrassen(fahrstrassensuchen, startpunkt)
+
+        for fahrstr_typ, (fahrstr_suche, graph) in fahrstrassensuchen.items():
+            logging.debug("Vorsignalsuche fuer Typ {}: {} Ergebnisse wiederverwendet, {} gesucht".format(str_fahrstr_typ(fahrstr_typ), *fahrstr_suche.vorsignale_statistik))
+
+# Liefert die Fahrstrassen in der Reihenfolge, in der sie in die Streckendatei geschrieben werden (siehe fahrstr_sort_key).
+# Dazu werden die Startpunkte (stabil) nach startpunkt_sort_key sortiert und in dieser Reihenfolge durchsucht. Gleichzeitig
+# im Speicher sind so nur die Fahrstrassen eines Startpunkts bzw. die aller Aufgleispunkte, die nach Zielsignal sortiert werden.
+# N.B. Die Information ueber den Vorrangstrang ist nur implizit (ueber die Reihenfolge) in der Fahrstrassenliste enthalten,
+# die Reihenfolge der Fahrstrassen mit gleichem Sortierschluessel muss daher erhalten bleiben.
+def erzeuge_fahrstrassen(args, fahrstr_typen, startpunkte, fahrstrassensuchen=None):
+    aufgleisfahrstrassen = []
+    for fahrstrassen, startpunkt in zip(suche_fahrstrassen_pro_startpunkt(args, fahrstr_typen, startpunkte, fahrstrassensuchen), startpunkte):
+        if startpunkt_sort_key(startpunkt)[0] == 0:
+            aufgleisfahrstrassen.extend(fahrstrassen)
+            continue
+        if aufgleisfahrstrassen is not None:
+            yield from sorted(aufgleisfahrstrassen, key=fahrstr_sort_key)
+            aufgleisfahrstrassen = None
+        yield from fahrstrassen
+
+    if aufgleisfahrstrassen is not None:
+        yield from sorted(aufgleisfahrstrassen, key=fahrstr_sort_key)
+
+# Schaetzt vor der Fahrstrassensuche die Anzahl der Fahrstrassen pro Startpunkt ab und meldet die Startpunkte,
+# an denen sie den Grenzwert uebersteigt. Gibt zurueck, ob das fuer keinen Startpunkt der Fall ist.
+def pruefe_fahrstrassen_anzahl(fahrstrassensuchen, startpunkte, grenzwert):
+    anzahlen = []
+    for fahrstr_typ, nr, richtung in startpunkte:
+        fahrstr_suche, graph = fahrstrassensuchen[fahrstr_typ]
+        knoten = graph.get_knoten(modulverwaltung.dieses_modul.streckenelemente[nr])
+        anzahlen.append((fahrstr_suche.schaetze_anzahl_fahrstrassen(knoten, richtung), fahrstr_typ, knoten.richtung(richtung)))
+    logging.debug("Geschaetzte Anzahl Fahrstrassen: hoechstens {}".format(sum(a[0] for a in anzahlen)))
+
+    zu_viele = sorted((a for a in anzahlen if a[0] > grenzwert), key=operator.itemgetter(0), reverse=True)
+    for anzahl, fahrstr_typ, start in zu_viele[:10]:
+        logging.error("Ab {} koennen bis zu {} Fahrstrassen vom Typ {} entstehen (Grenzwert {})".format(
+            start.signal() if start.signal() is not None else start, anzahl, str_fahrstr_typ(fahrstr_typ), grenzwert))
+    if len(zu_viele) > 10:
+        logging.error("... sowie an {} weiteren Startpunkten".format(len(zu_viele) - 10))
+    return len(zu_viele) == 0
 
-                        knoten = graph.get_knoten(str_element)
-                        assert knoten is not None
-                        fahrstrassen.extend(fahrstr_suche.get_fahrstrassen(knoten, richtung))
+def finde_fahrstrassen(args):
+    lade_module(args)
+
+    fahrstr_typen = []
+    for s in map(lambda s: s.lower().strip(), args.fahrstr_typen.split(",")):
+        if s.startswith("r"):
+            fahrstr_typen.append(FAHRSTR_TYP_RANGIER)
+        elif s.startswith("z"):
+            fahrstr_typen.append(FAHRSTR_TYP_ZUG)
+        elif (s.startswith("a") and s != "auto") or s.startswith("l"):
+            fahrstr_typen.append(FAHRSTR_TYP_ANZEIGE)
+
+    startpunkte = sorted(get_startpunkte(fahrstr_typen), key=startpunkt_sort_key)
+
+    fahrstrassensuchen = None
+    if args.max_fahrstrassen is not None:
+        fahrstrassensuchen = neue_fahrstrassensuchen(args, fahrstr_typen)
+        if not pruefe_fahrstrassen_anzahl(fahrstrassensuchen, startpunkte, args.max_fahrstrassen):
+            logging.error("Die Fahrstrassensuche wird abgebrochen, da zu viele Fahrstrassen entstehen wuerden.")
+            return 1
+
+    # Die Fahrstrassen werden erst bei Bedarf gesucht.
+    fahrstrassen = erzeuge_fahrstrassen(args, fahrstr_typen, startpunkte, fahrstrassensuchen)
 
     strecke = modulverwaltung.dieses_modul.root.find("./Strecke")
     if strecke is not None:
         if args.modus == 'schreibe':
             for fahrstrasse_alt in strecke.findall("./Fahrstrasse"):
                 strecke.remove(fahrstrasse_alt)
-            # N.B. sort() und sorted() sind stabile Sortierverfahren.
-            # Das ist hier notwendig, da die Information ueber den Vorrangstrang nur implizit (ueber die Reihenfolge) in der Fahrstrassenliste enthalten ist.
-            for fahrstrasse_neu in sorted(fahrstrassen, key=fahrstr_sort_key):
-                logging.info("Fahrstrasse erzeugt: {}".format(fahrstrasse_neu.name))
-                strecke.append(fahrstrasse_neu.to_xml())
-            modulverwaltung.dieses_modul.schreibe_moduldatei()
+            # Die Fahrstrassen werden direkt nach dem Erzeugen in eine temporaere Datei geschrieben und erst nach
+            # Abschluss der Suche in die Streckendatei uebernommen, da die Suche noch Signalmatrizen dieses Moduls erweitern kann.
+            with tempfile.TemporaryFile() as fahrstrassen_datei:
+                for fahrstrasse_neu in fahrstrassen:
+                    logging.info("Fahrstrasse erzeugt: {}".format(fahrstrasse_neu.name))
+                    writeuglyxml(fahrstrassen_datei, fahrstrasse_neu.to_xml())
+                fahrstrassen_datei.seek(0)
+                modulverwaltung.dieses_modul.schreibe_moduldatei({strecke: fahrstrassen_datei})
 
             for modul in modulverwaltung.module.values():
                 if modul is not None and modul.geaendert and modul != modulverwaltung.dieses_modul:
@@ -178,6 +393,8 @@ def finde_fahrstrassen(args):
                         modul.schreibe_moduldatei()
 
         elif args.modus == 'profile':
+            for fahrstrasse_neu in fahrstrassen:
+                pass  # nur suchen
             anzahl_elemente = 0
             for modul in modulverwaltung.module.values():
                 anzahl_elemente += len(modul.streckenelemente)
@@ -414,8 +631,13 @@ def gui():
         ent_log.clear()
 
         try:
-            args = namedtuple('args', ['dateiname', 'modus', 'alternative_fahrwege', 'bedingungen', 'flankenschutz', 'fahrstr_typen', 'minimal'])
+            args = namedtuple('args', ['dateiname', 'modus', 'alternative_fahrwege', 'bedingungen', 'flankenschutz', 'fahrstr_typen', 'minimal', 'vorladen_tiefe', 'modulcache', 'cache_verzeichnis', 'jobs', 'max_fahrstrassen'])
             args.dateiname = ent_dateiname.get()
+            args.vorladen_tiefe = 1
+            args.modulcache = 'an' if var_modulcache.get() else 'aus'
+            args.cache_verzeichnis = None
+            args.jobs = 1
+            args.max_fahrstrassen = None
             args.fahrstr_typen = ",".join([
                 "r" if var_typ_rangier.get() else "",
                 "z" if var_typ_zug.get() else "",
@@ -440,8 +662,13 @@ def gui():
             ent_bedingungen.insert(0, bedingungen_filename)
             
             try:
-                alte_args = namedtuple('args', ['dateiname', 'modus', 'alternative_fahrwege', 'bedingungen', 'flankenschutz', 'fahrstr_typen', 'minimal'])
+                alte_args = namedtuple('args', ['dateiname', 'modus', 'alternative_fahrwege', 'bedingungen', 'flankenschutz', 'fahrstr_typen', 'minimal', 'vorladen_tiefe', 'modulcache', 'cache_verzeichnis', 'jobs', 'max_fahrstrassen'])
                 alte_args.dateiname = ent_dateiname.get()
+                alte_args.vorladen_tiefe = 1
+                alte_args.modulcache = 'an' if var_modulcache.get() else 'aus'
+                alte_args.cache_verzeichnis = None
+                alte_args.jobs = 1
+                alte_args.max_fahrstrassen = None
                 alte_args.bedingungen = None if ent_bedingungen.get() == '' else ent_bedingungen.get()
                 alte_args.minimal = False
                 alte_args.fahrstr_typen = 'auto'
@@ -525,6 +752,10 @@ def gui():
     chk_flankenschutz = tkinter.Checkbutton(frame, text="Weichen in Flankenschutz-Stellung verknuepfen", variable=var_flankenschutz)
     chk_flankenschutz.grid(row=25, column=1, columnspan=2, sticky=tkinter.W)
 
+    var_modulcache = tkinter.BooleanVar()
+    chk_modulcache = tkinter.Checkbutton(frame, text="Nachbarmodule zwischenspeichern (Modul-Cache)", variable=var_modulcache)
+    chk_modulcache.grid(row=27, column=1, columnspan=2, sticky=tkinter.W)
+
     lbl_debug = tkinter.Label(frame, text="Debug-Ausgaben: ")
     lbl_debug.grid(row=30, column=0, sticky=tkinter.W)
 
@@ -567,11 +798,14 @@ def gui():
     tkinter.mainloop()
 
 if __name__ == '__main__':
+    multiprocessing.freeze_support()
     if len(sys.argv) == 1:
         # Ohne Parameter wird die GUI-Version aufgerufen.
         gui()
     else:
-        parser = argparse.ArgumentParser(description='Fahrstrassengenerierung fuer ein Zusi-3-Modul')
+        parser = argparse.ArgumentParser(description='Fahrstrassengenerierung fuer ein Zusi-3-Modul',
+                epilog="Umgebungsvariable FAHRSTR_GEN_XML=lxml: Moduldateien mit lxml statt mit xml.etree.ElementTree lesen und schreiben "
+                    "(falls lxml installiert ist). Standard ist ElementTree, das beim Laden grosser Module schneller und sparsamer ist.")
         parser.add_argument('dateiname')
         parser.add_argument('--modus', choices=['schreibe', 'vergleiche', 'profile'], default='schreibe', help="Modus \"vergleiche\" schreibt die Fahrstrassen nicht, sondern gibt stattdessen die Unterschiede zu den bestehenden Fahrstrassen aus.")
         parser.add_argument('--kompat', action='store_true', help="Kompatibilitaetsmeldungen anzeigen")
@@ -582,10 +816,15 @@ if __name__ == '__main__':
         parser.add_argument('--fahrstr_typen', default="auto", help="Kommagetrennte Liste von zu generierenden Fahrstrassen-Typen (rangier, zug, anzeige). Ist eine Bedingungsdatei angegeben, wird dieser Wert aus dieser augelesen.")
         parser.add_argument('--alternative_fahrwege', action='store_true', help="Alternative Fahrwege einrichten (Fahrstrassen fuer alle moeglichen Fahrwege zwischen Start- und Zielsignal erzeugen statt nur fuer den zuerst gefundenen). Ist eine Bedingungsdatei angegeben, wird dieser Wert aus dieser augelesen.")
         parser.add_argument('--flankenschutz', action='store_true', help="Weichen in Flankenschutzstellung in Fahrstrassen verknuepfen. Ist eine Bedingungsdatei angegeben, wird dieser Wert aus dieser augelesen.")
+        parser.add_argument('--vorladen_tiefe', type=int, default=1, help="Nachbarmodule bis zu dieser Tiefe vor der Fahrstrassensuche parallel laden (0 = Module erst bei Bedarf laden)")
+        parser.add_argument('--modulcache', choices=['an', 'aus', 'neu'], default='aus', help="Daten nur gelesener Module zwischenspeichern und bei unveraenderter Moduldatei von dort laden (\"aus\" = Cache nicht verwenden, \"neu\" = Cache-Eintraege neu erzeugen)")
+        parser.add_argument('--cache_verzeichnis', help="Verzeichnis fuer den Modul-Cache")
+        parser.add_argument('--jobs', type=int, default=1, help="Fahrstrassen mit dieser Anzahl Prozesse parallel suchen")
+        parser.add_argument('--max_fahrstrassen', type=int, help="Vor der Fahrstrassensuche die Anzahl der Fahrstrassen pro Startpunkt abschaetzen und abbrechen, wenn sie an einem Startpunkt diesen Wert uebersteigt")
         parser.add_argument('--minimal', action='store_true', help="Liest die Werte für fahrstr_typen, alternative_fahrwege und flankenschutz nicht aus der Bedingungsdatei aus")
         args = parser.parse_args()
 
-        logging.basicConfig(format='%(relativeCreated)d:%(levelname)s:%(message)s', level=(logging.DEBUG if args.debug else logging.COMPAT if args.kompat else logging.INFO))
+        logging.basicConfig(format=LOG_FORMAT, level=(logging.DEBUG if args.debug else logging.COMPAT if args.kompat else logging.INFO))
 
         if args.profile == 'profile':
             import cProfile as profile, pstats
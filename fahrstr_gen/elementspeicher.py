@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+
+# Spaltenweise Ablage der Streckenelemente eines nur gelesenen Moduls.
+# Ein Element wird ueber seinen Index (Position in der Moduldatei) angesprochen, strecke.SpeicherElement ist eine Sicht auf einen Index.
+# Die Zahlenspalten sind array.array-Objekte und koennen ohne Umweg ueber Python-Objekte gespeichert werden.
+# Beim Laden aus dem Modul-Cache sind sie Sichten (memoryview) auf die per mmap eingeblendete Cache-Datei.
+
+from array import array
+import math
+
+from .konstanten import *
+
+# Spalten mit einem Eintrag pro Element: (Name, Typcode)
+element_spalten = [
+    ("nr", "q"),
+    ("anschluss", "q"),
+    ("b_x", "d"), ("b_y", "d"), ("b_z", "d"),
+    ("g_x", "d"), ("g_y", "d"), ("g_z", "d"),
+    ("laenge", "d"),
+    ("reg_norm", "q"), ("reg_gegen", "q"),
+    ("koppelweiche_norm", "b"), ("koppelweiche_gegen", "b"),
+]
+
+# Nachfolger in CSR-Form: Die Nachfolger von Element i in Richtung r stehen an den Positionen
+# start[2*i+k] bis start[2*i+k+1] (ausschliesslich) mit k = 0 fuer Norm- und k = 1 fuer Gegenrichtung.
+#  - nr: Nummer wie in der Moduldatei (Elementnummer bzw. Referenzpunkt-Nummer bei Nachfolgern in anderen Modulen)
+#  - idx: Index des Nachfolgers in diesem Modul, -1 bei ungueltiger Nummer oder Nachfolger in anderem Modul
+#  - richtung: 1, wenn der Nachfolger in Normrichtung befahren wird, sonst 0 (aus den Anschluss-Bits, nur fuer Nachfolger in diesem Modul)
+#  - modul: -1 fuer Nachfolger in diesem Modul, sonst Index in modulpfade
+adjazenz_spalten = [
+    ("start", "q"),
+    ("nr", "q"),
+    ("idx", "q"),
+    ("richtung", "b"),
+    ("modul", "q"),
+]
+
+# Nachfolger aller Streckenelemente eines Moduls (Format siehe adjazenz_spalten), wird beim Laden des Moduls einmal angelegt.
+# Nachfolger in anderen Modulen werden erst in strecke.Element.nachfolger ueber deren Referenzpunkte aufgeloest.
+class Adjazenz:
+    def __init__(self):
+        for (name, typ) in adjazenz_spalten:
+            setattr(self, name, array(typ))
+        self.start.append(0)
+        self.modulpfade = []  # Pfade der Module, in denen Nachfolger liegen
+        self._modulpfad_index = dict()  # Modulpfad -> Index in modulpfade
+
+    # Fuegt die Nachfolger des naechsten Elements an (Format wie strecke.Element.nachfolger_roh).
+    def neues_element(self, anschluss, nachfolger_norm, nachfolger_gegen):
+        for (anschluss_shift, nachfolger) in [(0, nachfolger_norm), (8, nachfolger_gegen)]:
+            for (nr, modulpfad) in nachfolger:
+                self.nr.append(nr)
+                self.idx.append(-1)
+                if modulpfad is None:
+                    self.richtung.append(1 - ((anschluss >> anschluss_shift) & 1))
+                    self.modul.append(-1)
+                else:
+                    self.richtung.append(0)
+                    if modulpfad not in self._modulpfad_index:
+                        self._modulpfad_index[modulpfad] = len(self.modulpfade)
+                        self.modulpfade.append(modulpfad)
+                    self.modul.append(self._modulpfad_index[modulpfad])
+                anschluss_shift += 1
+            self.start.append(len(self.nr))
+
+    # Traegt die Indizes der Nachfolger in diesem Modul ein, nachdem alle Elemente angefuegt wurden.
+    # index: Elementnummer -> Index
+    def loese_auf(self, index):
+        for k, (nr, modul) in enumerate(zip(self.nr, self.modul)):
+            if modul < 0:
+                self.idx[k] = index.get(nr, -1)
+
+    def bereich(self, idx, richtung):
+        pos = 2 * idx + (0 if richtung == NORM else 1)
+        return range(self.start[pos], self.start[pos + 1])
+
+    def anzahl_nachfolger(self, idx, richtung):
+        pos = 2 * idx + (0 if richtung == NORM else 1)
+        return self.start[pos + 1] - self.start[pos]
+
+    # Format siehe strecke.Element.nachfolger_roh
+    def nachfolger_roh(self, idx, richtung):
+        return [(self.nr[k], None if self.modul[k] < 0 else self.modulpfade[self.modul[k]])
+                for k in self.bereich(idx, richtung)]
+
+    # Zahlenspalten zum Speichern als [(Name, array)]
+    def spalten(self):
+        return [(name, getattr(self, name)) for (name, typ) in adjazenz_spalten]
+
+    # Uebrige Daten zum Speichern mit marshal
+    def zu_daten(self):
+        return self.modulpfade
+
+# Gegenstueck zu Adjazenz.spalten und Adjazenz.zu_daten. spalten: Name -> array oder memoryview
+def lade_adjazenz(spalten, daten):
+    result = Adjazenz()
+    for (name, typ) in adjazenz_spalten:
+        setattr(result, name, spalten[name])
+    result.modulpfade = daten
+    return result
+
+koordinaten_spalten = ["b_x", "b_y", "b_z", "g_x", "g_y", "g_z"]
+
+# Koordinaten eines <StrElement>-Knotens in der Reihenfolge von koordinaten_spalten (fehlende Punkte: 0).
+def xml_koordinaten(xml_knoten):
+    b_knoten = g_knoten = None
+    for n in xml_knoten:
+        if n.tag == "b" and b_knoten is None:
+            b_knoten = n
+        elif n.tag == "g" and g_knoten is None:
+            g_knoten = n
+        else:
+            continue
+        if b_knoten is not None and g_knoten is not None:
+            break
+
+    return tuple(float(knoten.get(attrib, 0)) if knoten is not None else 0.0
+            for knoten in [b_knoten, g_knoten] for attrib in ["X", "Y", "Z"])
+
+def koordinaten_laenge(b_x, b_y, b_z, g_x, g_y, g_z):
+    return math.sqrt((b_x-g_x)**2 + (b_y-g_y)**2 + (b_z-g_z)**2)
+
+class ElementSpeicher:
+    def __init__(self):
+        for (name, typ) in element_spalten:
+            setattr(self, name, array(typ))
+        self.adjazenz = Adjazenz()
+
+        # Listen mit einem Eintrag pro Element
+        self.ereignisse_norm = []  # Liste der Ereignis-Attribute (nach Ereignisnummer sortiert) oder None
+        self.ereignisse_gegen = []
+        self.signale_norm = []  # <Signal>-Knoten als XML oder None
+        self.signale_gegen = []
+
+    def __len__(self):
+        return len(self.nr)
+
+    # Elementnummer -> Index
+    def index(self):
+        return dict(zip(self.nr, range(len(self.nr))))
+
+    # Zahlenspalten zum Speichern als [(Name, array)]
+    def spalten(self):
+        return [(name, getattr(self, name)) for (name, typ) in element_spalten] + \
+                [("adjazenz." + name, spalte) for (name, spalte) in self.adjazenz.spalten()]
+
+    # Uebrige Daten zum Speichern mit marshal
+    def zu_daten(self):
+        return (
+            self.adjazenz.zu_daten(),
+            self.ereignisse_norm, self.ereignisse_gegen,
+            self.signale_norm, self.signale_gegen,
+        )
+
+# Gegenstueck zu ElementSpeicher.spalten und ElementSpeicher.zu_daten. spalten: Name -> array oder memoryview
+def lade_elementspeicher(spalten, daten):
+    result = ElementSpeicher()
+    adjazenz_daten, result.ereignisse_norm, result.ereignisse_gegen, result.signale_norm, result.signale_gegen = daten
+    for (name, typ) in element_spalten:
+        setattr(result, name, spalten[name])
+    result.adjazenz = lade_adjazenz(dict((name[len("adjazenz."):], spalte) for (name, spalte) in spalten.items() if name.startswith("adjazenz.")), adjazenz_daten)
+    return result
+
+# Legt einen Elementspeicher aus den angegebenen (XML-basierten) Streckenelementen an.
+def erzeuge_elementspeicher(elemente):
+    from .xmlbackend import ET, find_2
+
+    result = ElementSpeicher()
+    for element in elemente:
+        result.nr.append(element.nr)
+        result.anschluss.append(element.anschluss())
+        for name, wert in zip(koordinaten_spalten, element.koordinaten()):
+            getattr(result, name).append(wert)
+        result.laenge.append(element.laenge())
+        result.adjazenz.neues_element(element.anschluss(), element.nachfolger_roh(NORM), element.nachfolger_roh(GEGEN))
+
+        for richtung, tag in [(NORM, "InfoNormRichtung"), (GEGEN, "InfoGegenRichtung")]:
+            (result.reg_norm if richtung == NORM else result.reg_gegen).append(element.registernr(richtung))
+            (result.koppelweiche_norm if richtung == NORM else result.koppelweiche_gegen).append(1 if element.hat_koppelweiche(richtung) else 0)
+            ereignisse = [dict(n.attrib) for n in element.ereignisse(richtung)]
+            (result.ereignisse_norm if richtung == NORM else result.ereignisse_gegen).append(ereignisse if len(ereignisse) else None)
+            signal_knoten = find_2(element.xml_knoten, tag, "Signal")
+            (result.signale_norm if richtung == NORM else result.signale_gegen).append(
+                    ET.tostring(signal_knoten).rstrip() if signal_knoten is not None else None)
+
+    result.adjazenz.loese_auf(result.index())
+    return result
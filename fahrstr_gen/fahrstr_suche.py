@@ -1,12 +1,11 @@
 #!/usr/bin/env python3
 
-import xml.etree.ElementTree as ET
-from collections import defaultdict, Counter, OrderedDict
+from .xmlbackend import ET
+from collections import Counter, OrderedDict
 import itertools
-import operator
 
 from .konstanten import *
-from .fahrstrasse import EinzelFahrstrasse, Fahrstrasse, FahrstrHauptsignal, FahrstrVorsignal, FahrstrWeichenstellung
+from .fahrstrasse import EinzelFahrstrassenGraph, Fahrstrasse, FahrstrHauptsignal, FahrstrVorsignal, FahrstrWeichenstellung
 from .strecke import ist_fahrstr_start_sig, ist_hsig_fuer_fahrstr_typ, ist_zusatzsignal_fuer_fahrstr_typ, geschw_kleiner, geschw_min, str_geschw, gegenrichtung, str_rgl_ggl
 from . import modulverwaltung
 
@@ -34,15 +33,34 @@ def get_bedingte_register_kombinationen(einzelfahrstr_liste):
             result.append([[]])
     return result
 
+# Eine Bedingung aus der Bedingungsdatei, einmalig aufbereitet zum Filtern von Einzelfahrstrassen.
+class Bedingung:
+    def __init__(self, xml_knoten):
+        self.weichenstellungen = set()  # Weichenstellungen (wie EinzelFahrstrasse.get_weichenstellungen), die alle enthalten sein muessen
+        self.unbekannte_typen = []
+
+        for bed in xml_knoten:
+            if bed.tag == "FahrstrWeiche":
+                self.weichenstellungen.add((bed.find("Datei").get("Dateiname", "").upper(), int(bed.get("Ref", 0)), int(bed.get("FahrstrWeichenlage"))))
+            else:
+                self.unbekannte_typen.append(bed.tag)
+        self.weichenstellungen = frozenset(self.weichenstellungen)
+
+    def ist_erfuellt(self, einzelfahrstrasse):
+        return self.weichenstellungen <= einzelfahrstrasse.get_weichenstellungen()
+
 class FahrstrassenSuche:
     def __init__(self, fahrstr_typ, alternative_fahrwege, bedingungen, vorsignal_graph, flankenschutz_graph, loeschfahrstr_namen):
-        self.einzelfahrstrassen = dict()  # KnotenUndRichtung -> [EinzelFahrstrasse]
+        self.einzelfahrstrassen = dict()  # KnotenUndRichtung -> EinzelFahrstrassenGraph
         self.fahrstr_typ = fahrstr_typ
         self.alternative_fahrwege = alternative_fahrwege
-        self.bedingungen = bedingungen
+        self.bedingungen = bedingungen  # Name der Einzelfahrstrasse -> Bedingung
         self.vorsignal_graph = vorsignal_graph
         self.flankenschutz_graph = flankenschutz_graph
         self.loeschfahrstr_namen = loeschfahrstr_namen
+        self.geschaetzte_anzahl_weiterfuehrung = dict()  # KnotenUndRichtung -> Ergebnis von _schaetze_anzahl_rek fuer weitergefuehrte Fahrstrassen
+        self.vorsignale = dict()  # Parameter von _get_vorsignale -> ([FahrstrVorsignal], Meldungen)
+        self.vorsignale_statistik = [0, 0]  # Treffer und Fehlschlaege beim Zugriff auf self.vorsignale
         self.fahrstr_nummerierung = Counter()  # (Start-Refpunkt, Ziel-Refpunkt) -> Anzahl gefundener Fahrstrassen, zwecks Nummerierung
 
     # Gibt alle vom angegebenen Knoten ausgehenden (kombinierten) Fahrstrassen in der angegebenen Richtung zurueck.
@@ -64,102 +82,126 @@ class FahrstrassenSuche:
             self.einzelfahrstrassen[key] = result
             return result
 
-    # Gibt alle Einzelfahrstrassen zurueck, die an diesem Knoten in der angegebenen Richtung beginnen.
+    # Gibt alle Einzelfahrstrassen zurueck, die an diesem Knoten in der angegebenen Richtung beginnen,
+    # als EinzelFahrstrassenGraph, der sie beim Iterieren in der Reihenfolge der Tiefensuche erzeugt.
+    # Die Reihenfolge ist wichtig fuer die Nummerierung von Kennlichtfahrstrassen, wenn alternative Fahrwege beibehalten werden.
+    # Beispiel (Vorzugslage der Weiche ist jeweils die gerade Lage):
+    #
+    #      /-\---B--\
+    # A --/---\--C---\--D
+    #
+    # Resultierende Fahrstrassen:
+    #  - A -> C -> D,
+    #  - A -> B -> D (1)
+    #  - A -> C -> D (2)
     def _suche_einzelfahrstrassen(self, knoten, richtung):
-        einzelfahrstrassen = []
-        for kante in knoten.get_nachfolger_kanten(richtung):
-            if kante.ziel is not None:
-                f = EinzelFahrstrasse()
-                f.erweitere(kante)
-                self._suche_einzelfahrstrassen_rek(f, einzelfahrstrassen)
-
-        # Gruppiere nach Zielsignal und filtere jeweils nach Bedingungen.
-        # Behalte die Reihenfolge, in der die Einzelfahrstrassen gefunden wurden (Tiefensuche).
-        # Das ist wichtig fuer die Nummerierung von Kennlichtfahrstrassen, wenn alternative Fahrwege beibehalten werden.
-        # Beispiel (Vorzugslage der Weiche ist jeweils die gerade Lage):
-        #
-        #      /-\---B--\
-        # A --/---\--C---\--D
-        #
-        # Resultierende Fahrstrassen:
-        #  - A -> C -> D,
-        #  - A -> B -> D (1)
-        #  - A -> C -> D (2)
-        einzelfahrstrassen_by_zielsignal = defaultdict(list)
-        for idx, einzelfahrstrasse in enumerate(einzelfahrstrassen):
-            einzelfahrstrassen_by_zielsignal[einzelfahrstrasse.ziel.refpunkt(REFTYP_SIGNAL)].append((einzelfahrstrasse, idx))
+        graph = EinzelFahrstrassenGraph(knoten.richtung(richtung))
 
-        result = []
-        for ziel_refpunkt, einzelfahrstrassen in einzelfahrstrassen_by_zielsignal.items():
-            einzelfahrstr_name = ("Aufgleispunkt" if not ist_fahrstr_start_sig(knoten.signal(richtung), self.fahrstr_typ) else knoten.signal(richtung).signalbeschreibung()) + \
-                    " -> " + ziel_refpunkt.signal().signalbeschreibung()
+        # Ohne alternative Fahrwege wird pro Zielsignal nur die erste gefundene Einzelfahrstrasse benutzt.
+        graph.nur_erste = not self.alternative_fahrwege
+        self._finde_wege(graph, knoten.get_nachfolger_kanten(richtung))
+
+        # Ziele in der Reihenfolge, in der sie von der Tiefensuche zuerst erreicht werden.
+        for ziel, anzahl in graph.start_anzahl.items():
+            ziel_refpunkt = ziel.refpunkt(REFTYP_SIGNAL)
+            einzelfahrstr_name = self._einzelfahrstr_name(knoten.signal(richtung), ziel_refpunkt)
 
             if einzelfahrstr_name in self.bedingungen:
                 logging.debug("Filtere nach Bedingung '{}'".format(einzelfahrstr_name))
-                einzelfahrstrassen_gefiltert = einzelfahrstrassen
-
-                for bed in self.bedingungen[einzelfahrstr_name]:
-                    if bed.tag == "FahrstrWeiche":
-                        einzelfahrstrassen_gefiltert = [f for f in einzelfahrstrassen_gefiltert if any(
-                            w.refpunkt.refnr == int(bed.get("Ref", 0)) and
-                            w.refpunkt.element_richtung.element.modul.relpath.upper() == bed.find("Datei").get("Dateiname", "").upper() and
-                            w.weichenlage == int(bed.get("FahrstrWeichenlage"))
-                            for kante in f[0].kantenliste() for w in kante.weichen
-                        )]
-                    else:
-                        logging.warn("Unbekannter Bedingungstyp: {}".format(bed.tag))
+                bedingung = self.bedingungen[einzelfahrstr_name]
+                for typ in bedingung.unbekannte_typen:
+                    logging.warn("Unbekannter Bedingungstyp: {}".format(typ))
 
-                if len(einzelfahrstrassen_gefiltert) == 0:
-                    logging.warn("Fuer Bedingung '{}' wurden keine Fahrstrassen gefunden, die sie erfuellen".format(einzelfahrstr_name))
+                if any(bedingung.ist_erfuellt(f) for f in graph.wege(ziel)):
+                    graph.bedingungen[ziel] = bedingung
                 else:
-                    einzelfahrstrassen = einzelfahrstrassen_gefiltert
-
-            if len(einzelfahrstrassen) > 1:
-                logging.debug("{} Einzelfahrstrassen zu {} gefunden: {}".format(
-                    len(einzelfahrstrassen), ziel_refpunkt.signal(),
-                    " / ".join("{} km/h, {:.2f} m".format(" + ".join(str_geschw(v1) for v1 in einzelfahrstrasse.signalgeschwindigkeiten), einzelfahrstrasse.laenge) for einzelfahrstrasse, idx in einzelfahrstrassen)))
-
-            if self.alternative_fahrwege:
-                result.extend(einzelfahrstrassen)
-            else:
-                # Beispiel fuer alternative Sortierung: Signalgeschwindigkeit
-                # result.append(sorted(einzelfahrstrassen, key = lambda fstr: float_geschw(fstr.signalgeschwindigkeit), reverse = True)[0])  # anders als min wird bei sorted Stabilitaet garantiert
-                result.append(einzelfahrstrassen[0])
-
-        # Stelle urspruengliche Reihenfolge wieder her
-        return [t[0] for t in sorted(result, key=operator.itemgetter(1))]
-
-    # Erweitert die angegebene Einzelfahrstrasse rekursiv ueber Kanten, bis ein Hauptsignal erreicht wird,
-    # und fuegt die resultierenden Einzelfahrstrassen in die Ergebnisliste ein.
-    def _suche_einzelfahrstrassen_rek(self, fahrstrasse, ergebnis_liste):
-        # Sind wir am Hauptsignal?
-        signal = fahrstrasse.ziel.signal()
-        if ist_hsig_fuer_fahrstr_typ(signal, self.fahrstr_typ):
-            logging.debug("Zielsignal gefunden: {}".format(signal))
-            refpunkt = fahrstrasse.ziel.refpunkt(REFTYP_SIGNAL)
-            if refpunkt is None:
-                logging.warn("{}: Element hat keinen Referenzpunkt vom Typ Signal. Es werden keine Fahrstrassen zu diesem Signal eingerichtet.".format(signal))
-            else:
-                ergebnis_liste.append(fahrstrasse)
-            return
-
-        folgekanten = fahrstrasse.ziel.knoten.get_nachfolger_kanten(fahrstrasse.ziel.richtung)
-        for idx, kante in enumerate(folgekanten):
-            if kante.ziel is None:
-                continue
+                    logging.warn("Fuer Bedingung '{}' wurden keine Fahrstrassen gefunden, die sie erfuellen".format(einzelfahrstr_name))
 
-            if idx == len(folgekanten) - 1:
-                fahrstrasse.erweitere(kante)
-                self._suche_einzelfahrstrassen_rek(fahrstrasse, ergebnis_liste)
+            if anzahl > 1:
+                logging.debug("{} Einzelfahrstrassen zu {} gefunden".format(anzahl, ziel_refpunkt.signal()))
+
+        return graph
+
+    # Traegt alle Wege, die ueber die angegebenen Startkanten zu einem Zielsignal fuehren, in den Einzelfahrstrassen-Graphen ein.
+    # Die Tiefensuche laeuft ueber einen expliziten Stapel, jeder Knoten wird dabei nur einmal durchsucht.
+    # Ein Knoten ist abgeschlossen, sobald alle Folgeknoten abgeschlossen sind, erst dann steht fest, welche Ziele er erreicht.
+    # Wird nur die erste Einzelfahrstrasse zu jedem Zielsignal benoetigt (graph.nur_erste), werden Kanten zu bereits abgeschlossenen
+    # Knoten uebergangen, ueber die nur Zielsignale erreichbar sind, zu denen schon vorher ein Weg gefunden wurde. Da die Tiefensuche
+    # die Wege in derselben Reihenfolge findet wie EinzelFahrstrassenGraph._wege, liegt auf solchen Kanten nie der erste Weg zu einem Ziel.
+    # Zielsignale mit Bedingung sind ausgenommen, dort werden alle Wege gegen die Bedingung geprueft.
+    def _finde_wege(self, graph, startkanten):
+        in_bearbeitung = set([graph.start])
+        erreicht = set()  # Zielsignale ohne Bedingung, zu denen bereits ein Weg gefunden wurde (nur bei graph.nur_erste)
+        startsignal = graph.start.signal()
+        stapel = [[None, iter(startkanten), [], Counter(), Counter(), None]]  # [Knoten (None am Start), Iterator ueber die restlichen Folgekanten, Kanten zu einem Ziel, Anzahl Wege und Kombinationen je Ziel, zuletzt abgestiegene Kante]
+
+        while len(stapel):
+            eintrag = stapel[-1]
+            (knoten_richtung, folgekanten, kanten, anzahl, kombinationen, abgestiegen) = eintrag
+
+            for kante in folgekanten:
+                if kante.ziel is None:
+                    continue
+
+                ziel_anzahl = graph.anzahl.get(kante.ziel)
+                if ziel_anzahl is None:
+                    signal = kante.ziel.signal()
+                    if ist_hsig_fuer_fahrstr_typ(signal, self.fahrstr_typ):
+                        logging.debug("Zielsignal gefunden: {}".format(signal))
+                        if kante.ziel.refpunkt(REFTYP_SIGNAL) is None:
+                            logging.warn("{}: Element hat keinen Referenzpunkt vom Typ Signal. Es werden keine Fahrstrassen zu diesem Signal eingerichtet.".format(signal))
+                            ziel_anzahl = Counter()
+                        else:
+                            ziel_anzahl = Counter([kante.ziel])
+                            graph.ziele.add(kante.ziel)
+                            if graph.nur_erste and (not len(self.bedingungen) or
+                                    self._einzelfahrstr_name(startsignal, kante.ziel.refpunkt(REFTYP_SIGNAL)) not in self.bedingungen):
+                                erreicht.add(kante.ziel)
+                        graph.anzahl[kante.ziel] = ziel_anzahl
+                        graph.kombinationen[kante.ziel] = ziel_anzahl
+                    elif kante.ziel in in_bearbeitung:
+                        logging.debug("Kreis ohne Hauptsignal an {}".format(kante.ziel))
+                        continue
+                    else:
+                        # Zuerst den Folgeknoten abschliessen, danach diese Kante erneut betrachten.
+                        in_bearbeitung.add(kante.ziel)
+                        eintrag[1] = itertools.chain([kante], folgekanten)
+                        eintrag[5] = kante
+                        stapel.append([kante.ziel, iter(kante.ziel.knoten.get_nachfolger_kanten(kante.ziel.richtung)), [], Counter(), Counter(), None])
+                        break
+                elif graph.nur_erste and kante is not abgestiegen and erreicht.issuperset(ziel_anzahl):
+                    # Nur alternative Wege zu bereits gefundenen Zielsignalen.
+                    continue
+
+                if len(ziel_anzahl):
+                    kanten.append(kante)
+                    anzahl.update(ziel_anzahl)
+                    if len(kante.bedingte_register):
+                        kombinationen.update(ziel_anzahl)
+                        kombinationen.update(ziel_anzahl)
+                    else:
+                        kombinationen.update(graph.kombinationen[kante.ziel])
             else:
-                self._suche_einzelfahrstrassen_rek(fahrstrasse.erweiterte_kopie(kante), ergebnis_liste)
-
-    def _get_fahrstrassen_rek(self, einzelfahrstr_liste, out):
-        letzte_fahrstrasse = einzelfahrstr_liste[-1]
-        zielknoten = letzte_fahrstrasse.kanten.eintrag.ziel.knoten
-        zielrichtung = letzte_fahrstrasse.kanten.eintrag.ziel.richtung
-        zielsignal = zielknoten.signal(zielrichtung)
-
+                stapel.pop()
+                if knoten_richtung is None:
+                    graph.startkanten = kanten
+                    graph.start_anzahl = anzahl
+                    graph.start_kombinationen = kombinationen
+                else:
+                    in_bearbeitung.discard(knoten_richtung)
+                    graph.anzahl[knoten_richtung] = anzahl
+                    graph.kombinationen[knoten_richtung] = kombinationen
+                    if len(kanten):
+                        graph.kanten[knoten_richtung] = kanten
+
+    def _einzelfahrstr_name(self, startsignal, ziel_refpunkt):
+        return ("Aufgleispunkt" if not ist_fahrstr_start_sig(startsignal, self.fahrstr_typ) else startsignal.signalbeschreibung()) + \
+                " -> " + ziel_refpunkt.signal().signalbeschreibung()
+
+    # Gibt zurueck, ob eine Fahrstrasse, deren letzte Einzelfahrstrasse am angegebenen Signal endet, dort abgeschlossen
+    # und/oder ueber weitere Einzelfahrstrassen weitergefuehrt wird (Kennlichtschaltung).
+    # erste: Besteht die Fahrstrasse bisher aus nur einer Einzelfahrstrasse?
+    def _abschliessen_weiterfuehren(self, zielsignal, erste):
         fahrstr_abschliessen = True
         fahrstr_weiterfuehren = False
 
@@ -167,13 +209,50 @@ class FahrstrassenSuche:
             # Fahrstrasse nur abschliessen, wenn schon ein Signal mit "Kennlichtschaltung Nachfolgersignal" aufgenommen wurde.
             # Das ist genau dann der Fall, wenn wir mehr als eine Einzelfahrstrasse haben.
             # Ansonsten Fahrstrasse weiterfuehren.
-            if len(einzelfahrstr_liste) == 1:
+            if erste:
                 fahrstr_abschliessen = False
                 fahrstr_weiterfuehren = True
 
         if zielsignal.sigflags & SIGFLAG_KENNLICHT_NACHFOLGESIGNAL != 0:
             fahrstr_weiterfuehren = True
 
+        return (fahrstr_abschliessen, fahrstr_weiterfuehren)
+
+    # Gibt eine obere Schranke fuer die Anzahl der Fahrstrassen zurueck, die get_fahrstrassen liefern wuerde,
+    # ohne sie zu erzeugen. Gezaehlt wird ueber die Einzelfahrstrassen-Graphen, Kennlichtschaltungen und
+    # Kombinationen bedingter Register werden wie in _get_fahrstrassen_rek beruecksichtigt.
+    def schaetze_anzahl_fahrstrassen(self, knoten, richtung):
+        return self._schaetze_anzahl_rek(knoten.richtung(richtung), True, set())
+
+    def _schaetze_anzahl_rek(self, start, erste, in_bearbeitung):
+        if not erste and start in self.geschaetzte_anzahl_weiterfuehrung:
+            return self.geschaetzte_anzahl_weiterfuehrung[start]
+
+        result = 0
+        for ziel, anzahl in self._get_einzelfahrstrassen(start.knoten, start.richtung).geschaetzte_anzahl().items():
+            (fahrstr_abschliessen, fahrstr_weiterfuehren) = self._abschliessen_weiterfuehren(ziel.signal(), erste)
+            anzahl_ab_ziel = 1 if fahrstr_abschliessen else 0
+            if fahrstr_weiterfuehren:
+                if ziel in in_bearbeitung:
+                    logging.debug("Kreis in Kennlichtschaltung an {}".format(ziel))
+                else:
+                    in_bearbeitung.add(ziel)
+                    anzahl_ab_ziel += self._schaetze_anzahl_rek(ziel, False, in_bearbeitung)
+                    in_bearbeitung.discard(ziel)
+            result += anzahl * anzahl_ab_ziel
+
+        if not erste:
+            self.geschaetzte_anzahl_weiterfuehrung[start] = result
+        return result
+
+    def _get_fahrstrassen_rek(self, einzelfahrstr_liste, out):
+        letzte_fahrstrasse = einzelfahrstr_liste[-1]
+        zielknoten = letzte_fahrstrasse.kanten.eintrag.ziel.knoten
+        zielrichtung = letzte_fahrstrasse.kanten.eintrag.ziel.richtung
+        zielsignal = zielknoten.signal(zielrichtung)
+
+        (fahrstr_abschliessen, fahrstr_weiterfuehren) = self._abschliessen_weiterfuehren(zielsignal, len(einzelfahrstr_liste) == 1)
+
         logging.debug("Fahrstrassensuche: an {} (Kennlicht Vorgaenger={}, Kennlicht Nachfolger={}). Fahrstrasse abschliessen={}, Fahrstrasse weiterfuehren={}".format(
             zielsignal,
             zielsignal.sigflags & SIGFLAG_KENNLICHT_VORGAENGERSIGNAL != 0, zielsignal.sigflags & SIGFLAG_KENNLICHT_NACHFOLGESIGNAL != 0,
@@ -188,6 +267,150 @@ class FahrstrassenSuche:
             for einzelfahrstrasse in self._get_einzelfahrstrassen(zielknoten, zielrichtung):
                 self._get_fahrstrassen_rek(einzelfahrstr_liste + [einzelfahrstrasse], out)
 
+    # Sucht ab dem Startsignal einer Fahrstrasse rueckwaerts die Vorsignale, die beim Stellen der Fahrstrasse angesteuert werden,
+    # und gibt sie als Liste von FahrstrVorsignal zurueck. Vorsignale in vorhandene_vorsignale (Referenzpunkte) werden uebergangen.
+    # Das Ergebnis haengt nur von den Parametern ab und wird zwischengespeichert, denn Fahrstrassen ab demselben Startsignal
+    # mit derselben Startsignalzeile und Richtungsanzeige steuern dieselben Vorsignale an. Die Meldungen der Suche
+    # werden mitgespeichert und bei jeder Verwendung mit dem Namen der jeweiligen Fahrstrasse erneut ausgegeben.
+    # Meldungen, deren Text von aktuelle_signalgeschwindigkeit abhaengt (Vergleich mit dem alten Algorithmus), werden als Funktion
+    # gespeichert und bei jeder Ausgabe neu formatiert; aktuelle_signalgeschwindigkeit gehoert daher nicht zum Schluessel.
+    # Zum Schluessel gehoeren dagegen auch
+    #  - vorhandene_vorsignale: die ueber Ereignisse der Kanten bereits verknuepften Vorsignale haengen vom Fahrweg ab. Sie werden
+    #    nicht nur aus dem Ergebnis herausgefiltert, sondern beeinflussen ueber die zuletzt ermittelte Spalte auch die Fortsetzung
+    #    der Suche an Hauptsignalen mit Hochsignalisierung.
+    def _get_vorsignale(self, name, vorsignal_knoten, richtung, geschw_naechstes_hsig, geschw_naechstes_hsig_startsignal_halt,
+            aktuelle_signalgeschwindigkeit, rgl_ggl, richtungsanzeiger, vorhandene_vorsignale):
+        dunkelschaltung = self.fahrstr_typ == FAHRSTR_TYP_ANZEIGE
+        key = (vorsignal_knoten, richtung, geschw_naechstes_hsig, geschw_naechstes_hsig_startsignal_halt, dunkelschaltung,
+                rgl_ggl, richtungsanzeiger, vorhandene_vorsignale)
+
+        # text: Text der Meldung oder Funktion (aktuelle_signalgeschwindigkeit) -> Text bzw. None, wenn keine Meldung ausgegeben wird
+        # mit_name: Meldung mit dem Namen der Fahrstrasse einleiten
+        def ausgeben(level, text, mit_name):
+            if callable(text):
+                text = text(aktuelle_signalgeschwindigkeit)
+                if text is None:
+                    return
+            logging.log(level, "{}: {}".format(name, text) if mit_name else text)
+
+        try:
+            (vorsignale, meldungen) = self.vorsignale[key]
+        except KeyError:
+            self.vorsignale_statistik[1] += 1
+        else:
+            self.vorsignale_statistik[0] += 1
+            for level, text, mit_name in meldungen:
+                ausgeben(level, text, mit_name)
+            return vorsignale
+
+        vorsignale = []
+        meldungen = []
+        besucht = self.vorsignal_graph.neue_suche()
+
+        def meldung(level, text, mit_name=True):
+            meldungen.append((level, text, mit_name))
+            ausgeben(level, text, mit_name)
+
+        # hochsignalisierung: True, wenn die Suche ueber ein Hauptsignal mit Hochsignalisierungs-Flag hinaus fortgesetzt wurde.
+        def finde_vsig_rek(vorsignal_knoten, richtung, signalgeschwindigkeit, geschw_naechstes_hsig, geschw_naechstes_hsig_startsignal_halt, hochsignalisierung, dunkelschaltung):
+            for kante in vorsignal_knoten.get_vorsignal_kanten(richtung):
+                # TODO: Ziel ist hier, die Zeile zu bestimmen, auf der das vorherige Hauptsignal steht.
+                # Eigentlich muesste man Signalgeschwindigkeit-Ereignisse im Startsignal ebenfalls beruecksichtigen.
+                if kante.hat_ende_weichenbereich:
+                    signalgeschwindigkeit_neu = kante.signalgeschwindigkeit
+                else:
+                    signalgeschwindigkeit_neu = geschw_min(signalgeschwindigkeit, kante.signalgeschwindigkeit)
+
+                spalte = None
+                for vsig in kante.vorsignale:
+                    if vsig not in vorhandene_vorsignale and not any(vsig == vsig_existiert.refpunkt for vsig_existiert in vorsignale):
+                        meldung(logging.DEBUG, "Vorsignal an {} (geplante Gewschwindigkeit: {})".format(vsig, str_geschw(geschw_naechstes_hsig)), mit_name=False)
+                        spalte = None
+                        spalte_startsignal_halt = None
+                        if dunkelschaltung:
+                            try:
+                                spalte = vsig.signal().spalten.index(-2.0)
+                            except ValueError:
+                                # Das ist ziemlich normal, etwa bei 500-Hz-Magneten.
+                                meldung(logging.DEBUG, "An {} (Ref. {}) wurde keine Vorsignalspalte fuer Geschwindigkeit -2 (Dunkelschaltung) gefunden. Suche Vorsignalspalte gemaess Signalgeschwindigkeit {}".format(vsig.signal(), vsig.refnr, geschw_naechstes_hsig))
+                                if vsig.signal().get_vsig_spalte(geschw_naechstes_hsig) != vsig.signal().get_vsig_spalte(-1):
+                                    meldung(logging.WARNING, "An {} (Ref. {}) wurde keine Vorsignalspalte fuer Geschwindigkeit -2 (Dunkelschaltung) gefunden. Im Zusi-3D-Editor wuerde die Spalte mit der hoechsten Signalgeschwindigkeit angesteuert.".format(vsig.signal(), vsig.refnr))
+
+                        if spalte is None:
+                            spalte = vsig.signal().get_vsig_spalte(geschw_naechstes_hsig)
+                            if not hochsignalisierung:
+                                def alter_algorithmus(aktuelle_signalgeschwindigkeit, signal=vsig.signal(), spalte=spalte):
+                                    spalte_alt = signal.get_vsig_spalte(aktuelle_signalgeschwindigkeit) # mit dem alten Algorithmus
+                                    if spalte != spalte_alt:
+                                        return "Vorsignalsuche: {} wird mit dem neuen Algorithmus auf Spalte {} ({}) statt {} ({}) gestellt".format(signal, spalte, str_geschw(geschw_naechstes_hsig), spalte_alt, str_geschw(aktuelle_signalgeschwindigkeit))
+                                meldung(logging.DEBUG, alter_algorithmus)
+                            if len(vsig.signal().richtungsvoranzeiger) > 0:
+                                meldung(logging.DEBUG, "Vorsignalsuche: {} Suche Richtungsvoranzeiger \"{}\" Spalte {} Ggl {}".format(vsig.signal(), richtungsanzeiger, spalte, rgl_ggl))
+                                try:
+                                    spalte = vsig.signal().get_richtungsvoranzeiger_spalte(0 if spalte is None else spalte, rgl_ggl, richtungsanzeiger)
+                                except:
+                                    meldung(logging.ERROR, "Vorsignalsuche: {} Scheitern der Suche Richtungsvoranzeiger \"{}\" Spalte {} Ggl {}".format(vsig.signal(), richtungsanzeiger, spalte, rgl_ggl))
+                                    raise
+
+                            spalte_startsignal_halt = vsig.signal().get_vsig_spalte(geschw_naechstes_hsig_startsignal_halt)
+
+                        # Erzeuge Vsig-Verknuepfung nur, wenn die Stellung des Fahrstrassen-Startsignals einen Einfluss auf die gewaehlte Vsig-Spalte hat.
+                        if spalte != spalte_startsignal_halt:
+                            if spalte is None:
+                                meldung(logging.WARNING, lambda aktuelle_signalgeschwindigkeit, vsig=vsig: "An {} ({}) wurde keine Vorsignalspalte fuer Geschwindigkeit {} gefunden".format(
+                                        vsig.signal(), vsig.element_richtung, str_geschw(aktuelle_signalgeschwindigkeit)))
+                            else:
+                                vorsignale.append(FahrstrVorsignal(vsig, spalte))
+                        else:
+                            meldung(logging.COMPAT, "Vorsignalsuche: {} wird vom Startsignal der Fahrstrasse nicht beeinflusst (gleiche Spalte {} fuer Geschwindigkeiten {} und {}) und daher nicht verknuepft".format(vsig.signal(), spalte, str_geschw(geschw_naechstes_hsig), str_geschw(geschw_naechstes_hsig_startsignal_halt)))
+
+                # Rekursiver Aufruf fuer Folgekanten
+                if kante.vorher_keine_vsig_verknuepfung or kante.ziel is None or besucht.ist_besucht(kante.ziel.knoten):
+                    continue
+
+                besucht.markiere_besucht(kante.ziel.knoten)
+
+                if ist_hsig_fuer_fahrstr_typ(kante.ziel.signal(), FAHRSTR_TYP_ZUG) and \
+                        kante.ziel.signal().sigflags & SIGFLAG_HOCHSIGNALISIERUNG != 0:
+                    zeile = kante.ziel.signal().get_hsig_zeile(self.fahrstr_typ, signalgeschwindigkeit_neu,
+                            lambda level, text: meldung(level, text, mit_name=False)) # TODO: Richtungsanzeiger beachten?
+                    if spalte is None:
+                        meldung(logging.WARNING, "{} hat Hochsignalisierung aktiviert, aber keine Zeile fuer Typ {}, Geschwindigkeit {}. Es werden keine weiteren Vorsignale gesucht.".format(kante.ziel.signal(), str_fahrstr_typ(self.fahrstr_typ), str_geschw(signalgeschwindigkeit_neu)))
+                        continue
+
+                    if zeile is None:
+                        meldung(logging.WARNING, "{} Keine passende Zelle fuer Typ {}, Geschwindigkeit {} gefunden.".format(kante.ziel.signal(), str_fahrstr_typ(self.fahrstr_typ), str_geschw(signalgeschwindigkeit_neu)))
+                        continue
+
+                    spalte = kante.ziel.signal().get_vsig_spalte(geschw_naechstes_hsig)
+                    if spalte is None:
+                        spalte = 0
+                    if spalte >= len(kante.ziel.signal().spalten):
+                        continue
+
+                    spalte_startsignal_halt = kante.ziel.signal().get_vsig_spalte(geschw_naechstes_hsig_startsignal_halt)
+                    if spalte_startsignal_halt is None:
+                        spalte_startsignal_halt = 0
+                    if spalte_startsignal_halt >= len(kante.ziel.signal().spalten):
+                        continue
+
+                    geschw_naechstes_hsig_neu = kante.ziel.signal().matrix_geschw(zeile, spalte)
+                    geschw_naechstes_hsig_startsignal_halt_neu = kante.ziel.signal().matrix_geschw(zeile, spalte_startsignal_halt)
+                    if geschw_naechstes_hsig_neu != geschw_naechstes_hsig_startsignal_halt_neu:
+                        if geschw_kleiner(geschw_naechstes_hsig_neu, geschw_naechstes_hsig_startsignal_halt_neu):
+                            meldung(logging.WARNING, "{} hat Hochsignalisierung aktiviert und wechselt beim Stellen der Fahrstrasse auf eine niedrigere Geschwindigkeit (von {} auf {})".format(kante.ziel.signal(), str_geschw(geschw_naechstes_hsig_startsignal_halt_neu), str_geschw(geschw_naechstes_hsig_neu)))
+                        meldung(logging.DEBUG, "Hochsignalisierung an {} aktiviert (aktive Zeile: Zeile {} fuer Geschwindigkeit {}), suche weitere Vorsignale mit Vsig-Geschwindigkeit {} (vergleichswert Halt: {})".format(kante.ziel.signal(), zeile, str_geschw(signalgeschwindigkeit_neu), str_geschw(geschw_naechstes_hsig_neu), str_geschw(geschw_naechstes_hsig_startsignal_halt_neu)))
+                        finde_vsig_rek(kante.ziel.knoten, kante.ziel.richtung, -1, geschw_naechstes_hsig_neu, geschw_naechstes_hsig_startsignal_halt_neu, True, dunkelschaltung)
+                    else:
+                        meldung(logging.DEBUG, "Hochsignalisierung an {} aktiviert (aktive Zeile: Zeile {} fuer Geschwindigkeit {}), aber Startsignal beeinflusst kuenftige Vorsignalstellungen nicht mehr (Spalte {} fuer {} vs {} fuer {}). Suche keine weiteren Vorsignale.".format(kante.ziel.signal(), zeile, str_geschw(signalgeschwindigkeit_neu), spalte, str_geschw(geschw_naechstes_hsig), spalte_startsignal_halt, str_geschw(geschw_naechstes_hsig_startsignal_halt)))
+                else:
+                    finde_vsig_rek(kante.ziel.knoten, kante.ziel.richtung, signalgeschwindigkeit_neu, geschw_naechstes_hsig, geschw_naechstes_hsig_startsignal_halt, hochsignalisierung, dunkelschaltung)
+
+
+        finde_vsig_rek(vorsignal_knoten, richtung, -1.0, geschw_naechstes_hsig, geschw_naechstes_hsig_startsignal_halt, hochsignalisierung=False, dunkelschaltung=dunkelschaltung)
+        self.vorsignale[key] = (vorsignale, meldungen)
+        return vorsignale
+
     # Gibt zurueck, ob fuer das angegebene Signal die Warnung ausgegeben werden soll,
     # dass es vom Zusi-3D-Editor auf einen Rangier-Fahrtbegriff gestellt werden wuerde.
     def _rangiersignal_in_zugfahrstr_warnung(self, signal):
@@ -462,108 +685,17 @@ class FahrstrassenSuche:
         if startsignal_verkn is not None and not startsignal_verkn.ist_ersatzsignal and self.vorsignal_graph is not None:
             vorsignal_knoten = self.vorsignal_graph.get_knoten(einzelfahrstrassen[0].start.knoten.element)
             if vorsignal_knoten is not None:
-
-                # hochsignalisierung: True, wenn die Suche ueber ein Hauptsignal mit Hochsignalisierungs-Flag hinaus fortgesetzt wurde.
-                def finde_vsig_rek(vorsignal_knoten, richtung, signalgeschwindigkeit, geschw_naechstes_hsig, geschw_naechstes_hsig_startsignal_halt, hochsignalisierung, dunkelschaltung):
-                    for kante in vorsignal_knoten.get_vorsignal_kanten(richtung):
-                        # TODO: Ziel ist hier, die Zeile zu bestimmen, auf der das vorherige Hauptsignal steht.
-                        # Eigentlich muesste man Signalgeschwindigkeit-Ereignisse im Startsignal ebenfalls beruecksichtigen.
-                        if kante.hat_ende_weichenbereich:
-                            signalgeschwindigkeit_neu = kante.signalgeschwindigkeit
-                        else:
-                            signalgeschwindigkeit_neu = geschw_min(signalgeschwindigkeit, kante.signalgeschwindigkeit)
-
-                        spalte = None
-                        for vsig in kante.vorsignale:
-                            if not any(vsig == vsig_existiert.refpunkt for vsig_existiert in result.vorsignale):
-                                logging.debug("Vorsignal an {} (geplante Gewschwindigkeit: {})".format(vsig, str_geschw(geschw_naechstes_hsig)))
-                                spalte = None
-                                spalte_startsignal_halt = None
-                                if dunkelschaltung:
-                                    try:
-                                        spalte = vsig.signal().spalten.index(-2.0)
-                                    except ValueError:
-                                        # Das ist ziemlich normal, etwa bei 500-Hz-Magneten.
-                                        logging.debug("{}: An {} (Ref. {}) wurde keine Vorsignalspalte fuer Geschwindigkeit -2 (Dunkelschaltung) gefunden. Suche Vorsignalspalte gemaess Signalgeschwindigkeit {}".format(result.name, vsig.signal(), vsig.refnr, geschw_naechstes_hsig))
-                                        if vsig.signal().get_vsig_spalte(geschw_naechstes_hsig) != vsig.signal().get_vsig_spalte(-1):
-                                            logging.warn("{}: An {} (Ref. {}) wurde keine Vorsignalspalte fuer Geschwindigkeit -2 (Dunkelschaltung) gefunden. Im Zusi-3D-Editor wuerde die Spalte mit der hoechsten Signalgeschwindigkeit angesteuert.".format(result.name, vsig.signal(), vsig.refnr))
-
-                                if spalte is None:
-                                    spalte = vsig.signal().get_vsig_spalte(geschw_naechstes_hsig)
-                                    if not hochsignalisierung:
-                                        spalte_alt = vsig.signal().get_vsig_spalte(aktuelle_signalgeschwindigkeit) # mit dem alten Algorithmus
-                                        if spalte != spalte_alt:
-                                            logging.debug("{}: Vorsignalsuche: {} wird mit dem neuen Algorithmus auf Spalte {} ({}) statt {} ({}) gestellt".format(result.name, vsig.signal(), spalte, str_geschw(geschw_naechstes_hsig), spalte_alt, str_geschw(aktuelle_signalgeschwindigkeit)))
-                                    if len(vsig.signal().richtungsvoranzeiger) > 0:
-                                        logging.debug("{}: Vorsignalsuche: {} Suche Richtungsvoranzeiger \"{}\" Spalte {} Ggl {}".format(result.name, vsig.signal(), result.richtungsanzeiger, spalte, result.rgl_ggl))
-                                        try:
-                                            spalte = vsig.signal().get_richtungsvoranzeiger_spalte(0 if spalte is None else spalte, result.rgl_ggl, result.richtungsanzeiger)
-                                        except:
-                                            logging.error("{}: Vorsignalsuche: {} Scheitern der Suche Richtungsvoranzeiger \"{}\" Spalte {} Ggl {}".format(result.name, vsig.signal(), result.richtungsanzeiger, spalte, result.rgl_ggl))
-                                            raise
-
-                                    spalte_startsignal_halt = vsig.signal().get_vsig_spalte(geschw_naechstes_hsig_startsignal_halt)
-
-                                # Erzeuge Vsig-Verknuepfung nur, wenn die Stellung des Fahrstrassen-Startsignals einen Einfluss auf die gewaehlte Vsig-Spalte hat.
-                                if spalte != spalte_startsignal_halt:
-                                    if spalte is None:
-                                        logging.warn("{}: An {} ({}) wurde keine Vorsignalspalte fuer Geschwindigkeit {} gefunden".format(result.name, vsig.signal(), vsig.element_richtung, str_geschw(aktuelle_signalgeschwindigkeit)))
-                                    else:
-                                        result.vorsignale.append(FahrstrVorsignal(vsig, spalte))
-                                else:
-                                    logging.log(logging.COMPAT, "{}: Vorsignalsuche: {} wird vom Startsignal der Fahrstrasse nicht beeinflusst (gleiche Spalte {} fuer Geschwindigkeiten {} und {}) und daher nicht verknuepft".format(result.name, vsig.signal(), spalte, str_geschw(geschw_naechstes_hsig), str_geschw(geschw_naechstes_hsig_startsignal_halt)))
-
-                        # Rekursiver Aufruf fuer Folgekanten
-                        if kante.vorher_keine_vsig_verknuepfung or kante.ziel is None or kante.ziel.knoten.ist_besucht():
-                            continue
-
-                        kante.ziel.knoten.markiere_besucht()
-
-                        if ist_hsig_fuer_fahrstr_typ(kante.ziel.signal(), FAHRSTR_TYP_ZUG) and \
-                                kante.ziel.signal().sigflags & SIGFLAG_HOCHSIGNALISIERUNG != 0:
-                            zeile = kante.ziel.signal().get_hsig_zeile(self.fahrstr_typ, signalgeschwindigkeit_neu) # TODO: Richtungsanzeiger beachten?
-                            if spalte is None:
-                                logging.warn("{}: {} hat Hochsignalisierung aktiviert, aber keine Zeile fuer Typ {}, Geschwindigkeit {}. Es werden keine weiteren Vorsignale gesucht.".format(result.name, kante.ziel.signal(), str_fahrstr_typ(self.fahrstr_typ), str_geschw(signalgeschwindigkeit_neu)))
-                                continue
-
-                            if zeile is None:
-                                logging.warn("{}: {} Keine passende Zelle fuer Typ {}, Geschwindigkeit {} gefunden.".format(result.name, kante.ziel.signal(), str_fahrstr_typ(self.fahrstr_typ), str_geschw(signalgeschwindigkeit_neu)))
-                                continue
-
-                            spalte = kante.ziel.signal().get_vsig_spalte(geschw_naechstes_hsig)
-                            if spalte is None:
-                                spalte = 0
-                            if spalte >= len(kante.ziel.signal().spalten):
-                                continue
-
-                            spalte_startsignal_halt = kante.ziel.signal().get_vsig_spalte(geschw_naechstes_hsig_startsignal_halt)
-                            if spalte_startsignal_halt is None:
-                                spalte_startsignal_halt = 0
-                            if spalte_startsignal_halt >= len(kante.ziel.signal().spalten):
-                                continue
-
-                            geschw_naechstes_hsig_neu = kante.ziel.signal().matrix_geschw(zeile, spalte)
-                            geschw_naechstes_hsig_startsignal_halt_neu = kante.ziel.signal().matrix_geschw(zeile, spalte_startsignal_halt)
-                            if geschw_naechstes_hsig_neu != geschw_naechstes_hsig_startsignal_halt_neu:
-                                if geschw_kleiner(geschw_naechstes_hsig_neu, geschw_naechstes_hsig_startsignal_halt_neu):
-                                    logging.warn("{}: {} hat Hochsignalisierung aktiviert und wechselt beim Stellen der Fahrstrasse auf eine niedrigere Geschwindigkeit (von {} auf {})".format(result.name, kante.ziel.signal(), str_geschw(geschw_naechstes_hsig_startsignal_halt_neu), str_geschw(geschw_naechstes_hsig_neu)))
-                                logging.debug("{}: Hochsignalisierung an {} aktiviert (aktive Zeile: Zeile {} fuer Geschwindigkeit {}), suche weitere Vorsignale mit Vsig-Geschwindigkeit {} (vergleichswert Halt: {})".format(result.name, kante.ziel.signal(), zeile, str_geschw(signalgeschwindigkeit_neu), str_geschw(geschw_naechstes_hsig_neu), str_geschw(geschw_naechstes_hsig_startsignal_halt_neu)))
-                                finde_vsig_rek(kante.ziel.knoten, kante.ziel.richtung, -1, geschw_naechstes_hsig_neu, geschw_naechstes_hsig_startsignal_halt_neu, True, dunkelschaltung)
-                            else:
-                                logging.debug("{}: Hochsignalisierung an {} aktiviert (aktive Zeile: Zeile {} fuer Geschwindigkeit {}), aber Startsignal beeinflusst kuenftige Vorsignalstellungen nicht mehr (Spalte {} fuer {} vs {} fuer {}). Suche keine weiteren Vorsignale.".format(result.name, kante.ziel.signal(), zeile, str_geschw(signalgeschwindigkeit_neu), spalte, str_geschw(geschw_naechstes_hsig), spalte_startsignal_halt, str_geschw(geschw_naechstes_hsig_startsignal_halt)))
-                        else:
-                            finde_vsig_rek(kante.ziel.knoten, kante.ziel.richtung, signalgeschwindigkeit_neu, geschw_naechstes_hsig, geschw_naechstes_hsig_startsignal_halt, hochsignalisierung, dunkelschaltung)
-
                 spalte = result.start.signal().get_vsig_spalte(0)
                 if spalte is None:
                     spalte = 0
 
-                self.vorsignal_graph.markiere_unbesucht()
                 geschw_naechstes_hsig = result.start.signal().matrix_geschw(startsignal_verkn.zeile, spalte)
                 geschw_naechstes_hsig_startsignal_halt = 0
                 logging.debug("{}: Bestimme Geschwindigkeit fuer Vorsignalsuche aus Zeile {}, Spalte {} der Matrix des Startsignals => v={}".format(result.name, startsignal_verkn.zeile, spalte, str_geschw(geschw_naechstes_hsig)))
                 logging.debug("{}: Suche Vorsignale ab {}, Vsig-Geschwindigkeit {}/{}".format(result.name, vorsignal_knoten.signal(result.start.element_richtung.richtung), str_geschw(geschw_naechstes_hsig), str_geschw(geschw_naechstes_hsig_startsignal_halt)))
-                finde_vsig_rek(vorsignal_knoten, result.start.element_richtung.richtung, -1.0, geschw_naechstes_hsig, geschw_naechstes_hsig_startsignal_halt, hochsignalisierung=False, dunkelschaltung=self.fahrstr_typ == FAHRSTR_TYP_ANZEIGE)
+                result.vorsignale.extend(self._get_vorsignale(result.name, vorsignal_knoten, result.start.element_richtung.richtung,
+                        geschw_naechstes_hsig, geschw_naechstes_hsig_startsignal_halt, aktuelle_signalgeschwindigkeit,
+                        result.rgl_ggl, result.richtungsanzeiger, frozenset(v.refpunkt for v in result.vorsignale)))
 
         if startsignal_verkn is not None:
             result.signale.append(startsignal_verkn)
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-import xml.etree.ElementTree as ET
+from .xmlbackend import ET
 import logging
 from collections import namedtuple
 
@@ -91,6 +91,58 @@ class Fahrstrasse:
 
         return result
 
+    # Kompakte Darstellung (nur Zahlen, Zeichenketten, Tupel und Listen) zur Uebergabe zwischen Prozessen.
+    # Referenzpunkte werden als (Modulpfad, Index in modul.referenzelemente) abgelegt. Gegenstueck: fahrstrasse_aus_daten
+    def zu_daten(self):
+        def rp(refpunkt):
+            return (refpunkt.element_richtung.element.modul.relpath, refpunkt.idx)
+
+        return (
+            self.fahrstr_typ, self.name, rp(self.start), rp(self.ziel), self.zufallswert,
+            [rp(r) for r in self.register],
+            [(rp(w.refpunkt), w.weichenlage) for w in self.weichen],
+            [(rp(s.refpunkt), s.zeile, s.ist_ersatzsignal) for s in self.signale],
+            [(rp(v.refpunkt), v.spalte) for v in self.vorsignale],
+            [rp(r) for r in self.teilaufloesepunkte],
+            [rp(r) for r in self.aufloesepunkte],
+            [rp(r) for r in self.signalhaltfallpunkte],
+            self.laenge, self.laenge_zusi, self.laenge_zusi_vor_3_1_7_2, self.signalgeschwindigkeiten,
+            self.rgl_ggl, self.streckenname, self.richtungsanzeiger,
+        )
+
+# Legt eine Fahrstrasse aus der Darstellung von Fahrstrasse.zu_daten an. Die Referenzpunkte werden in den Modulen
+# dieses Prozesses gesucht (Module werden bei Bedarf geladen).
+def fahrstrasse_aus_daten(daten):
+    from . import modulverwaltung
+
+    def rp(relpath_idx):
+        relpath, idx = relpath_idx
+        return modulverwaltung.get_modul_by_name(relpath, None).refpunkt_by_idx(idx)
+
+    (fahrstr_typ, name, start, ziel, zufallswert, register, weichen, signale, vorsignale, teilaufloesepunkte, aufloesepunkte, signalhaltfallpunkte,
+            laenge, laenge_zusi, laenge_zusi_vor_3_1_7_2, signalgeschwindigkeiten, rgl_ggl, streckenname, richtungsanzeiger) = daten
+
+    result = Fahrstrasse(fahrstr_typ)
+    result.name = name
+    result.start = rp(start)
+    result.ziel = rp(ziel)
+    result.zufallswert = zufallswert
+    result.register = [rp(r) for r in register]
+    result.weichen = [FahrstrWeichenstellung(rp(r), weichenlage) for (r, weichenlage) in weichen]
+    result.signale = [FahrstrHauptsignal(rp(r), zeile, ist_ersatzsignal) for (r, zeile, ist_ersatzsignal) in signale]
+    result.vorsignale = [FahrstrVorsignal(rp(r), spalte) for (r, spalte) in vorsignale]
+    result.teilaufloesepunkte = [rp(r) for r in teilaufloesepunkte]
+    result.aufloesepunkte = [rp(r) for r in aufloesepunkte]
+    result.signalhaltfallpunkte = [rp(r) for r in signalhaltfallpunkte]
+    result.laenge = laenge
+    result.laenge_zusi = laenge_zusi
+    result.laenge_zusi_vor_3_1_7_2 = laenge_zusi_vor_3_1_7_2
+    result.signalgeschwindigkeiten = signalgeschwindigkeiten
+    result.rgl_ggl = rgl_ggl
+    result.streckenname = streckenname
+    result.richtungsanzeiger = richtungsanzeiger
+    return result
+
 # Eine einzelne Fahrstrasse (= Liste von Kanten)
 # von einem Hauptsignal oder Aufgleispunkt zu einem Hauptsignal,
 # ohne dazwischenliegende Hauptsignale (etwa fuer Kennlichtschaltungen).
@@ -105,6 +157,7 @@ class EinzelFahrstrasse:
         self.signalgeschwindigkeiten = []   # Minimale Signalgeschwindigkeit getrennt nach allen allein stehenden Zs3
         self.signalgeschwindigkeiten.append(-1.0)
         self.hat_ende_weichenbereich = False  # Wurde im Verlauf der Erstellung dieser Fahrstrasse schon ein Weichenbereich-Ende angetroffen?
+        self.weichenstellungen = None  # Zwischengespeichertes Ergebnis von get_weichenstellungen
 
     def __repr__(self):
         if self.kanten is None:
@@ -129,18 +182,47 @@ class EinzelFahrstrasse:
         if kante.hat_zusatzanzeiger:
             self.signalgeschwindigkeiten.append(-1)
         self.hat_ende_weichenbereich = self.hat_ende_weichenbereich or kante.hat_ende_weichenbereich
+        self.weichenstellungen = None
 
-    def erweiterte_kopie(self, kante):
+    # Wie erweitere, gibt aber zusaetzlich zurueck, was kuerze() braucht, um die Erweiterung rueckgaengig zu machen.
+    def erweitere_umkehrbar(self, kante):
+        rueckgaengig = (self.ziel, self.kanten, self.laenge, self.laenge_zusi,
+                self.signalgeschwindigkeiten[-1], len(self.signalgeschwindigkeiten), self.hat_ende_weichenbereich)
+        self.erweitere(kante)
+        return rueckgaengig
+
+    def kuerze(self, rueckgaengig):
+        (self.ziel, self.kanten, self.laenge, self.laenge_zusi,
+                letzte_signalgeschwindigkeit, anzahl_signalgeschwindigkeiten, self.hat_ende_weichenbereich) = rueckgaengig
+        del self.signalgeschwindigkeiten[anzahl_signalgeschwindigkeiten:]
+        self.signalgeschwindigkeiten[-1] = letzte_signalgeschwindigkeit
+        self.weichenstellungen = None
+
+    def kopie(self):
         result = EinzelFahrstrasse()
         result.start = self.start
+        result.ziel = self.ziel
         result.kanten = self.kanten
         result.laenge = self.laenge
         result.laenge_zusi = self.laenge_zusi
         result.signalgeschwindigkeiten = self.signalgeschwindigkeiten.copy()
         result.hat_ende_weichenbereich = self.hat_ende_weichenbereich
+        return result
+
+    def erweiterte_kopie(self, kante):
+        result = self.kopie()
         result.erweitere(kante)
         return result
 
+    # Gibt die Weichenstellungen dieser Fahrstrasse als Menge von Tupeln
+    # (Modulpfad in Grossbuchstaben, Referenznummer, Weichenlage) zurueck.
+    def get_weichenstellungen(self):
+        if self.weichenstellungen is None:
+            self.weichenstellungen = frozenset(
+                    (w.refpunkt.element_richtung.element.modul.relpath.upper(), w.refpunkt.refnr, w.weichenlage)
+                    for kante in self.kantenliste() for w in kante.weichen)
+        return self.weichenstellungen
+
     def kantenliste(self):
         result = []
         kante = self.kanten
@@ -149,3 +231,71 @@ class EinzelFahrstrasse:
             kante = kante.prev
         result.reverse()
         return result
+
+# Alle Einzelfahrstrassen, die an einem Knoten beginnen, als Graph aus Fahrstrassen-Kanten:
+# Jeder Weg vom Start zu einem Zielsignal ist eine Einzelfahrstrasse. Gemeinsame Anfangs- und Endstuecke
+# werden so nur einmal gespeichert. Die Einzelfahrstrassen werden erst beim Iterieren erzeugt.
+class EinzelFahrstrassenGraph:
+    def __init__(self, start):
+        self.start = start  # KnotenUndRichtung
+        self.startkanten = []  # [FahrstrGraphKante] -- Kanten ab dem Start, ueber die ein Zielsignal erreichbar ist
+        self.start_anzahl = None  # Anzahl Wege ab dem Start je Zielsignal (Counter, in der Reihenfolge der Tiefensuche)
+        self.start_kombinationen = None  # wie start_anzahl, Wege mit bedingten Registern zaehlen doppelt (mit und ohne bedingte Register)
+        self.kanten = dict()  # KnotenUndRichtung -> [FahrstrGraphKante] -- wie startkanten fuer die uebrigen Knoten
+        self.anzahl = dict()  # KnotenUndRichtung -> Counter -- wie start_anzahl fuer die uebrigen Knoten, bei Zielsignalen {Zielsignal: 1}
+        self.kombinationen = dict()  # KnotenUndRichtung -> Counter -- wie start_kombinationen fuer die uebrigen Knoten
+        self.ziele = set()  # KnotenUndRichtung der Zielsignale
+
+        self.nur_erste = False  # Nur die erste Einzelfahrstrasse zu jedem Zielsignal liefern?
+        self.bedingungen = dict()  # Zielsignal -> Bedingung, die die gelieferten Einzelfahrstrassen zu diesem Ziel erfuellen muessen
+
+    def __repr__(self):
+        return "EinzelFahrstrassenGraph<{}>".format(self.start)
+
+    # Gibt pro Zielsignal eine obere Schranke fuer die Anzahl der gelieferten Einzelfahrstrassen zurueck,
+    # multipliziert mit der Anzahl ihrer Kombinationen bedingter Register (siehe get_bedingte_register_kombinationen).
+    def geschaetzte_anzahl(self):
+        if self.nur_erste:
+            return dict((ziel, min(anzahl, 2)) for ziel, anzahl in self.start_kombinationen.items())
+        return self.start_kombinationen
+
+    # Liefert die ausgewaehlten Einzelfahrstrassen (siehe nur_erste und bedingungen) in der Reihenfolge der Tiefensuche.
+    def __iter__(self):
+        return self._wege(None)
+
+    # Liefert alle Einzelfahrstrassen zum angegebenen Zielsignal in der Reihenfolge der Tiefensuche.
+    def wege(self, ziel):
+        return self._wege(ziel)
+
+    def _wege(self, nur_ziel):
+        fahrstrasse = EinzelFahrstrasse()
+        erledigt = set()  # Zielsignale, zu denen wegen nur_erste nichts mehr geliefert wird
+        stapel = [(iter(self.startkanten), None)]  # [(Iterator ueber die restlichen Folgekanten, Rueckgaengig-Information der Kante zu diesem Knoten)]
+
+        while len(stapel):
+            # Kanten ueberspringen, ueber die kein (noch nicht erledigtes) gesuchtes Zielsignal erreichbar ist.
+            for kante in stapel[-1][0]:
+                if nur_ziel is not None:
+                    if nur_ziel in self.anzahl[kante.ziel]:
+                        break
+                elif not erledigt or not erledigt.issuperset(self.anzahl[kante.ziel]):
+                    break
+            else:
+                (_, rueckgaengig) = stapel.pop()
+                if rueckgaengig is not None:
+                    fahrstrasse.kuerze(rueckgaengig)
+                continue
+
+            rueckgaengig = fahrstrasse.erweitere_umkehrbar(kante)
+            if kante.ziel in self.ziele:
+                if nur_ziel is not None:
+                    yield fahrstrasse.kopie()
+                elif kante.ziel not in erledigt:
+                    bedingung = self.bedingungen.get(kante.ziel)
+                    if bedingung is None or bedingung.ist_erfuellt(fahrstrasse):
+                        if self.nur_erste:
+                            erledigt.add(kante.ziel)
+                        yield fahrstrasse.kopie()
+                fahrstrasse.kuerze(rueckgaengig)
+            else:
+                stapel.append((iter(self.kanten[kante.ziel]), rueckgaengig))
@@ -2,8 +2,10 @@
 
 from .konstanten import *
 from .streckengraph import Streckengraph, Knoten
-from .strecke import gegenrichtung
+from .strecke import gegenrichtung, zwischenspeicher_log
 from .fahrstrasse import FahrstrFlankenschutzWeichenstellung
+from . import modulverwaltung
+from . import modulcache
 
 import logging
 
@@ -11,24 +13,64 @@ import logging
 # Knoten sind zusaetzlich Zugfahrt-Hauptsignale sowie Gleissperren (Signale mit Entgleisen-Ereignis).
 # NB. Der Einfachheit halber werden Gleissperren als in beide Richtungen wirksam betrachtet.
 class FlankenschutzGraph(Streckengraph):
+    # Hauptsignale beliebigen Typs verhindern die Erzeugung von Flankenschutz-Verknuepfungen,
+    # da zu ihnen potenziell eine Fahrstrasse gestellt sein kann, in der eine Weiche verknuepft ist.
     def __init__(self):
-        super().__init__()
+        super().__init__(KNOTEN_WEICHE | KNOTEN_HSIG_BELIEBIG | KNOTEN_GLEISSPERRE)
+
+        # Vorab berechnete Flankenschutz-Stellungen (siehe lade_tabellen):
+        # Modul -> {(Elementnummer, Richtung (0 = Norm, 1 = Gegen), Nachfolger-Index) -> [(Modulpfad, Referenzpunkt-Index, Weichenlage, Abstand)]}
+        self.tabellen = dict()
 
     def _neuer_knoten(self, element):
         return FlankenschutzGraphKnoten(self, element)
 
-    def _ist_knoten(self, element):
-        if element is None:
-            return False
-        if super()._ist_knoten(element):
-            return True
-        for richtung in [NORM, GEGEN]:
-            signal = element.signal(richtung)
-            # Hauptsignale beliebigen Typs verhindern die Erzeugung von Flankenschutz-Verknuepfungen,
-            # da zu ihnen potenziell eine Fahrstrasse gestellt sein kann, in der eine Weiche verknuepft ist.
-            if signal is not None and (any(zeile.hsig_geschw == 0 and zeile.fahrstr_typ != 0 for zeile in signal.zeilen) or signal.ist_gleissperre):
-                return True
-        return False
+    # Liest die Flankenschutz-Stellungen aller Weichen in den angegebenen Modulen aus dem Cache im angegebenen Verzeichnis
+    # oder berechnet sie und legt sie dort ab. Die Fahrstrassensuche muss dann fuer diese Weichen nicht mehr suchen.
+    # Die Flankenschutz-Stellungen haengen nur von der Topologie in der Umgebung der Weiche ab, deshalb wird ein Cache-Eintrag
+    # erst ungueltig, wenn sich eine der dabei besuchten Moduldateien aendert.
+    def lade_tabellen(self, module, verzeichnis, neu_aufbauen):
+        for modul in module:
+            tabelle = None if neu_aufbauen else modulcache.lese_zusatzdaten(verzeichnis, modul.dateiname, ".flankenschutz")
+            if tabelle is None:
+                tabelle, besuchte_module = self._berechne_tabelle(modul)
+                zwischenspeicher_log.debug("Flankenschutz-Tabelle fuer Modul {} berechnet ({} Eintraege)".format(modul.relpath, len(tabelle)))
+                modulcache.schreibe_zusatzdaten(verzeichnis, modul.dateiname, ".flankenschutz", [m.dateiname for m in besuchte_module], tabelle)
+            self.tabellen[modul] = tabelle
+
+    # Berechnet die Flankenschutz-Stellungen aller Weichen des angegebenen Moduls. Gibt (Tabelle, besuchte Module) zurueck.
+    # Stellungen, deren Suche ein noch nicht geladenes oder ein eventuell zurueckgeschriebenes Modul betreten
+    # oder eine Meldung ausgeben wuerde, fehlen in der Tabelle und werden bei Bedarf wie bisher einzeln gesucht.
+    def _berechne_tabelle(self, modul):
+        tabelle = dict()
+        besuchte_module = set([modul])
+        for nr in modul.streckenelemente:
+            for richtung in [NORM, GEGEN]:
+                anzahl = modul.adjazenz.anzahl_nachfolger(modul.element_index[nr], richtung)
+                if anzahl < 2:
+                    continue
+                knoten = self.get_knoten(modul.streckenelemente[nr])
+                if knoten is None:
+                    continue
+                for idx in range(anzahl):
+                    try:
+                        stellungen = knoten._get_flankenschutz_stellungen(richtung, idx, _nicht_tabellierbar, besuchte_module)
+                    except _NichtTabellierbar:
+                        continue
+                    tabelle[(nr, 0 if richtung == NORM else 1, idx)] = [
+                            (w.refpunkt.element_richtung.element.modul.relpath, w.refpunkt.idx, w.weichenlage, w.abstand) for w in stellungen]
+        return (tabelle, besuchte_module)
+
+class _NichtTabellierbar(Exception):
+    pass
+
+def _nicht_tabellierbar(level, text):
+    raise _NichtTabellierbar()
+
+# Gibt zurueck, ob alle Module, in denen Nachfolger des Elements in der angegebenen Richtung liegen, bereits geladen sind.
+def _nachfolgemodule_geladen(element, richtung):
+    return all(modulpfad is None or not len(modulpfad) or modulverwaltung.module.get(modulverwaltung.normalize_zusi_relpath(modulpfad)) is not None
+            for (nr, modulpfad) in element.nachfolger_roh(richtung))
 
 class FlankenschutzGraphKnoten(Knoten):
     def __init__(self, graph, element):
@@ -46,13 +88,33 @@ class FlankenschutzGraphKnoten(Knoten):
         try:
             return self.flankenschutz_stellungen[key][idx]
         except KeyError:
-            logging.debug("Suche Flankenschutz-Stellungen ab {}, Nachfolger {}".format(self.richtung(richtung), idx + 1))
-            result = self._get_flankenschutz_stellungen(richtung, idx)
-            self.flankenschutz_stellungen[key][idx] = result
-            return result
+            pass
+
+        zwischenspeicher_log.debug("Suche Flankenschutz-Stellungen ab {}, Nachfolger {}".format(self.richtung(richtung), idx + 1))
+        tabelle = self.graph.tabellen.get(self.element.modul)
+        eintrag = None if tabelle is None else tabelle.get((self.element.nr, key, idx))
+        if eintrag is not None:
+            result = [FahrstrFlankenschutzWeichenstellung(modulverwaltung.get_modul_by_name(relpath, None).refpunkt_by_idx(ref_idx), weichenlage, abstand)
+                    for (relpath, ref_idx, weichenlage, abstand) in eintrag]
+        else:
+            result = self._get_flankenschutz_stellungen(richtung, idx, zwischenspeicher_log.log)
+        return self.flankenschutz_stellungen[key].setdefault(idx, result)
+
+    # meldung: Funktion (Level, Text) zur Ausgabe von Meldungen
+    # besuchte_module: Wenn angegeben, werden alle besuchten Module eingetragen, und die Suche wird mit _NichtTabellierbar
+    #   abgebrochen, sobald sie ein noch nicht geladenes oder ein eventuell zurueckgeschriebenes Modul betreten wuerde
+    #   (siehe FlankenschutzGraph.lade_tabellen).
+    def _get_flankenschutz_stellungen(self, richtung, idx, meldung, besuchte_module=None):
+        def pruefe_nachfolger(element, richtung):
+            if besuchte_module is not None:
+                if element.modul.vollstaendig:
+                    raise _NichtTabellierbar()
+                besuchte_module.add(element.modul)
+                if not _nachfolgemodule_geladen(element, richtung):
+                    raise _NichtTabellierbar()
 
-    def _get_flankenschutz_stellungen(self, richtung, idx):
         result = []
+        pruefe_nachfolger(self.element, richtung)
         for nach_idx, nachfolger in enumerate(self.element.nachfolger(richtung)):
             if nach_idx != idx:
                 # Suche die naechste stumpf befahrene Weiche.
@@ -67,6 +129,7 @@ class FlankenschutzGraphKnoten(Knoten):
                         element_richtung = None
                         break
 
+                    pruefe_nachfolger(element_richtung.element, element_richtung.richtung)
                     nachfolger_liste = element_richtung.nachfolger()
                     if len(nachfolger_liste) == 0:
                         element_richtung = None
@@ -77,24 +140,25 @@ class FlankenschutzGraphKnoten(Knoten):
                     element_richtung = nachfolger_liste[0]
 
                 if element_richtung is not None:
+                    pruefe_nachfolger(element_richtung.element, gegenrichtung(element_richtung.richtung))
                     vorgaenger_liste = element_richtung.vorgaenger()
                     if len(vorgaenger_liste) > 2:
-                        logging.warn("Element {} hat mehr als zwei Vorgaenger und wird daher beim Flankenschutz nicht beruecksichtigt.".format(element_richtung))
+                        meldung(logging.WARNING, "Element {} hat mehr als zwei Vorgaenger und wird daher beim Flankenschutz nicht beruecksichtigt.".format(element_richtung))
                     elif len(vorgaenger_liste) > 1:
                         if element_richtung.element.hat_koppelweiche(gegenrichtung(element_richtung.richtung)):
-                            logging.debug("Element {} hat eine Koppelweiche und wird daher beim Flankenschutz nicht beruecksichtigt.".format(element_richtung))
+                            meldung(logging.DEBUG, "Element {} hat eine Koppelweiche und wird daher beim Flankenschutz nicht beruecksichtigt.".format(element_richtung))
                             continue
 
                         try:
                             vorgaenger_index = vorgaenger_liste.index(element_richtung_vorgaenger)
                         except ValueError:
-                            logging.warn(("Stellung der stumpf befahrenen Weiche an Element {} von Element {} kommend konnte nicht ermittelt werden. " +
+                            meldung(logging.WARNING, ("Stellung der stumpf befahrenen Weiche an Element {} von Element {} kommend konnte nicht ermittelt werden. " +
                                     "Die Weiche wird nicht in Flankenschutzstellung gebracht.").format(element_richtung, element_richtung_vorgaenger))
                             continue
 
                         weichen_refpunkt = element_richtung.element.refpunkt(gegenrichtung(element_richtung.richtung), REFTYP_WEICHE)
                         if weichen_refpunkt is None:
-                            logging.warn(("Element {} hat mehr als einen Vorgaenger in {} Richtung, aber keinen Referenzpunkteintrag vom Typ Weiche. " +
+                            meldung(logging.WARNING, ("Element {} hat mehr als einen Vorgaenger in {} Richtung, aber keinen Referenzpunkteintrag vom Typ Weiche. " +
                                     "Diese Weiche wird nicht in Flankenschutzstellung gebracht.").format(element_richtung, gegenrichtung(element_richtung.richtung)))
                         else:
                             result.append(FahrstrFlankenschutzWeichenstellung(weichen_refpunkt, 2 if vorgaenger_index == 0 else 1, laenge))
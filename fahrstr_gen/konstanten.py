@@ -14,6 +14,25 @@ FAHRSTR_TYP_RANGIER = 2
 FAHRSTR_TYP_ZUG = 4
 FAHRSTR_TYP_ANZEIGE = 8
 
+# Eigenschaften eines Streckenelements, anhand derer die Streckengraphen ueber Knoten entscheiden (siehe Element.knotenklassen).
+# Die signalbezogenen Eigenschaften existieren je Fahrstrassentyp und werden ueber knoten_hsig usw. abgefragt.
+KNOTEN_WEICHE_NORM = 1 << 0  # mehr als ein Nachfolger in Normrichtung
+KNOTEN_WEICHE_GEGEN = 1 << 1  # mehr als ein Nachfolger in Gegenrichtung
+KNOTEN_WEICHE = KNOTEN_WEICHE_NORM | KNOTEN_WEICHE_GEGEN
+KNOTEN_AUFGLEISPUNKT = 1 << 2
+KNOTEN_GLEISSPERRE = 1 << 3
+KNOTEN_HSIG_BELIEBIG = 1 << 4  # Hauptsignal fuer einen beliebigen Fahrstrassentyp
+
+# Hauptsignal, allein stehendes Zusatzsignal (Zs3) bzw. Startsignal fuer den angegebenen Fahrstrassentyp
+def knoten_hsig(fahrstr_typ):
+    return fahrstr_typ << 8
+
+def knoten_zusatzsignal(fahrstr_typ):
+    return fahrstr_typ << 12
+
+def knoten_startsignal(fahrstr_typ):
+    return fahrstr_typ << 16
+
 def str_fahrstr_typ(typ):
     if typ == FAHRSTR_TYP_FAHRWEG:
         return "Fahrweg"
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+
+# Persistenter Cache fuer die bei der Fahrstrassengenerierung benoetigten Daten nur gelesener Module
+# (Streckenelemente mit Nachfolgern, Anschluss-Bits, Laengen, Ereignissen und Signalen sowie Referenzpunkte).
+#
+# Pro Moduldatei existiert eine Cache-Datei, deren Name sich aus dem absoluten Pfad der Moduldatei ergibt. Aufbau:
+#  - Kopf: mit marshal geschrieben (mit vorangestellter Laenge), enthaelt den Fingerabdruck der Moduldatei (Aenderungszeit, Groesse, Inhalts-Hash)
+#  - Datenabschnitt (auf 8 Byte ausgerichtet): mit marshal geschriebene Spaltentabelle und uebrige Daten (mit vorangestellter Laenge),
+#    danach (auf 8 Byte ausgerichtet) die Zahlenspalten des Elementspeichers als Rohdaten in nativer Byte-Reihenfolge.
+# Die Zahlenspalten werden beim Lesen nicht kopiert, sondern per mmap eingeblendet. Mehrere Prozesse, die dasselbe Modul laden,
+# teilen sich dadurch dieselben Speicherseiten. Fuer Module, die zurueckgeschrieben werden koennen (siehe Modul.vollstaendig),
+# wird kein Datenabschnitt gespeichert, da sie ohnehin komplett geladen werden muessen.
+#
+# Daneben koennen pro Moduldatei weitere aus dem Modul abgeleitete Daten gespeichert werden (siehe lese_zusatzdaten), etwa die
+# Flankenschutz-Tabelle. Deren Cache-Datei hat eine eigene Endung und enthaelt nur einen Kopf mit den Fingerabdruecken
+# aller Moduldateien, von denen die Daten abhaengen, sowie die Daten selbst.
+
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import sys
+import tempfile
+
+from .elementspeicher import erzeuge_elementspeicher
+
+import logging
+
+CACHE_VERSION = 4
+
+# Standardverzeichnis fuer Cache-Dateien.
+def standard_verzeichnis():
+    basis = os.environ.get("LOCALAPPDATA") or os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(basis, "fahrstr_gen")
+
+# marshal-Format und Byte-Reihenfolge der Spalten im Elementspeicher haengen davon ab.
+def _plattform():
+    return [sys.version_info[0], sys.version_info[1], sys.byteorder]
+
+def cache_dateiname(verzeichnis, dateiname, endung=".cache"):
+    schluessel = os.path.normcase(os.path.abspath(dateiname)).encode("utf-8", "surrogateescape")
+    return os.path.join(verzeichnis, hashlib.sha1(schluessel).hexdigest() + endung)
+
+def _inhalts_hash(dateiname):
+    h = hashlib.sha1()
+    with open(dateiname, 'rb') as fp:
+        for block in iter(lambda: fp.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+def _ausrichten(pos):
+    return (pos + 7) & ~7
+
+# marshal.load liest aus Dateien in kleinen Stuecken, daher wird der Kopf komplett gelesen und mit marshal.loads dekodiert.
+# Danach steht fp am Anfang des Datenabschnitts.
+def _lese_kopf(fp):
+    (laenge,) = struct.unpack("<I", fp.read(4))
+    result = marshal.loads(fp.read(laenge))
+    fp.seek(_ausrichten(4 + laenge))
+    return result
+
+# Blendet den Datenabschnitt der angegebenen Cache-Datei ein und gibt (Spalten, Daten) zurueck (siehe modul_daten).
+# Die Spalten sind memoryview-Objekte auf die eingeblendete Datei.
+def _lese_daten(cache_datei):
+    with open(cache_datei, 'rb') as fp:
+        _lese_kopf(fp)
+        start = fp.tell()
+        mm = mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ)
+    (laenge,) = struct.unpack_from("<I", mm, start)
+    spalten_tabelle, daten = marshal.loads(mm[start + 4:start + 4 + laenge])
+    spalten_start = _ausrichten(start + 4 + laenge)
+    ansicht = memoryview(mm)
+    spalten = dict((name, ansicht[spalten_start + offset:spalten_start + offset + groesse].cast(typ))
+            for (name, typ, offset, groesse) in spalten_tabelle)
+    return (spalten, daten)
+
+# Gegenstueck zu _lese_daten
+def _datenabschnitt(spalten, daten):
+    spalten_tabelle = []
+    teile = []
+    offset = 0
+    for (name, spalte) in spalten:
+        roh = spalte.tobytes()
+        spalten_tabelle.append((name, spalte.typecode, offset, len(roh)))
+        teile.append(roh + bytes(_ausrichten(len(roh)) - len(roh)))
+        offset += len(teile[-1])
+    meta = marshal.dumps((spalten_tabelle, daten))
+    anfang = struct.pack("<I", len(meta)) + meta
+    return anfang + bytes(_ausrichten(len(anfang)) - len(anfang)) + b"".join(teile)
+
+# Liest den Cache-Eintrag zur angegebenen Moduldatei und prueft den Fingerabdruck.
+# Gibt (Kopf, Daten) zurueck oder None, wenn kein gueltiger Eintrag existiert. Daten werden nur gelesen, wenn mit_daten gesetzt ist.
+def _lese_eintrag(verzeichnis, dateiname, mit_daten):
+    try:
+        stat = os.stat(dateiname)
+        cache_datei = cache_dateiname(verzeichnis, dateiname)
+        with open(cache_datei, 'rb') as fp:
+            kopf = _lese_kopf(fp)
+            version, plattform, mtime, groesse, inhalts_hash, vollstaendig = kopf
+            if version != CACHE_VERSION or plattform != _plattform() or groesse != stat.st_size:
+                return None
+            if mtime != stat.st_mtime_ns:
+                # Die Moduldatei wurde angefasst (z.B. kopiert), ob sie sich geaendert hat, entscheidet erst der Inhalt.
+                if inhalts_hash != _inhalts_hash(dateiname):
+                    return None
+                kopf[2] = stat.st_mtime_ns
+                datenabschnitt = fp.read()
+                fp.close()
+                _schreibe(verzeichnis, dateiname, kopf, datenabschnitt if len(datenabschnitt) else None)
+        return (kopf, _lese_daten(cache_datei) if mit_daten and not vollstaendig else None)
+    except (OSError, EOFError, ValueError, TypeError, struct.error):
+        return None
+
+# Gibt zurueck, ob fuer die angegebene Moduldatei ein gueltiger Cache-Eintrag existiert.
+def ist_aktuell(verzeichnis, dateiname):
+    return _lese_eintrag(verzeichnis, dateiname, False) is not None
+
+# Liest die Daten zur angegebenen Moduldatei aus dem Cache.
+# Gibt None zurueck, wenn kein gueltiger Eintrag existiert, und True, wenn das Modul laut Cache komplett geladen werden muss.
+def lese(verzeichnis, dateiname):
+    eintrag = _lese_eintrag(verzeichnis, dateiname, True)
+    if eintrag is None:
+        return None
+    return True if eintrag[0][5] else eintrag[1]
+
+# datenabschnitt: bytes (siehe _datenabschnitt) oder None
+def _schreibe(verzeichnis, dateiname, kopf, datenabschnitt, endung=".cache"):
+    os.makedirs(verzeichnis, exist_ok=True)
+    fp = tempfile.NamedTemporaryFile('wb', dir=verzeichnis, delete=False)
+    try:
+        with fp:
+            kopf_bytes = marshal.dumps(kopf)
+            fp.write(struct.pack("<I", len(kopf_bytes)))
+            fp.write(kopf_bytes)
+            if datenabschnitt is not None:
+                fp.write(bytes(_ausrichten(4 + len(kopf_bytes)) - 4 - len(kopf_bytes)))
+                fp.write(datenabschnitt)
+        os.replace(fp.name, cache_dateiname(verzeichnis, dateiname, endung))
+    except OSError:
+        logging.debug("Cache-Datei fuer {} konnte nicht geschrieben werden".format(dateiname))
+        try:
+            os.remove(fp.name)
+        except OSError:
+            pass
+
+# Schreibt die Daten des angegebenen (aus der Moduldatei geladenen) Moduls in den Cache.
+def schreibe(verzeichnis, modul):
+    try:
+        stat = os.stat(modul.dateiname)
+        kopf = [CACHE_VERSION, _plattform(), stat.st_mtime_ns, stat.st_size, _inhalts_hash(modul.dateiname), modul.vollstaendig]
+    except OSError:
+        return
+    _schreibe(verzeichnis, modul.dateiname, kopf, None if modul.vollstaendig else _datenabschnitt(*modul_daten(modul)))
+
+# [Aenderungszeit, Groesse, Inhalts-Hash] der angegebenen Datei
+def _fingerabdruck(dateiname):
+    stat = os.stat(dateiname)
+    return [stat.st_mtime_ns, stat.st_size, _inhalts_hash(dateiname)]
+
+# Liest die mit schreibe_zusatzdaten gespeicherten Daten zur angegebenen Moduldatei.
+# Gibt None zurueck, wenn kein Eintrag existiert oder sich eine der Moduldateien, von denen die Daten abhaengen, geaendert hat.
+def lese_zusatzdaten(verzeichnis, dateiname, endung):
+    try:
+        with open(cache_dateiname(verzeichnis, dateiname, endung), 'rb') as fp:
+            version, plattform, abhaengigkeiten, daten = _lese_kopf(fp)
+        if version != CACHE_VERSION or plattform != _plattform():
+            return None
+        for (abh_dateiname, mtime, groesse, inhalts_hash) in abhaengigkeiten:
+            stat = os.stat(abh_dateiname)
+            if groesse != stat.st_size or (mtime != stat.st_mtime_ns and inhalts_hash != _inhalts_hash(abh_dateiname)):
+                return None
+        return daten
+    except (OSError, EOFError, ValueError, TypeError, struct.error):
+        return None
+
+# Speichert aus der angegebenen Moduldatei abgeleitete Daten (mit marshal serialisierbar) unter der angegebenen Endung.
+# abhaengigkeiten: Dateinamen aller Moduldateien, von denen die Daten abhaengen.
+def schreibe_zusatzdaten(verzeichnis, dateiname, endung, abhaengigkeiten, daten):
+    try:
+        kopf = [CACHE_VERSION, _plattform(), [[d] + _fingerabdruck(d) for d in sorted(set(abhaengigkeiten))], daten]
+    except OSError:
+        return
+    _schreibe(verzeichnis, dateiname, kopf, None, endung)
+
+# Daten eines Moduls: (Spalten des Elementspeichers, (uebrige Daten des Elementspeichers, Referenzpunkte, UTM-Attribute)).
+# Referenzpunkte wie Modul.referenzelemente. Fuer die Streckenelemente werden nur temporaere Element-Objekte angelegt.
+def modul_daten(modul):
+    from .strecke import Element
+
+    utm_knoten = modul.root.find("./Strecke/UTM")
+    speicher = erzeuge_elementspeicher(Element(modul, knoten, nr) for nr, knoten in modul.streckenelemente.rohdaten.items())
+    return (
+        speicher.spalten(),
+        (speicher.zu_daten(), modul.referenzelemente, dict(utm_knoten.attrib) if utm_knoten is not None else None),
+    )
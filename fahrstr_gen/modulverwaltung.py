@@ -1,82 +1,110 @@
 #!/usr/bin/env python3
 
-import xml.etree.ElementTree as ET
 import os
 import tempfile
 import shutil
-from collections import defaultdict
+from collections import OrderedDict
+from collections.abc import Mapping
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
 from functools import lru_cache
 
 from .konstanten import *
+from . import modulcache
+from . import xmlbackend
+from .xmlbackend import ET
+from .elementspeicher import lade_elementspeicher, Adjazenz
 
 import logging
 
-path_insensitive_cache = {}
+path_insensitive_cache = {}  # Pfad -> existierender Pfad (nur gefundene Pfade)
+
+# Verzeichnis -> VerzeichnisIndex. Ein Index wird beim ersten Zugriff auf das Verzeichnis angelegt
+# und nur dann neu eingelesen, wenn ein Name nicht gefunden wird und sich die Aenderungszeit des Verzeichnisses geaendert hat.
+verzeichnis_index = {}
+
+class VerzeichnisIndex:
+    def __init__(self, verzeichnis):
+        self.mtime = os.stat(verzeichnis).st_mtime_ns
+        self.namen = set(os.listdir(verzeichnis))
+        self.namen_klein = dict()  # Name in Kleinbuchstaben -> Name
+        for name in sorted(self.namen):
+            self.namen_klein.setdefault(name.lower(), name)
+
+    def finde(self, name):
+        if name in self.namen:
+            return name
+        return self.namen_klein.get(name.lower())
+
+# Sucht im angegebenen (existierenden) Verzeichnis ohne Beachtung der Gross-/Kleinschreibung nach dem angegebenen Namen.
+# Gibt den Namen im Dateisystem zurueck oder None.
+def _finde_in_verzeichnis(verzeichnis, name):
+    index = verzeichnis_index.get(verzeichnis)
+    if index is not None:
+        result = index.finde(name)
+        if result is not None:
+            return result
+        try:
+            if os.stat(verzeichnis).st_mtime_ns == index.mtime:
+                return None
+        except OSError:
+            del verzeichnis_index[verzeichnis]
+            return None
+
+    try:
+        index = VerzeichnisIndex(verzeichnis)
+    except OSError:
+        return None
+    verzeichnis_index[verzeichnis] = index
+    return index.finde(name)
 
-# http://stackoverflow.com/a/8462613
 def path_insensitive(path):
     """
     Get a case-insensitive path for use on a case sensitive system.
     """
-    try:
-        return path_insensitive_cache[path]
-    except KeyError:
-        ret = _path_insensitive(path) or path
-        path_insensitive_cache[path] = ret
-        return ret
+    result = _path_insensitive(path)
+    return path if result is None else result
 
+# Wie path_insensitive, gibt aber None zurueck, wenn der Pfad nicht existiert.
 def _path_insensitive(path):
-    """
-    Recursive part of path_insensitive to do the work.
-    """
-
-    if path == '' or os.path.exists(path):
-        return path
-
-    base = os.path.basename(path)  # may be a directory or a file
-    dirname = os.path.dirname(path)
-
-    suffix = ''
-    if not base:  # dir ends with a slash?
-        if len(dirname) < len(path):
-            suffix = path[:len(path) - len(dirname)]
-
-        base = os.path.basename(dirname)
-        dirname = os.path.dirname(dirname)
-
-    if not os.path.exists(dirname):
-        dirname = _path_insensitive(dirname)
-        if not dirname:
-            return
-
-    # at this point, the directory exists but not the file
-
-    try:  # we are expecting dirname to be a directory, but it could be a file
-        files = os.listdir(dirname)
-    except OSError:
-        return
-
-    baselow = base.lower()
     try:
-        basefinal = next(fl for fl in files if fl.lower() == baselow)
-    except StopIteration:
-        return
-
-    if basefinal:
-        return os.path.join(dirname, basefinal) + suffix
+        return path_insensitive_cache[path]
+    except KeyError:
+        pass
+
+    dirname, base = os.path.split(path)
+    if base == '':
+        if dirname == path:
+            # Wurzelverzeichnis (oder leerer Pfad)
+            return path
+        # abschliessender Verzeichnistrenner
+        result = _path_insensitive(dirname)
+        return None if result is None else result + path[len(dirname):]
+
+    dirname_real = _path_insensitive(dirname) if dirname != '' else ''
+    if dirname_real is None:
+        return None
+    if base == os.curdir or base == os.pardir:
+        name = base
     else:
-        return
+        name = _finde_in_verzeichnis(dirname_real if dirname_real != '' else os.curdir, base)
+        if name is None:
+            return None
+
+    result = os.path.join(dirname_real, name)
+    path_insensitive_cache[path] = result
+    return result
 
 class RefPunkt:
-    def __init__(self, refnr, reftyp, element_richtung):
+    def __init__(self, refnr, reftyp, element_richtung, idx=None):
         self.refnr = refnr
         self.reftyp = reftyp
         self.element_richtung = element_richtung
+        self.idx = idx  # Index in modul.referenzelemente
 
     def __repr__(self):
         global dieses_modul
         return "{}{}{}".format(
-            self.element_richtung.element.xml_knoten.get("Nr", "0"),
+            self.element_richtung.element.nr,
             'b' if self.element_richtung.richtung == NORM else 'g',
             "" if self.element_richtung.element.modul == dieses_modul else "[{}]".format(self.modul_kurz())
         )
@@ -187,14 +215,16 @@ def get_zusi_datapath_official():
     return get_zusi_datapath()
 
 # Konvertiert einen Dateisystempfad in einen Pfad relativ zum Zusi-Dateiverzeichnis mit Backslash als Verzeichnistrenner.
+# Pfade werden vorher ueber den Verzeichnisindex in ihre Schreibweise im Dateisystem gebracht.
 def get_zusi_relpath(realpath):
+    realpath = path_insensitive(realpath)
     try:
-        candidate1 = os.path.relpath(realpath, get_zusi_datapath())
+        candidate1 = os.path.relpath(realpath, path_insensitive(get_zusi_datapath()))
     except ValueError:
         candidate1 = None
 
     try:
-        candidate2 = os.path.relpath(realpath, get_zusi_datapath_official())
+        candidate2 = os.path.relpath(realpath, path_insensitive(get_zusi_datapath_official()))
     except ValueError:
         candidate2 = None
 
@@ -213,9 +243,11 @@ def normalize_zusi_relpath(relpath):
 # Konvertiert einen Zusi-Pfad (relativ zum Zusi-Datenverzeichnis) in einen Pfad auf dem aktuellen Dateisystem.
 def get_abspath(zusi_relpath, force_user_dir=False):
     zusi_relpath = zusi_relpath.lstrip('\\').strip().replace('\\', os.sep)
-    result = path_insensitive(os.path.join(get_zusi_datapath(), zusi_relpath))
-    if force_user_dir or os.path.exists(result):
+    result = _path_insensitive(os.path.join(get_zusi_datapath(), zusi_relpath))
+    if result is not None:
         return result
+    if force_user_dir:
+        return os.path.join(get_zusi_datapath(), zusi_relpath)
     return path_insensitive(os.path.join(get_zusi_datapath_official(), zusi_relpath))
 
 # Relativer Zusi-Pfad -> (Modul oder None, wenn das Modul nicht existiert)
@@ -223,70 +255,290 @@ module = dict()
 
 dieses_modul = None
 
-class Modul:
-    def __init__(self, dateiname, relpath):
-        from .strecke import Element, ElementUndRichtung  # get around circular dependency by deferring the import to here
+# Verzeichnis des Modul-Caches (None = Cache nicht verwenden) und ob vorhandene Eintraege ignoriert und neu geschrieben werden sollen.
+cache_verzeichnis = None
+cache_neu_aufbauen = False
+_cache_erneuert = set()  # Dateinamen, deren Cache-Eintraege in diesem Lauf geschrieben wurden
+
+# Kindknoten von <Strecke>, die in nur gelesenen Modulen im XML-Baum behalten werden.
+# Alle anderen (Landschaftsdateien, Kachelpfad, existierende Fahrstrassen, ...) werden bei der Fahrstrassengenerierung nicht gelesen.
+strecke_behaltene_knoten = set(["StrElement", "UTM"])
+
+# Tags der Knoten, die Modul._lade_xml beim Einlesen auswertet
+_lade_xml_tags = set(["StrElement", "ReferenzElemente", "Fahrstrasse", "Signal", "SignalFrame"])
+
+# Ereignisse in der Signalmatrix, aufgrund derer die Matrix bei der Fahrstrassengenerierung erweitert werden kann.
+signalmatrix_erweiterungs_ereignisse = set([EREIGNIS_REGELGLEIS, EREIGNIS_GEGENGLEIS, EREIGNIS_RICHTUNGSANZEIGER_ZIEL, EREIGNIS_RICHTUNGSVORANZEIGER])
+
+# Gibt zurueck, ob die Matrix des angegebenen <Signal>-Knotens bei der Fahrstrassengenerierung erweitert werden kann
+# (siehe Signal.get_richtungsanzeiger_zeile), das Modul also eventuell zurueckgeschrieben werden muss.
+def signalmatrix_erweiterbar(signal_knoten):
+    if not any(n.tag == "SignalFrame" for n in signal_knoten):
+        return False
+    return any(int(ereignis.get("Er", 0)) in signalmatrix_erweiterungs_ereignisse
+            for n in signal_knoten if n.tag == "MatrixEintrag"
+            for ereignis in n if ereignis.tag == "Ereignis")
+
+# Die Streckenelemente eines Moduls (Nr -> Element). Die Element-Objekte werden erst beim ersten Zugriff
+# aus den Rohdaten (XML-Knoten bzw. Daten aus dem Modul-Cache) angelegt, da von Nachbarmodulen in der Regel
+# nur die Elemente in der Naehe der Modulgrenze benoetigt werden.
+class Streckenelemente(Mapping):
+    def __init__(self, modul, element_klasse):
+        self.modul = modul
+        self.element_klasse = element_klasse
+        self.rohdaten = dict()  # Nr -> Rohdaten
+        self._elemente = dict()  # Nr -> Element
+
+    def __getitem__(self, nr):
+        try:
+            return self._elemente[nr]
+        except KeyError:
+            result = self.element_klasse(self.modul, self.rohdaten[nr], nr)
+            self._elemente[nr] = result
+            return result
+
+    def __contains__(self, nr):
+        return nr in self.rohdaten
+
+    def __iter__(self):
+        return iter(self.rohdaten)
+
+    def __len__(self):
+        return len(self.rohdaten)
+
+    # Wie Element.nachfolger_roh, ohne das Element anzulegen.
+    def nachfolger_roh(self, nr, richtung):
+        return self.modul.adjazenz.nachfolger_roh(self.modul.element_index[nr], richtung)
+
+# Element -> [RefPunkt] fuer ein Modul. Wie bei einem defaultdict liefert der Zugriff fuer Elemente ohne Referenzpunkte eine leere Liste.
+class Referenzpunkte(Mapping):
+    def __init__(self, modul):
+        self.modul = modul
+        self._indizes = OrderedDict()  # StrElement-Nr -> [Index in modul.referenzelemente]
+        for idx, r in enumerate(modul.referenzelemente):
+            self._indizes.setdefault(r[1], []).append(idx)
+        self._listen = dict()  # StrElement-Nr -> [RefPunkt]
+
+    def __getitem__(self, element):
+        try:
+            return self._listen[element.nr]
+        except KeyError:
+            result = [self.modul.refpunkt_by_idx(idx) for idx in self._indizes.get(element.nr, [])]
+            self._listen[element.nr] = result
+            return result
 
+    def __contains__(self, element):
+        return element.nr in self._indizes
+
+    def __iter__(self):
+        return (self.modul.streckenelemente[nr] for nr in self._indizes)
+
+    def __len__(self):
+        return len(self._indizes)
+
+# Nr -> RefPunkt fuer ein Modul. Bei mehrfach vergebenen Nummern gewinnt der letzte Referenzpunkt in der Reihenfolge von Referenzpunkte.
+class ReferenzpunkteByNr(Mapping):
+    def __init__(self, modul):
+        self.modul = modul
+        self._indizes = dict((modul.referenzelemente[idx][0], idx) for idxs in modul.referenzpunkte._indizes.values() for idx in idxs)  # Nr -> Index
+
+    def __getitem__(self, refnr):
+        return self.modul.refpunkt_by_idx(self._indizes[refnr])
+
+    def __contains__(self, refnr):
+        return refnr in self._indizes
+
+    def __iter__(self):
+        return iter(self._indizes)
+
+    def __len__(self):
+        return len(self._indizes)
+
+class Modul:
+    # vollstaendig: Kompletten XML-Baum behalten (fuer Module, die zurueckgeschrieben werden).
+    # Andernfalls wird der komplette Baum nur behalten, wenn das Modul Signale enthaelt, deren Matrix erweitert werden kann.
+    # cache_daten: Daten aus dem Modul-Cache (siehe modulcache.modul_daten); die Moduldatei wird dann nicht gelesen.
+    def __init__(self, dateiname, relpath, vollstaendig=False, cache_daten=None):
         self.dateiname = dateiname
         self.relpath = relpath
-        self.root = ET.parse(dateiname).getroot() # XML-Knoten
-        self.streckenelemente = dict(  # Nr -> StrElement
-            (int(s.get("Nr", 0)), Element(self, s))
-            for s in self.root.findall("./Strecke/StrElement")
-        )
+        self.vollstaendig = vollstaendig
 
-        self.referenzpunkte = defaultdict(list)  # Element -> [RefPunkt]
-        for r in self.root.findall("./Strecke/ReferenzElemente"):
-            try:
-                element = self.streckenelemente[int(r.get("StrElement", 0))]
-                self.referenzpunkte[element].append(RefPunkt(
-                    int(r.get("ReferenzNr", 0)),
-                    int(r.get("RefTyp", 0)),
-                    ElementUndRichtung(element, NORM if int(r.get("StrNorm", 0)) == 1 else GEGEN)
-                ))
-            except KeyError:
-                logging.debug("Referenzpunkt {} in Modul {} verweist auf ungueltiges Streckenelement {}".format(int(r.get("ReferenzNr", 0)), self.relpath, int(r.get("StrElement", 0))))
+        if cache_daten is not None:
+            referenzelemente = self._lade_cache(cache_daten)
+        else:
+            while True:
+                referenzelemente = self._lade_xml()
+                if referenzelemente is not None:
+                    break
+                logging.debug("Modul {} enthaelt erweiterbare Signalmatrizen hinter bereits verworfenen Fahrstrassen, lade erneut mit komplettem XML-Baum".format(self.relpath))
 
-        self.referenzpunkte_by_nr = dict((r.refnr, r) for rs in self.referenzpunkte.values() for r in rs)  # Nr -> RefPunkt
+        self._lege_referenzpunkte_an(referenzelemente)
         self.geaendert = False
 
+    # referenzelemente: Liste von (ReferenzNr, StrElement-Nr, Richtung, RefTyp)
+    # Die RefPunkt-Objekte werden erst bei Bedarf angelegt (siehe Referenzpunkte und ReferenzpunkteByNr).
+    def _lege_referenzpunkte_an(self, referenzelemente):
+        self.referenzelemente = []  # gueltige Referenzpunkte in Dateireihenfolge
+        for r in referenzelemente:
+            if r[1] in self.streckenelemente:
+                self.referenzelemente.append(r)
+            else:
+                logging.debug("Referenzpunkt {} in Modul {} verweist auf ungueltiges Streckenelement {}".format(r[0], self.relpath, r[1]))
+
+        self._refpunkt_objekte = dict()  # Index in self.referenzelemente -> RefPunkt
+        self.referenzpunkte = Referenzpunkte(self)  # Element -> [RefPunkt]
+        self.referenzpunkte_by_nr = ReferenzpunkteByNr(self)  # Nr -> RefPunkt
+
+    # Referenzpunkt mit dem angegebenen Index in self.referenzelemente
+    def refpunkt_by_idx(self, idx):
+        try:
+            return self._refpunkt_objekte[idx]
+        except KeyError:
+            (refnr, element_nr, richtung, reftyp) = self.referenzelemente[idx]
+            result = RefPunkt(refnr, reftyp, self.streckenelemente[element_nr].richtung(richtung), idx)
+            self._refpunkt_objekte[idx] = result
+            return result
+
+    # Legt die Streckenelemente aus Daten des Modul-Caches an und gibt die Referenzpunkte zurueck.
+    # Die Elemente sind dann Sichten auf den Elementspeicher des Moduls.
+    def _lade_cache(self, cache_daten):
+        from .strecke import SpeicherElement  # get around circular dependency by deferring the import to here
+
+        spalten, (speicher_daten, referenzelemente, self._utm_attrib) = cache_daten
+        self.root = None
+        self.elementspeicher = lade_elementspeicher(spalten, speicher_daten)
+        self.adjazenz = self.elementspeicher.adjazenz
+        self.element_index = self.elementspeicher.index()  # Nr -> Index im Elementspeicher
+        self.streckenelemente = Streckenelemente(self, SpeicherElement)  # Nr -> StrElement
+        self.streckenelemente.rohdaten = self.element_index
+        return referenzelemente
+
+    # Liest die Moduldatei in einem Durchgang ein und legt dabei die Streckenelemente an.
+    # Gibt die <ReferenzElemente> in Dateireihenfolge zurueck (Format siehe _lege_referenzpunkte_an),
+    # oder None, wenn das Modul mit komplettem XML-Baum neu geladen werden muss.
+    def _lade_xml(self):
+        from .strecke import Element  # get around circular dependency by deferring the import to here
+
+        self.root = None  # XML-Knoten
+        self.streckenelemente = Streckenelemente(self, Element)  # Nr -> StrElement
+        self.element_index = dict()  # Nr -> Index in der Adjazenz
+        self.adjazenz = Adjazenz()  # Nachfolger der Streckenelemente
+        referenzelemente = []
+
+        # Es werden nur "end"-Ereignisse ausgewertet; die Knoten werden anhand ihres Tags zugeordnet.
+        # Die existierenden Fahrstrassen (der Grossteil der nicht benoetigten Knoten) werden sofort geleert,
+        # die uebrigen nicht benoetigten Knoten am Ende verworfen. Sie stehen in Zusi-Dateien hinter den Streckenelementen
+        # und damit hinter allen Signalen; enthaelt ein spaeteres Signal doch eine erweiterbare Matrix, wird neu geladen.
+        signalframes = []
+        verworfen = False
+
+        for _, knoten in xmlbackend.iterparse(self.dateiname, events=("end",)):
+            tag = knoten.tag
+            if tag not in _lade_xml_tags:
+                continue
+            if tag == "StrElement":
+                nr = int(knoten.get("Nr", 0))
+                self.streckenelemente.rohdaten[nr] = knoten
+                self.element_index[nr] = len(self.element_index)
+                self.adjazenz.neues_element(int(knoten.get("Anschluss", 0)), *Element.xml_nachfolger(knoten))
+            elif tag == "ReferenzElemente":
+                referenzelemente.append((
+                    int(knoten.get("ReferenzNr", 0)),
+                    int(knoten.get("StrElement", 0)),
+                    NORM if int(knoten.get("StrNorm", 0)) == 1 else GEGEN,
+                    int(knoten.get("RefTyp", 0)),
+                ))
+            elif tag == "Fahrstrasse":
+                if not self.vollstaendig:
+                    knoten.clear()
+                    verworfen = True
+            elif tag == "Signal":
+                if not self.vollstaendig and signalmatrix_erweiterbar(knoten):
+                    logging.debug("Modul {} enthaelt erweiterbare Signalmatrizen, behalte kompletten XML-Baum".format(self.relpath))
+                    self.vollstaendig = True
+                    if verworfen:
+                        return None
+            elif tag == "SignalFrame":
+                signalframes.append(knoten)
+        self.root = knoten  # das letzte "end"-Ereignis gehoert zum Wurzelknoten
+
+        if not self.vollstaendig:
+            self.root[:] = [k for k in self.root if k.tag == "Strecke"]
+            for strecke in self.root:
+                strecke[:] = [k for k in strecke if k.tag in strecke_behaltene_knoten]
+            for signalframe in signalframes:
+                # Nur die Existenz von Signal-Frames ist relevant, nicht die Landschaftsdateien darin.
+                del signalframe[:]
+
+        self.adjazenz.loese_auf(self.element_index)
+        return referenzelemente
+
     def name_kurz(self):
         return os.path.basename(self.relpath.replace('\\', os.sep))
 
     # (utm_we, utm_ns)
     def utm(self):
-        utm_knoten = self.root.find("./Strecke/UTM")
-        if utm_knoten is None:
+        utm_attrib = self._utm_attrib if self.root is None else getattr(self.root.find("./Strecke/UTM"), "attrib", None)
+        if utm_attrib is None:
             return (0, 0)
-        return (float(utm_knoten.get("UTM_WE", 0)), float(utm_knoten.get("UTM_NS", 0)))
+        return (float(utm_attrib.get("UTM_WE", 0)), float(utm_attrib.get("UTM_NS", 0)))
 
-    def schreibe_moduldatei(self):
+    # anhaengen: siehe writeuglyxml
+    def schreibe_moduldatei(self, anhaengen=None):
         from .strecke import writeuglyxml
 
+        assert self.vollstaendig, "Modul {} wurde ohne kompletten XML-Baum geladen".format(self.relpath)
+
         fp = tempfile.NamedTemporaryFile('wb', delete = False)
         with fp:
             fp.write(b"\xef\xbb\xbf")
             fp.write(u'<?xml version="1.0" encoding="UTF-8"?>\r\n'.encode("utf-8"))
-            writeuglyxml(fp, self.root)
+            writeuglyxml(fp, self.root, anhaengen)
         out_filename = get_abspath(self.relpath, force_user_dir=True)
         os.makedirs(os.path.dirname(out_filename), exist_ok=True)
         shutil.copyfile(fp.name, out_filename)
         os.remove(fp.name)
 
-# Liefert das angegebene Modul oder None zurueck (relpath leer = Fallback)
-def get_modul_by_name(relpath, fallback):
+# Laedt das angegebene Modul und gibt es zurueck oder None, wenn die Moduldatei nicht existiert.
+# Nur gelesene Module werden, falls moeglich, aus dem Modul-Cache geladen.
+def _lade_modul(relpath, vollstaendig=False):
+    dateiname = get_abspath(relpath)
+    try:
+        if cache_verzeichnis is not None and not vollstaendig and (not cache_neu_aufbauen or dateiname in _cache_erneuert):
+            cache_daten = modulcache.lese(cache_verzeichnis, dateiname)
+            if cache_daten is True:
+                vollstaendig = True
+            elif cache_daten is not None:
+                logging.debug("Lade Modul {} ({}) aus Cache".format(relpath, dateiname))
+                return Modul(dateiname, relpath, cache_daten=cache_daten)
+
+        logging.debug("Lade Modul {} ({})".format(relpath, dateiname))
+        result = Modul(dateiname, relpath, vollstaendig)
+        if cache_verzeichnis is not None and not vollstaendig:
+            modulcache.schreibe(cache_verzeichnis, result)
+            _cache_erneuert.add(dateiname)
+        return result
+    except FileNotFoundError:
+        logging.warn("Moduldatei {} nicht gefunden".format(dateiname))
+        return None
+
+# Laedt die angegebene Moduldatei und legt einen Eintrag im Modul-Cache an. Laeuft in einem eigenen Prozess.
+def _aktualisiere_cache(verzeichnis, dateiname, relpath):
+    try:
+        modulcache.schreibe(verzeichnis, Modul(dateiname, relpath))
+    except (OSError, xmlbackend.ParseError) as e:
+        # Fehler werden beim anschliessenden Laden im Hauptprozess gemeldet.
+        logging.debug("Modul-Cache fuer {} nicht aktualisiert: {}".format(dateiname, e))
+
+# Liefert das angegebene Modul oder None zurueck (relpath leer = Fallback).
+# vollstaendig: Modul mit komplettem XML-Baum laden, damit es zurueckgeschrieben werden kann (nur beim ersten Laden wirksam).
+def get_modul_by_name(relpath, fallback, vollstaendig=False):
     if not len(relpath):
         return fallback
 
     relpath_norm = normalize_zusi_relpath(relpath)
     if relpath_norm not in module:
-        dateiname = get_abspath(relpath)
-        try:
-            logging.debug("Lade Modul {} ({})".format(relpath, dateiname))
-            module[relpath_norm] = Modul(dateiname, relpath)
-        except FileNotFoundError:
-            logging.warn("Moduldatei {} nicht gefunden".format(dateiname))
-            module[relpath_norm] = None
+        module[relpath_norm] = _lade_modul(relpath, vollstaendig)
     return module[relpath_norm]
 
 # Sucht Knoten ./Datei und liefert Modul oder None zurueck (leerer String oder nicht vorhandener Knoten = Fallback)
@@ -296,3 +548,48 @@ def get_modul_aus_dateiknoten(knoten, fallback):
         relpath = datei.attrib["Dateiname"]
         return get_modul_by_name(relpath, fallback)
     return fallback
+
+# Liefert die Pfade aller Module, auf die Streckenelemente des angegebenen Moduls ueber <NachNormModul>/<NachGegenModul> verweisen.
+# Normalisierter Pfad -> Pfad, in der Reihenfolge der Streckenelemente.
+def get_nachbarmodul_pfade(modul):
+    result = OrderedDict()
+    for element_nr in modul.streckenelemente:
+        for richtung in [NORM, GEGEN]:
+            for (nr, modulpfad) in modul.streckenelemente.nachfolger_roh(element_nr, richtung):
+                if modulpfad is not None and len(modulpfad):
+                    result.setdefault(normalize_zusi_relpath(modulpfad), modulpfad)
+    return result
+
+# Laedt die Nachbarmodule des angegebenen Moduls bis zur angegebenen Tiefe (1 = nur direkte Nachbarn) parallel vorab,
+# damit sie nicht erst bei der Fahrstrassensuche einzeln geladen werden muessen.
+# Module einer Tiefe werden gemeinsam geladen, anschliessend werden deren Nachbarmodule gesucht.
+# Ist der Modul-Cache aktiv, werden fehlende Cache-Eintraege zuerst in mehreren Prozessen erzeugt,
+# da das Einlesen der XML-Dateien in Threads nicht parallel ablaufen kann.
+def lade_nachbarmodule(modul, tiefe, max_threads=None):
+    ebene = [modul]
+    with ThreadPoolExecutor(max_workers=max_threads) as executor:
+        for _ in range(tiefe):
+            zu_laden = OrderedDict()  # Normalisierter Pfad -> Pfad
+            for m in ebene:
+                for relpath_norm, relpath in get_nachbarmodul_pfade(m).items():
+                    if relpath_norm not in module:
+                        zu_laden.setdefault(relpath_norm, relpath)
+            if not len(zu_laden):
+                break
+
+            if cache_verzeichnis is not None:
+                veraltet = [(get_abspath(relpath), relpath) for relpath in zu_laden.values()]
+                veraltet = [(dateiname, relpath) for (dateiname, relpath) in veraltet
+                        if os.path.exists(dateiname) and ((cache_neu_aufbauen and dateiname not in _cache_erneuert) or not modulcache.ist_aktuell(cache_verzeichnis, dateiname))]
+                if len(veraltet) > 1:
+                    logging.debug("Erzeuge {} Cache-Eintraege vorab".format(len(veraltet)))
+                    with ProcessPoolExecutor(max_workers=max_threads) as prozesse:
+                        list(prozesse.map(_aktualisiere_cache, [cache_verzeichnis] * len(veraltet), *zip(*veraltet)))
+                    _cache_erneuert.update(dateiname for (dateiname, relpath) in veraltet)
+
+            logging.debug("Lade {} Nachbarmodule vorab".format(len(zu_laden)))
+            ebene = []
+            for relpath_norm, m in zip(zu_laden.keys(), executor.map(_lade_modul, zu_laden.values())):
+                module[relpath_norm] = m
+                if m is not None:
+                    ebene.append(m)
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+
+from .konstanten import *
+from .modulverwaltung import get_modul_by_name
+from .strecke import gegenrichtung, geschw_min, zwischenspeicher_log
+from .streckengraph import Streckengraph, Knoten
+from .fahrstrasse import FahrstrHauptsignal, FahrstrVorsignal, FahrstrWeichenstellung
+
+
+# Fahrstrassentypen, fuer die Fahrstrassengraphen (fahrstr_graph.FahrstrGraph) auf einem Segmentgraphen aufbauen koennen.
+SEGMENT_FAHRSTR_TYPEN = [FAHRSTR_TYP_RANGIER, FAHRSTR_TYP_ZUG, FAHRSTR_TYP_ANZEIGE]
+
+# Knotenmaske eines Fahrstrassengraphen fuer den angegebenen Typ.
+def fahrstr_knoten_maske(fahrstr_typ):
+    return KNOTEN_WEICHE | knoten_hsig(fahrstr_typ) | knoten_zusatzsignal(fahrstr_typ) | knoten_startsignal(fahrstr_typ) | \
+            (KNOTEN_AUFGLEISPUNKT if fahrstr_typ in [FAHRSTR_TYP_ZUG, FAHRSTR_TYP_RANGIER] else 0)
+
+# Ein vom Fahrstrassentyp unabhaengiger Streckengraph, dessen Knoten fuer mindestens einen Fahrstrassentyp Knoten des
+# Fahrstrassengraphen sind. Die Elementfolgen zwischen zwei Knoten (Segmente) werden einmal ausgewertet und
+# von den Fahrstrassengraphen aller Typen gemeinsam benutzt (siehe FahrstrGraphKnoten._neue_nachfolger_kante).
+class SegmentGraph(Streckengraph):
+    def __init__(self):
+        maske = 0
+        for fahrstr_typ in SEGMENT_FAHRSTR_TYPEN:
+            maske |= fahrstr_knoten_maske(fahrstr_typ)
+        super().__init__(maske)
+
+    def _neuer_knoten(self, element):
+        return SegmentGraphKnoten(self, element)
+
+# Ein Abschnitt eines Segments. Er beginnt an einem Element, an dem fahrstrassentypabhaengige Daten liegen
+# (Ereignis "Keine X-Fahrstrasse einrichten", Signal), und enthaelt die typunabhaengigen Daten aller Elemente bis
+# vor das naechste solche Element. Listen und Felder entsprechen denen von fahrstr_graph.FahrstrGraphKante.
+class SegmentTeil:
+    def __init__(self, element_richtung):
+        self.element_richtung = element_richtung  # Erstes Element
+        self.keine_fahrstr_typen = 0  # Fahrstrassentypen, fuer die am ersten Element keine Fahrstrasse eingerichtet wird (Bitmaske)
+        self.signal = None  # Signal am ersten Element, dessen Verknuepfung vom Fahrstrassentyp abhaengt
+
+        self.laenge = 0
+        self.laenge_zusi = 0
+        self.signalgeschwindigkeit = -1.0  # Minimale Signalgeschwindigkeit vor dem ersten Ereignis "Ende Weichenbereich"
+        self.hat_ende_weichenbereich = False
+        self.hat_anzeige_geschwindigkeit = False
+
+        self.register = []
+        self.bedingte_register = []
+        self.weichen = []
+        self.signale = []
+        self.vorsignale = []
+        self.aufloesepunkte = []
+
+        self.rgl_ggl = None  # Letzte Regelgleis-/Gegengleiskennzeichnung oder None
+        self.streckenname = ""
+        self.richtungsanzeiger = None  # Letztes Richtungsanzeiger-Ziel oder None
+        self.richtungsanzeiger_anzeige = None  # Dasselbe ohne Ereignisse mit Wert 1 (fuer Anzeige-Fahrstrassen)
+
+    # Uebertraegt die typunabhaengigen Daten dieses Abschnitts in eine Kante des Fahrstrassengraphen.
+    def anwenden(self, kante, fahrstr_typ):
+        if not kante.hat_ende_weichenbereich:
+            kante.signalgeschwindigkeit = geschw_min(kante.signalgeschwindigkeit, self.signalgeschwindigkeit)
+        kante.hat_ende_weichenbereich = kante.hat_ende_weichenbereich or self.hat_ende_weichenbereich
+        kante.hat_anzeige_geschwindigkeit = kante.hat_anzeige_geschwindigkeit or self.hat_anzeige_geschwindigkeit
+        kante.laenge += self.laenge
+        kante.laenge_zusi += self.laenge_zusi
+
+        kante.register.extend(self.register)
+        kante.bedingte_register.extend(self.bedingte_register)
+        kante.weichen.extend(self.weichen)
+        kante.signale.extend(self.signale)
+        kante.vorsignale.extend(self.vorsignale)
+        kante.aufloesepunkte.extend(self.aufloesepunkte)
+
+        if self.rgl_ggl is not None:
+            kante.rgl_ggl = self.rgl_ggl
+            kante.streckenname = self.streckenname
+        richtungsanzeiger = self.richtungsanzeiger_anzeige if fahrstr_typ == FAHRSTR_TYP_ANZEIGE else self.richtungsanzeiger
+        if richtungsanzeiger is not None:
+            kante.richtungsanzeiger = richtungsanzeiger
+
+# Eine Folge von gerichteten Streckenelementen ab einem Nachfolger eines Knotens bis zum naechsten Knoten des Segmentgraphen
+# (exklusive Start, inklusive Ziel).
+class Segment:
+    def __init__(self):
+        self.teile = []  # [SegmentTeil]
+        self.ziel = None  # ElementUndRichtung des Zielknotens oder None, wenn das Segment an einem Element ohne Nachfolger endet
+
+        self.ziel_vorgaenger_idx = None  # Vorgaenger-Index des vorletzten Elements im Zielknoten, wenn dieser mehr als einen Vorgaenger besitzt
+        self.ziel_weiche = None  # FahrstrWeichenstellung der stumpf befahrenen Weiche im Zielknoten
+        self.ziel_ungueltig = False  # Ueber den Zielknoten duerfen keine Fahrstrassen erzeugt werden
+
+class SegmentGraphKnoten(Knoten):
+    def __init__(self, graph, element):
+        super().__init__(graph, element)
+        self.segmente = [None, None]  # Pro Richtung eine Liste mit einem Segment (oder None) pro Nachfolger
+
+    # Gibt das Segment zurueck, das am Nachfolger mit dem angegebenen Index in der angegebenen Richtung beginnt,
+    # oder None, wenn dieser Nachfolger nicht existiert.
+    def get_segment(self, richtung, idx):
+        key = 0 if richtung == NORM else 1
+        if self.segmente[key] is None:
+            element_richtung = self.element.richtung(richtung)
+            self.graph.zwischenspeichern(self.segmente, key,
+                    [None if n is None else self._neues_segment(element_richtung, n) for n in element_richtung.nachfolger()])
+        return self.segmente[key][idx] if idx < len(self.segmente[key]) else None
+
+    def _neues_segment(self, element_richtung_vorgaenger, element_richtung):
+        segment = Segment()
+        teil = None
+
+        while element_richtung is not None:
+            # Fahrstrassentypabhaengige Daten beginnen einen neuen Abschnitt
+            keine_fahrstr_typen = 0
+            for ereignis in element_richtung.ereignisse():
+                ereignis_nr = int(ereignis.get("Er", 0))
+                if ereignis_nr in [EREIGNIS_KEINE_ANZEIGE_FAHRSTRASSE, EREIGNIS_LZB_ENDE]:
+                    keine_fahrstr_typen |= FAHRSTR_TYP_ANZEIGE
+                elif ereignis_nr == EREIGNIS_KEINE_ZUGFAHRSTRASSE:
+                    keine_fahrstr_typen |= FAHRSTR_TYP_ZUG | FAHRSTR_TYP_ANZEIGE
+                elif ereignis_nr == EREIGNIS_KEINE_RANGIERFAHRSTRASSE:
+                    keine_fahrstr_typen |= FAHRSTR_TYP_RANGIER
+            signal = element_richtung.signal()
+
+            if teil is None or keine_fahrstr_typen != 0 or signal is not None:
+                teil = SegmentTeil(element_richtung)
+                teil.keine_fahrstr_typen = keine_fahrstr_typen
+                teil.signal = signal
+                segment.teile.append(teil)
+
+            # Bug in Zusi bei der Laengenberechnung moduluebergreifender Fahrstrassen
+            if element_richtung_vorgaenger.element.modul != element_richtung.element.modul:
+                teil.laenge_zusi -= element_richtung_vorgaenger.element.laenge()
+                teil.laenge_zusi += element_richtung.element.laenge()
+
+            # Signal am aktuellen Element (Gegenrichtung) in die Signalliste einfuegen
+            element_richtung_gegenrichtung = element_richtung.gegenrichtung()
+            signal_gegenrichtung = element_richtung_gegenrichtung.signal()
+            if signal_gegenrichtung is not None \
+                    and signal_gegenrichtung.sigflags & SIGFLAG_FAHRWEGSIGNAL_BEIDE_FAHRTRICHTUNGEN != 0 \
+                    and signal_gegenrichtung.sigflags & SIGFLAG_FAHRWEGSIGNAL_WEICHENANIMATION == 0 \
+                    and signal_gegenrichtung.ist_hsig_fuer_fahrstr_typ(FAHRSTR_TYP_FAHRWEG):
+                refpunkt = element_richtung_gegenrichtung.refpunkt(REFTYP_SIGNAL)
+                if refpunkt is None:
+                    zwischenspeicher_log.warning("Element {} enthaelt ein Signal, aber es existiert kein passender Referenzpunkt. Die Signalverknuepfung wird nicht eingerichtet.".format(element_richtung_gegenrichtung))
+                else:
+                    zeile = signal_gegenrichtung.get_hsig_zeile(FAHRSTR_TYP_FAHRWEG, -1)
+                    if zeile is None:
+                        zwischenspeicher_log.warning("{} enthaelt keine passende Zeile fuer Fahrstrassentyp Fahrweg und Geschwindigkeit -1. Die Signalverknuepfung wird nicht eingerichtet.".format(signal_gegenrichtung))
+                    else:
+                        teil.signale.append(FahrstrHauptsignal(refpunkt, zeile, False))
+
+            # Register am aktuellen Element in die Registerliste einfuegen
+            regnr = element_richtung.registernr()
+            if regnr != 0:
+                refpunkt = element_richtung.refpunkt(REFTYP_REGISTER)
+                if refpunkt is None:
+                    zwischenspeicher_log.warning("Element {} enthaelt ein Register, aber es existiert kein passender Referenzpunkt. Die Registerverknuepfung wird nicht eingerichtet.".format(element_richtung))
+                else:
+                    teil.register.append(refpunkt)
+
+            # Ereignisse am aktuellen Element verarbeiten
+            hat_ende_weichenbereich = False
+            hat_aufloesepunkt = False
+            for ereignis in element_richtung.ereignisse():
+                ereignis_nr = int(ereignis.get("Er", 0))
+                if ereignis_nr == EREIGNIS_SIGNALGESCHWINDIGKEIT:
+                    if not teil.hat_ende_weichenbereich:
+                        signalgeschwindigkeit = float(ereignis.get("Wert", 0))
+                        if signalgeschwindigkeit <= 0:
+                            zwischenspeicher_log.warning("Element {}: Ignoriere Ereignis \"Signalgeschwindigkeit\" mit Wert <= 0".format(element_richtung))
+                        else:
+                            teil.signalgeschwindigkeit = geschw_min(teil.signalgeschwindigkeit, signalgeschwindigkeit)
+
+                elif ereignis_nr == EREIGNIS_ENDE_WEICHENBEREICH:
+                    hat_ende_weichenbereich = True # wird erst am Element danach wirksam
+
+                elif ereignis_nr == EREIGNIS_GEGENGLEIS:
+                    teil.rgl_ggl = GLEIS_GEGENGLEIS
+                    teil.streckenname = ereignis.get("Beschr", "")
+
+                elif ereignis_nr == EREIGNIS_REGELGLEIS:
+                    teil.rgl_ggl = GLEIS_REGELGLEIS
+                    teil.streckenname = ereignis.get("Beschr", "")
+
+                elif ereignis_nr == EREIGNIS_EINGLEISIG:
+                    teil.rgl_ggl = GLEIS_EINGLEISIG
+                    teil.streckenname = ereignis.get("Beschr", "")
+
+                elif ereignis_nr == EREIGNIS_RICHTUNGSANZEIGER_ZIEL:
+                    teil.richtungsanzeiger = ereignis.get("Beschr", "")
+                    if int(ereignis.get("Wert", 0)) == 1:
+                        zwischenspeicher_log.debug("Element {}: Ignoriere Ereignis \"Richtungsanzeiger-Ziel\" in Anzeige-Fahrstrassen".format(element_richtung))
+                    else:
+                        teil.richtungsanzeiger_anzeige = teil.richtungsanzeiger
+
+                elif ereignis_nr == EREIGNIS_FAHRSTRASSE_AUFLOESEN:
+                    refpunkt = element_richtung.refpunkt(REFTYP_AUFLOESEPUNKT)
+                    if refpunkt is None:
+                        zwischenspeicher_log.warning("Element {} enthaelt ein Ereignis \"Fahrstrasse aufloesen\", aber es existiert kein passender Referenzpunkt. Die Aufloese-Verknuepfung wird nicht eingerichtet.".format(element_richtung))
+                    else:
+                        hat_aufloesepunkt = True
+                        teil.aufloesepunkte.append(refpunkt)
+
+                elif ereignis_nr == EREIGNIS_SIGNALHALTFALL:
+                    refpunkt = element_richtung.refpunkt(REFTYP_SIGNALHALTFALL)
+                    if refpunkt is None:
+                        zwischenspeicher_log.warning("Element {} enthaelt ein Ereignis \"Signalhaltfall\", aber es existiert kein passender Referenzpunkt. Die Signalhaltfall-Verknuepfung wird nicht eingerichtet.".format(element_richtung))
+                    else:
+                        teil.aufloesepunkte.append(refpunkt)
+
+                elif ereignis_nr == EREIGNIS_LZB_CIR_ELKE_GESCHWINDIGKEIT or ereignis_nr == EREIGNIS_ETCS_GESCHWINDIGKEIT:
+                    teil.hat_anzeige_geschwindigkeit = True
+
+                elif ereignis_nr == EREIGNIS_REGISTER_VERKNUEPFEN or ereignis_nr == EREIGNIS_REGISTER_BEDINGT_VERKNUEPFEN:
+                    try:
+                        refpunkt_modul = get_modul_by_name(ereignis.get("Beschr", ""), element_richtung.element.modul)
+                        refpunkt = refpunkt_modul.referenzpunkte_by_nr[int(float(ereignis.get("Wert", 0)))]
+
+                        if ereignis_nr == EREIGNIS_REGISTER_BEDINGT_VERKNUEPFEN:
+                            teil.bedingte_register.append((refpunkt, "Bahnsteigkreuzung"))
+                        else:
+                            teil.register.append(refpunkt)
+
+                    except (KeyError, ValueError, AttributeError):
+                        zwischenspeicher_log.warning("Ereignis \"Register in Fahrstrasse verknuepfen\" an Element {} enthaelt ungueltigen Referenzpunkt (Nummer \"{}\", Modul \"{}\"). Die Registerverknuepfung wird nicht eingerichtet.".format(element_richtung, ereignis.get("Wert", 0), ereignis.get("Beschr", "")))
+
+                elif ereignis_nr == EREIGNIS_WEICHE_VERKNUEPFEN:
+                    try:
+                        refpunkt = element_richtung.element.modul.referenzpunkte_by_nr[int(float(ereignis.get("Wert", 0)))]
+                    except (KeyError, ValueError):
+                        zwischenspeicher_log.warning("Ereignis \"Weiche in Fahrstrasse verknuepfen\" an Element {} enthaelt ungueltige Referenzpunkt-Nummer \"{}\". Die Weichenverknuepfung wird nicht eingerichtet.".format(element_richtung, ereignis.get("Wert", 0)))
+                        continue
+
+                    try:
+                        weichenstellung = int(ereignis.get("Beschr", 0))
+                    except ValueError:
+                        zwischenspeicher_log.warning("Ereignis \"Weiche in Fahrstrasse verknuepfen\" an Element {} enthaelt ungueltige Weichenstellung \"{}\". Die Weichenverknuepfung wird nicht eingerichtet.".format(element_richtung, ereignis.get("Beschr", "")))
+
+                    if weichenstellung <= 0:
+                        zwischenspeicher_log.warning("Ereignis \"Weiche in Fahrstrasse verknuepfen\" an Element {} enthaelt ungueltige Weichenstellung {}. Die Weichenverknuepfung wird nicht eingerichtet.".format(element_richtung, weichenstellung))
+                    else:
+                        teil.weichen.append(FahrstrWeichenstellung(refpunkt, int(ereignis.get("Beschr", ""))))
+
+                elif ereignis_nr == EREIGNIS_SIGNAL_VERKNUEPFEN:
+                    try:
+                        refpunkt = element_richtung.element.modul.referenzpunkte_by_nr[int(float(ereignis.get("Wert", 0)))]
+                    except (KeyError, ValueError):
+                        zwischenspeicher_log.warning("Ereignis \"Signal in Fahrstrasse verknuepfen\" an Element {} enthaelt ungueltige Referenzpunkt-Nummer \"{}\". Die Signalverknuepfung wird nicht eingerichtet.".format(element_richtung, ereignis.get("Wert", 0)))
+                        continue
+
+                    if not refpunkt.signal:
+                        zwischenspeicher_log.warning("Ereignis \"Signal in Fahrstrasse verknuepfen\" an Element {} enthaelt Verweis auf Element ohne Signal. Die Signalverknuepfung wird nicht eingerichtet.".format(element_richtung))
+                        continue
+
+                    try:
+                        teil.signale.append(FahrstrHauptsignal(refpunkt, int(ereignis.get("Beschr", "")), False))
+                        zwischenspeicher_log.debug("{} an Element {}: wird per \"Signal in Fahrstrasse verknuepfen\" an Element {} in dessen Fahrstrassen aufgenommen".format(refpunkt.signal(), refpunkt, element_richtung))
+                    except ValueError:
+                        zwischenspeicher_log.warning("Ereignis \"Signal in Fahrstrasse verknuepfen\" an Element {} enthaelt ungueltige Zeilennummer {}. Die Signalverknuepfung wird nicht eingerichtet.".format(element_richtung, ereignis.get("Beschr", "")))
+
+                elif ereignis_nr == EREIGNIS_VORSIGNAL_VERKNUEPFEN:
+                    try:
+                        refpunkt = element_richtung.element.modul.referenzpunkte_by_nr[int(float(ereignis.get("Wert", 0)))]
+                    except (KeyError, ValueError):
+                        zwischenspeicher_log.warning("Ereignis \"Vorsignal in Fahrstrasse verknuepfen\" an Element {} enthaelt ungueltige Referenzpunkt-Nummer \"{}\". Die Vorsignalverknuepfung wird nicht eingerichtet.".format(element_richtung, ereignis.get("Wert", 0)))
+                        continue
+
+                    try:
+                        teil.vorsignale.append(FahrstrVorsignal(refpunkt, int(ereignis.get("Beschr", ""))))
+                    except ValueError:
+                        zwischenspeicher_log.warning("Ereignis \"Vorsignal in Fahrstrasse verknuepfen\" an Element {} enthaelt ungueltige Spaltennummer {}. Die Vorsignalverknuepfung wird nicht eingerichtet.".format(element_richtung, ereignis.get("Beschr", "")))
+
+            teil.hat_ende_weichenbereich = teil.hat_ende_weichenbereich or hat_ende_weichenbereich
+            element_laenge = element_richtung.element.laenge()
+            teil.laenge += element_laenge
+            teil.laenge_zusi += element_laenge
+
+            if self.graph.get_knoten(element_richtung.element) is not None:
+                if hat_aufloesepunkt and len(element_richtung.nachfolger()) > 1:
+                    zwischenspeicher_log.warning("An Element {} liegt ein Ereignis \"Fahrstrasse aufloesen\" in einem Verzweigungselement".format(element_richtung))
+                break
+
+            nachfolger = element_richtung.nachfolger()
+            if len(nachfolger) == 0:
+                element_richtung = None
+                break
+
+            assert len(nachfolger) == 1  # sonst waere es ein Knoten
+            element_richtung_vorgaenger = element_richtung
+            element_richtung = nachfolger[0]
+
+        if element_richtung is not None:
+            segment.ziel = element_richtung
+
+            # Ggf. stumpf befahrene Weiche im Zielknoten stellen.
+            # Ein solches Element ist eine Weiche und damit in den Fahrstrassengraphen aller Typen ein Knoten.
+            ziel_vorgaenger = element_richtung.vorgaenger()
+            if len(ziel_vorgaenger) > 1:
+                weichen_refpunkt = element_richtung.element.refpunkt(gegenrichtung(element_richtung.richtung), REFTYP_WEICHE)
+                if weichen_refpunkt is None:
+                    zwischenspeicher_log.warning(("Element {} hat mehr als einen Vorgaenger, aber keinen Referenzpunkteintrag vom Typ Weiche. " +
+                            "Es werden keine Fahrstrassen ueber dieses Element erzeugt.").format(element_richtung))
+                    segment.ziel_ungueltig = True
+                    return segment
+
+                try:
+                    segment.ziel_vorgaenger_idx = ziel_vorgaenger.index(element_richtung_vorgaenger)
+                    if element_richtung_vorgaenger.element.modul == element_richtung.element.modul:
+                        segment.ziel_weiche = FahrstrWeichenstellung(weichen_refpunkt, segment.ziel_vorgaenger_idx + 1)
+                    else:
+                        zwischenspeicher_log.debug(("Vorgaenger Nr. {} von Element {} liegt in anderem Modul. Es wird keine Weichenverknuepfung in der Fahrstrasse erzeugt.").format(segment.ziel_vorgaenger_idx + 1, element_richtung))
+                except ValueError:
+                    zwischenspeicher_log.warning(("Stellung der stumpf befahrenen Weiche an Element {} von Element {} kommend konnte nicht ermittelt werden. " +
+                            "Es werden keine Fahrstrassen ueber das letztere Element erzeugt.").format(element_richtung, element_richtung_vorgaenger))
+                    segment.ziel_ungueltig = True
+
+        return segment
@@ -1,88 +1,122 @@
+from bisect import bisect_right
 from collections import namedtuple, defaultdict
-from copy import deepcopy
-import xml.etree.ElementTree as ET
-
 from .konstanten import *
 from . import modulverwaltung
+from .xmlbackend import ET, find_2, findall_2, kinder, kopie_mit_attribut
+from .elementspeicher import xml_koordinaten, koordinaten_laenge
 
 import logging
-import math
-
-# Schnelle Implementierung von node.find("./tag1/tag2"), wenn tag1 nur einmal vorkommen kann.
-def find_2(node, tag1, tag2):
-    for n in node:
-        if n.tag == tag1:
-            for n2 in n:
-                if n2.tag == tag2:
-                    return n2
-            break
-
-# Schnelle Implementierung von node.findall("./tag1/tag2"), wenn tag1 nur einmal vorkommen kann.
-def findall_2(node, tag1, tag2):
-    for n in node:
-        if n.tag == tag1:
-            return [n2 for n2 in n if n2.tag == tag2]
-    return []
-
-# Betrachtet die Kindknoten von "node" mit demselben Tag wie "kindknoten" und fuegt diesen Knoten
-# nach Knoten Nummer "pos" in diese Liste ein. Wenn pos == -1, fuegt es ihn am Ende ein.
-# Nicht schnell, wird aber auch nicht haeufig gebraucht.
-def kindknoten_einfuegen(node, kindknoten, pos):
-    node.insert([idx for idx, n in enumerate(node) if n.tag == kindknoten.tag][pos] + 1, kindknoten)
+import shutil
+import threading
+
+# Fuegt neue Kindknoten in "node" ein: einfuegungen = {Kindknoten -> [neue Knoten]}, die neuen Knoten werden direkt
+# nach dem jeweiligen Kindknoten eingefuegt. Die Kindknoten werden dabei nur einmal durchlaufen.
+def kindknoten_einfuegen(node, einfuegungen):
+    neue_kinder = []
+    for kind in node:
+        neue_kinder.append(kind)
+        neue_kinder.extend(einfuegungen.get(kind, []))
+    node[:] = neue_kinder
+
+# Letzter Kindknoten von "node" mit dem angegebenen Tag
+def letzter_kindknoten(node, tag):
+    return kinder(node, tag)[-1]
+
+# Zwischengespeicherte Daten der Elemente und Signale werden ohne Sperre berechnet und erst vollstaendig eingetragen,
+# damit mehrere Suchen gleichzeitig laufen koennen (siehe streckengraph.Streckengraph).
+_sperre = threading.Lock()
+
+# Fuer Meldungen beim Aufbau zwischengespeicherter Daten (Graphen, Signalmatrizen). Sie erscheinen nur beim ersten Aufbau;
+# bei paralleler Suche baut jeder Prozess die Daten selbst auf, der Hauptprozess gibt sie daher nur einmal aus (siehe fahrstr_gen._LogPuffer).
+zwischenspeicher_log = logging.getLogger("fahrstr_gen.zwischenspeicher")
+
+# Traegt den Wert unter speicher[key] ein, falls dort noch None steht, und gibt den eingetragenen Wert zurueck.
+def _einmal_eintragen(speicher, key, wert):
+    with _sperre:
+        if speicher[key] is None:
+            speicher[key] = wert
+        return speicher[key]
 
 class Element:
-    def __init__(self, modul, xml_knoten):
+    __slots__ = ('modul', 'xml_knoten', 'nr', 'idx', '_signal_gesucht', '_signal', '_nachfolger', '_vorgaenger', '_ereignisse', '_koordinaten', '_laenge', '_richtungen', '_knotenklassen')
+
+    def __init__(self, modul, xml_knoten, nr=None):
         self.modul = modul
         self.xml_knoten = xml_knoten
+        self.nr = int(xml_knoten.get("Nr", 0)) if nr is None else nr
+        self.idx = modul.element_index[self.nr]  # Index in den spaltenweise abgelegten Daten des Moduls (Adjazenz, Elementspeicher)
 
         self._signal_gesucht = [False, False]
         self._signal = [None, None]
         self._nachfolger = [None, None]
+        self._vorgaenger = [None, None]
         self._ereignisse = [None, None]
+        self._koordinaten = None
         self._laenge = None
+        self._richtungen = None
+        self._knotenklassen = None
 
     def __repr__(self):
         if self.modul == modulverwaltung.dieses_modul:
-            return self.xml_knoten.get("Nr", "0")
+            return str(self.nr)
         else:
-            return "{}[{}]".format(self.xml_knoten.get("Nr", "0"), self.modul.name_kurz())
+            return "{}[{}]".format(self.nr, self.modul.name_kurz())
+
+    # (b_x, b_y, b_z, g_x, g_y, g_z), wird erst bei Bedarf aus dem XML-Knoten gelesen.
+    def koordinaten(self):
+        if self._koordinaten is None:
+            self._koordinaten = xml_koordinaten(self.xml_knoten)
+        return self._koordinaten
 
     def laenge(self):
         if self._laenge is None:
-            b_knoten = self.xml_knoten.find("b")
-            g_knoten = self.xml_knoten.find("g")
-            try:
-                p1 = [float(b_knoten.get("X", 0)), float(b_knoten.get("Y", 0)), float(b_knoten.get("Z", 0))]
-                p2 = [float(g_knoten.get("X", 0)), float(g_knoten.get("Y", 0)), float(g_knoten.get("Z", 0))]
-            except AttributeError:
-                p1 = [0, 0, 0]
-                p2 = [0, 0, 0]
-                if b_knoten is not None:
-                    p1 = [float(b_knoten.get("X", 0)), float(b_knoten.get("Y", 0)), float(b_knoten.get("Z", 0))]
-                if g_knoten is not None:
-                    p2 = [float(g_knoten.get("X", 0)), float(g_knoten.get("Y", 0)), float(g_knoten.get("Z", 0))]
-            self._laenge = math.sqrt((p1[0]-p2[0])**2 + (p1[1]-p2[1])**2 + (p1[2]-p2[2])**2)
+            self._laenge = koordinaten_laenge(*self.koordinaten())
         return self._laenge
 
+    # Die beiden ElementUndRichtung-Objekte eines Elements werden nur einmal angelegt.
     def richtung(self, richtung):
-        return ElementUndRichtung(self, richtung)
+        if self._richtungen is None:
+            self._richtungen = (ElementUndRichtung(self, GEGEN), ElementUndRichtung(self, NORM))
+        return self._richtungen[1 if richtung == NORM else 0]
 
     def ereignisse(self, richtung):
         key = 1 if richtung == NORM else 0
         if self._ereignisse[key] is None:
             # Die Sortierung dient primaer dazu, die Reihenfolge von Ereignissen deterministisch zu halten.
             # Damit kann man sich z.B. darauf verlassen, dass Ereignisse "Signalhaltfall" immer vor Ereignissen "Fahrstrasse aufloesen" gefunden werden.
-            self._ereignisse[key] = sorted(findall_2(self.xml_knoten, "InfoNormRichtung" if richtung == NORM else "InfoGegenRichtung", "Ereignis"), key = lambda n: int(n.get("Er", 0)))
+            return _einmal_eintragen(self._ereignisse, key,
+                    sorted(findall_2(self.xml_knoten, "InfoNormRichtung" if richtung == NORM else "InfoGegenRichtung", "Ereignis"), key = lambda n: int(n.get("Er", 0))))
         return self._ereignisse[key]
 
     def signal(self, richtung):
         key = 1 if richtung == NORM else 0
         if not self._signal_gesucht[key]:
-            self._signal_gesucht[key] = True
             signal_xml_knoten = find_2(self.xml_knoten, "InfoNormRichtung" if richtung == NORM else "InfoGegenRichtung", "Signal")
-            self._signal[key] = Signal(self.richtung(richtung), signal_xml_knoten) if signal_xml_knoten is not None else None
+            signal = Signal(self.richtung(richtung), signal_xml_knoten) if signal_xml_knoten is not None else None
+            with _sperre:
+                if not self._signal_gesucht[key]:
+                    self._signal[key] = signal
+                    self._signal_gesucht[key] = True
         return self._signal[key]
 
+    # Bitmaske der Eigenschaften des Elements, anhand derer die Streckengraphen entscheiden, ob es ein Knoten ist (KNOTEN_* in konstanten.py).
+    # Wird einmal pro Element bestimmt und von allen Graphen und Fahrstrassentypen gemeinsam genutzt.
+    def knotenklassen(self):
+        if self._knotenklassen is None:
+            result = 0
+            if self.anzahl_nachfolger(NORM) > 1:
+                result |= KNOTEN_WEICHE_NORM
+            if self.anzahl_nachfolger(GEGEN) > 1:
+                result |= KNOTEN_WEICHE_GEGEN
+            for richtung in [NORM, GEGEN]:
+                signal = self.signal(richtung)
+                if signal is not None:
+                    result |= signal.knotenklassen()
+            if any(refpunkt.reftyp == REFTYP_AUFGLEISPUNKT for refpunkt in self.modul.referenzpunkte[self]):
+                result |= KNOTEN_AUFGLEISPUNKT
+            self._knotenklassen = result
+        return self._knotenklassen
+
     def refpunkt(self, richtung, typ):
         for refpunkt in self.modul.referenzpunkte[self]:
             if refpunkt.element_richtung.richtung == richtung and refpunkt.reftyp == typ:
@@ -102,58 +136,124 @@ class Element:
         return False
 
     def pos_xy(self, richtung):
-        tag = "b" if richtung == NORM else "g"
-        for n in self.xml_knoten:
-            if n.tag == tag:
-                return (float(n.get("X", 0)), float(n.get("Y", 0)))
-        return (0, 0)
+        koordinaten = self.koordinaten()
+        if richtung == NORM:
+            return (koordinaten[0], koordinaten[1])
+        else:
+            return (koordinaten[3], koordinaten[4])
+
+    def anschluss(self):
+        return int(self.xml_knoten.get("Anschluss", 0))
+
+    # Gibt die Nachfolger in der angegebenen Richtung so zurueck, wie sie in der Moduldatei stehen, als Liste von Paaren (Nr, Modulpfad).
+    # Modulpfad None: Nr ist die Nummer eines Streckenelements in diesem Modul.
+    # Ansonsten ist Nr eine Referenzpunkt-Nummer im angegebenen Modul (leerer Pfad = dieses Modul).
+    # Die Nachfolger aller Elemente eines Moduls werden beim Laden des Moduls einmal eingelesen (siehe elementspeicher.Adjazenz).
+    def nachfolger_roh(self, richtung):
+        return self.modul.adjazenz.nachfolger_roh(self.idx, richtung)
+
+    # Liest die Nachfolger in Norm- und Gegenrichtung aus einem <StrElement>-Knoten (Format wie nachfolger_roh).
+    @staticmethod
+    def xml_nachfolger(xml_knoten):
+        result = ([], [])
+        for n in xml_knoten:
+            if n.tag == "NachNorm" or n.tag == "NachGegen":
+                result[0 if n.tag == "NachNorm" else 1].append((int(n.get("Nr", 0)), None))
+            elif n.tag == "NachNormModul" or n.tag == "NachGegenModul":
+                datei = n.find("./Datei")
+                result[0 if n.tag == "NachNormModul" else 1].append((int(n.get("Nr", 0)), datei.get("Dateiname", "") if datei is not None else ""))
+        return result
+
+    # Anzahl der Nachfolger in der angegebenen Richtung, ohne dass Nachfolger in anderen Modulen geladen werden.
+    def anzahl_nachfolger(self, richtung):
+        return self.modul.adjazenz.anzahl_nachfolger(self.idx, richtung)
 
     def nachfolger(self, richtung):
         key = 1 if richtung == NORM else 0
         if self._nachfolger[key] is None:
-            anschluss = int(self.xml_knoten.get("Anschluss", 0))
+            adjazenz = self.modul.adjazenz
+            nachfolger = []
 
-            nachfolger_knoten = [n for n in self.xml_knoten if
-                (richtung == NORM and (n.tag == "NachNorm" or n.tag == "NachNormModul")) or
-                (richtung == GEGEN and (n.tag == "NachGegen" or n.tag == "NachGegenModul"))]
-            self._nachfolger[key] = []
-
-            for idx, n in enumerate(nachfolger_knoten):
-                anschluss_shift = idx + (8 if richtung == GEGEN else 0)
-                if "Modul" not in n.tag:
-                    nach_modul = self.modul
-                    try:
-                        nach_el = nach_modul.streckenelemente[int(n.get("Nr", 0))]
-                    except KeyError:
-                        self._nachfolger[key].append(None)
+            for k in adjazenz.bereich(self.idx, richtung):
+                if adjazenz.modul[k] < 0:
+                    if adjazenz.idx[k] < 0:
+                        nachfolger.append(None)
                         continue
-                    nach_richtung = NORM if (anschluss >> anschluss_shift) & 1 == 0 else GEGEN
-                    self._nachfolger[key].append(ElementUndRichtung(nach_el, nach_richtung))
+                    nach_el = self.modul.streckenelemente[adjazenz.nr[k]]
+                    nachfolger.append(nach_el.richtung(NORM if adjazenz.richtung[k] else GEGEN))
                 else:
-                    nach_modul = modulverwaltung.get_modul_aus_dateiknoten(n, self.modul)
+                    nach_modul = modulverwaltung.get_modul_by_name(adjazenz.modulpfade[adjazenz.modul[k]], self.modul)
                     if nach_modul is None:
-                        self._nachfolger[key].append(None)
+                        nachfolger.append(None)
                         continue
 
                     try:
-                        nach_ref = nach_modul.referenzpunkte_by_nr[int(n.get("Nr", 0))]
+                        nach_ref = nach_modul.referenzpunkte_by_nr[adjazenz.nr[k]]
                     except KeyError:
-                        self._nachfolger[key].append(None)
+                        nachfolger.append(None)
                         continue
 
-                    self._nachfolger[key].append(nach_ref.element_richtung.gegenrichtung())  # Referenzpunkt zeigt zur Modulschnittstelle hin
+                    nachfolger.append(nach_ref.element_richtung.gegenrichtung())  # Referenzpunkt zeigt zur Modulschnittstelle hin
 
+            return _einmal_eintragen(self._nachfolger, key, nachfolger)
         return self._nachfolger[key]
 
     def vorgaenger(self, richtung):
-        return [(e.gegenrichtung() if e is not None else None) for e in self.nachfolger(GEGEN if richtung == NORM else NORM)]
+        key = 1 if richtung == NORM else 0
+        if self._vorgaenger[key] is None:
+            return _einmal_eintragen(self._vorgaenger, key, [(e.gegenrichtung() if e is not None else None) for e in self.nachfolger(GEGEN if richtung == NORM else NORM)])
+        return self._vorgaenger[key]
+
+# Ein Streckenelement eines nur gelesenen Moduls als Sicht auf einen Eintrag im Elementspeicher des Moduls (siehe elementspeicher.py).
+# Es existiert kein XML-Knoten; Signale werden erst bei Bedarf aus ihrer gespeicherten XML-Darstellung gelesen.
+class SpeicherElement(Element):
+    __slots__ = ('speicher',)
+
+    def __init__(self, modul, idx, nr=None):
+        self.speicher = modul.elementspeicher
+        super().__init__(modul, None, self.speicher.nr[idx])
+
+    def koordinaten(self):
+        return (self.speicher.b_x[self.idx], self.speicher.b_y[self.idx], self.speicher.b_z[self.idx],
+                self.speicher.g_x[self.idx], self.speicher.g_y[self.idx], self.speicher.g_z[self.idx])
+
+    def laenge(self):
+        return self.speicher.laenge[self.idx]
+
+    def anschluss(self):
+        return self.speicher.anschluss[self.idx]
+
+    def pos_xy(self, richtung):
+        if richtung == NORM:
+            return (self.speicher.b_x[self.idx], self.speicher.b_y[self.idx])
+        else:
+            return (self.speicher.g_x[self.idx], self.speicher.g_y[self.idx])
+
+    def ereignisse(self, richtung):
+        result = (self.speicher.ereignisse_norm if richtung == NORM else self.speicher.ereignisse_gegen)[self.idx]
+        return result if result is not None else []
+
+    def registernr(self, richtung):
+        return (self.speicher.reg_norm if richtung == NORM else self.speicher.reg_gegen)[self.idx]
+
+    def hat_koppelweiche(self, richtung):
+        return (self.speicher.koppelweiche_norm if richtung == NORM else self.speicher.koppelweiche_gegen)[self.idx] != 0
+
+    def signal(self, richtung):
+        key = 1 if richtung == NORM else 0
+        if not self._signal_gesucht[key]:
+            self._signal_gesucht[key] = True
+            signal_xml = (self.speicher.signale_norm if richtung == NORM else self.speicher.signale_gegen)[self.idx]
+            if signal_xml is not None:
+                self._signal[key] = Signal(self.richtung(richtung), ET.fromstring(signal_xml))
+        return self._signal[key]
 
 class ElementUndRichtung(namedtuple('ElementUndRichtung', ['element', 'richtung'])):
     def __repr__(self):
         if self.element.modul == modulverwaltung.dieses_modul:
-            return self.element.xml_knoten.get("Nr", "0") + ("b" if self.richtung == NORM else "g")
+            return str(self.element.nr) + ("b" if self.richtung == NORM else "g")
         else:
-            return "{}{}[{}]".format(self.element.xml_knoten.get("Nr", "0"), "b" if self.richtung == NORM else "g", self.element.modul.name_kurz())
+            return "{}{}[{}]".format(self.element.nr, "b" if self.richtung == NORM else "g", self.element.modul.name_kurz())
 
     def laenge(self):
         return self.element.laenge()
@@ -174,7 +274,7 @@ class ElementUndRichtung(namedtuple('ElementUndRichtung', ['element', 'richtung'
         return self.element.ereignisse(self.richtung)
 
     def gegenrichtung(self):
-        return ElementUndRichtung(self.element, GEGEN if self.richtung == NORM else NORM)
+        return self.element.richtung(GEGEN if self.richtung == NORM else NORM)
 
     def nachfolger(self):
         return self.element.nachfolger(self.richtung)
@@ -196,6 +296,10 @@ def geschw_kleiner(v1, v2):
         return False
     return v1 < v2
 
+# Sortierschluessel mit derselben Ordnung wie geschw_kleiner: Negative Geschwindigkeiten sind groesser als alle anderen.
+def geschw_schluessel(v):
+    return (v < 0, v)
+
 str_geschw = lambda v : "oo<{:.0f}>".format(v) if v < 0 else "{:.0f}".format(v * 3.6)
 
 float_geschw = lambda v : float("Infinity") if v < 0 else v
@@ -204,26 +308,19 @@ SignalZeile = namedtuple('SignalZeile', ['fahrstr_typ', 'hsig_geschw'])
 SignalZelle = namedtuple('SignalZelle', ['naechste_vorsignalgeschwindigkeit', 'node'])
 
 class Signal:
+    # Liest nur die Zeilen und Spalten sowie die Angaben, die fuer die Einordnung als Knoten der Streckengraphen noetig sind.
+    # Die Matrixeintraege werden erst gelesen, wenn das Signal tatsaechlich angesteuert wird (siehe _lies_matrix).
     def __init__(self, element_richtung, xml_knoten):
         self.element_richtung = element_richtung
         self.xml_knoten = xml_knoten
+        self._matrix = None  # wird von _lies_matrix gesetzt, ebenso die uebrigen Attribute hinter den Properties unten
 
         self.betrst = self.xml_knoten.get("NameBetriebsstelle", "")
         self.name = self.xml_knoten.get("Signalname", "")
 
         self.zeilen = []
         self.spalten = []
-        self.matrix = []
-        self.signalgeschwindigkeit = None
-        self.zs3signalgeschwindigkeiten = []
-        self.ist_hilfshauptsignal = False
         self.ist_gleissperre = False
-
-        self.regelgleisanzeiger = 0 # Signalbild-ID
-        self.gegengleisanzeiger = 0 # Signalbild-ID
-        self.hat_gegengleisanzeiger_in_ersatzsignalmatrix = False
-        self.richtungsanzeiger = defaultdict(int) # Ziel-> Signalbild-ID
-        self.richtungsvoranzeiger = defaultdict(int) # Ziel -> Signalbild-ID
         self.hat_sigframes = False # Hat das Signal ueberhaupt Landschaftsdateien?
         self.hat_ersatzsignal = False
 
@@ -234,6 +331,17 @@ class Signal:
 
         self.vsig_verkn_warnung = False # Wurde Warnung ausgegeben?
 
+        # Zwischengespeicherte Ergebnisse von get_hsig_zeile und get_vsig_spalte sowie die Suchtabellen dafuer
+        # (siehe _get_hsig_tabelle und _get_vsig_tabelle), werden beim Erweitern der Matrix geleert.
+        self._hsig_zeilen = dict()  # (Fahrstrassentyp, Zielgeschwindigkeit) -> (Zeile, Kennlichtzeile als Fahrstrassenzeile genutzt)
+        self._vsig_spalten = dict()  # Zielgeschwindigkeit -> Spalte
+        self._hsig_tabellen = dict()  # Fahrstrassentyp -> Suchtabelle
+        self._vsig_tabelle = None
+
+        # Fuer get_richtungsanzeiger_zeile und get_richtungsvoranzeiger_spalte, werden bei Bedarf angelegt.
+        self._zeilen_index = None  # (Fahrstrassentyp, Hsig-Geschwindigkeit, Signalbild der ersten Spalte) -> erste passende Zeile
+        self._spalten_index = None  # (Vsig-Geschwindigkeit, Signalbild der ersten Zeile) -> erste passende Spalte
+
         for n in self.xml_knoten:
             if n.tag == "HsigBegriff":
                 fahrstr_typ = int(n.get("FahrstrTyp", 0))
@@ -248,82 +356,164 @@ class Signal:
             elif n.tag == "SignalFrame":
                 self.hat_sigframes = True
             elif n.tag == "MatrixEintrag":
+                if not self.ist_gleissperre:
+                    self.ist_gleissperre = any(int(ereignis.get("Er", 0)) == EREIGNIS_ENTGLEISEN and float(ereignis.get("Wert", 0)) == 0
+                            for ereignis in kinder(n, "Ereignis"))
+            elif n.tag == "Ersatzsignal":
+                self.hat_ersatzsignal = True
+
+    # Aus der Signalmatrix gelesene Angaben (siehe _lies_matrix)
+    @property
+    def matrix(self):
+        if self._matrix is None:
+            self._lies_matrix()
+        return self._matrix
+
+    @property
+    def signalgeschwindigkeit(self):
+        if self._matrix is None:
+            self._lies_matrix()
+        return self._signalgeschwindigkeit
+
+    @property
+    def zs3signalgeschwindigkeiten(self):
+        if self._matrix is None:
+            self._lies_matrix()
+        return self._zs3signalgeschwindigkeiten
+
+    @property
+    def ist_hilfshauptsignal(self):
+        if self._matrix is None:
+            self._lies_matrix()
+        return self._ist_hilfshauptsignal
+
+    @property
+    def regelgleisanzeiger(self):
+        if self._matrix is None:
+            self._lies_matrix()
+        return self._regelgleisanzeiger
+
+    @property
+    def gegengleisanzeiger(self):
+        if self._matrix is None:
+            self._lies_matrix()
+        return self._gegengleisanzeiger
+
+    @property
+    def hat_gegengleisanzeiger_in_ersatzsignalmatrix(self):
+        if self._matrix is None:
+            self._lies_matrix()
+        return self._hat_gegengleisanzeiger_in_ersatzsignalmatrix
+
+    @property
+    def richtungsanzeiger(self):
+        if self._matrix is None:
+            self._lies_matrix()
+        return self._richtungsanzeiger
+
+    @property
+    def richtungsvoranzeiger(self):
+        if self._matrix is None:
+            self._lies_matrix()
+        return self._richtungsvoranzeiger
+
+    # Die Angaben werden zunaechst lokal gesammelt und erst vollstaendig eingetragen, damit gleichzeitig laufende Suchen
+    # nie eine halb gelesene Matrix sehen. Haben zwei Suchen die Matrix gleichzeitig gelesen, gilt die zuerst eingetragene.
+    def _lies_matrix(self):
+        matrix = []
+        signalgeschwindigkeit = None
+        zs3signalgeschwindigkeiten = []
+        ist_hilfshauptsignal = False
+
+        regelgleisanzeiger = 0 # Signalbild-ID
+        gegengleisanzeiger = 0 # Signalbild-ID
+        hat_gegengleisanzeiger_in_ersatzsignalmatrix = False
+        richtungsanzeiger = defaultdict(int) # Ziel-> Signalbild-ID
+        richtungsvoranzeiger = defaultdict(int) # Ziel -> Signalbild-ID
+
+        for n in self.xml_knoten:
+            if n.tag == "MatrixEintrag":
                 naechste_vorsignalgeschwindigkeit = float(n.get("MatrixGeschw", 0))
-                for ereignis in n:
-                    if ereignis.tag == "Ereignis":
-                        ereignisnr = int(ereignis.get("Er", 0))
-                        beschr = ereignis.get("Beschr", "")
-                        if ereignisnr == EREIGNIS_HILFSHAUPTSIGNAL:
-                            self.ist_hilfshauptsignal = True
-                        elif ereignisnr == EREIGNIS_ENTGLEISEN and float(ereignis.get("Wert", 0)) == 0:
-                            self.ist_gleissperre = True
-                        elif ereignisnr == EREIGNIS_SIGNALGESCHWINDIGKEIT and self.signalgeschwindigkeit is None and beschr != "vsig":
-                            signalgeschwindigkeit = float(ereignis.get("Wert", 0))
-                            if signalgeschwindigkeit != 0:
-                                self.signalgeschwindigkeit = signalgeschwindigkeit
-                        elif ereignisnr == EREIGNIS_SIGNALGESCHWINDIGKEIT and beschr == "vsig":
-                            naechste_vorsignalgeschwindigkeit = float(ereignis.get("Wert", 0))
-                        elif ereignisnr == EREIGNIS_REGELGLEIS:
+                for ereignis in kinder(n, "Ereignis"):
+                    ereignisnr = int(ereignis.get("Er", 0))
+                    beschr = ereignis.get("Beschr", "")
+                    if ereignisnr == EREIGNIS_HILFSHAUPTSIGNAL:
+                        ist_hilfshauptsignal = True
+                    elif ereignisnr == EREIGNIS_SIGNALGESCHWINDIGKEIT and signalgeschwindigkeit is None and beschr != "vsig":
+                        wert = float(ereignis.get("Wert", 0))
+                        if wert != 0:
+                            signalgeschwindigkeit = wert
+                    elif ereignisnr == EREIGNIS_SIGNALGESCHWINDIGKEIT and beschr == "vsig":
+                        naechste_vorsignalgeschwindigkeit = float(ereignis.get("Wert", 0))
+                    elif ereignisnr == EREIGNIS_REGELGLEIS:
+                        signalbegriff_nr = int(float(ereignis.get("Wert", 0)))
+                        if signalbegriff_nr >= 0 and signalbegriff_nr <= 63:
+                            regelgleisanzeiger |= 1 << signalbegriff_nr
+                        else:
+                            zwischenspeicher_log.warning("{}: Matrix enthaelt Ereignis \"Regelgleis kennzeichnen\" mit Signalbegriff-Nr. {}, die nicht im Bereich 0..63 liegt".format(self, signalbegriff_nr))
+                    elif ereignisnr == EREIGNIS_GEGENGLEIS:
+                        signalbegriff_nr = int(float(ereignis.get("Wert", 0)))
+                        if signalbegriff_nr >= 0 and signalbegriff_nr <= 63:
+                            gegengleisanzeiger |= 1 << signalbegriff_nr
+                        else:
+                            zwischenspeicher_log.warning("{}: Matrix enthaelt Ereignis \"Gegengleis kennzeichnen\" mit Signalbegriff-Nr. {}, die nicht im Bereich 0..63 liegt".format(self, signalbegriff_nr))
+                    elif ereignisnr == EREIGNIS_RICHTUNGSANZEIGER_ZIEL:
+                        if len(beschr):
                             signalbegriff_nr = int(float(ereignis.get("Wert", 0)))
                             if signalbegriff_nr >= 0 and signalbegriff_nr <= 63:
-                                self.regelgleisanzeiger |= 1 << signalbegriff_nr
+                                richtungsanzeiger[ereignis.get("Beschr")] |= 1 << signalbegriff_nr
                             else:
-                                logging.warn("{}: Matrix enthaelt Ereignis \"Regelgleis kennzeichnen\" mit Signalbegriff-Nr. {}, die nicht im Bereich 0..63 liegt".format(self, signalbegriff_nr))
-                        elif ereignisnr == EREIGNIS_GEGENGLEIS:
+                                zwischenspeicher_log.warning("{}: Matrix enthaelt Ereignis \"Richtungsanzeiger-Ziel\" mit Signalbegriff-Nr. {}, die nicht im Bereich 0..63 liegt".format(self, signalbegriff_nr))
+                        else:
+                            zwischenspeicher_log.warning("{}: Matrix enthaelt Ereignis \"Richtungsanzeiger-Ziel\" ohne Text".format(self))
+                    elif ereignisnr == EREIGNIS_RICHTUNGSVORANZEIGER:
+                        if len(beschr):
                             signalbegriff_nr = int(float(ereignis.get("Wert", 0)))
                             if signalbegriff_nr >= 0 and signalbegriff_nr <= 63:
-                                self.gegengleisanzeiger |= 1 << signalbegriff_nr
-                            else:
-                                logging.warn("{}: Matrix enthaelt Ereignis \"Gegengleis kennzeichnen\" mit Signalbegriff-Nr. {}, die nicht im Bereich 0..63 liegt".format(self, signalbegriff_nr))
-                        elif ereignisnr == EREIGNIS_RICHTUNGSANZEIGER_ZIEL:
-                            if len(beschr):
-                                signalbegriff_nr = int(float(ereignis.get("Wert", 0)))
-                                if signalbegriff_nr >= 0 and signalbegriff_nr <= 63:
-                                    self.richtungsanzeiger[ereignis.get("Beschr")] |= 1 << signalbegriff_nr
-                                else:
-                                    logging.warn("{}: Matrix enthaelt Ereignis \"Richtungsanzeiger-Ziel\" mit Signalbegriff-Nr. {}, die nicht im Bereich 0..63 liegt".format(self, signalbegriff_nr))
+                                richtungsvoranzeiger[ereignis.get("Beschr")] |= 1 << signalbegriff_nr
                             else:
-                                logging.warn("{}: Matrix enthaelt Ereignis \"Richtungsanzeiger-Ziel\" ohne Text".format(self))
-                        elif ereignisnr == EREIGNIS_RICHTUNGSVORANZEIGER:
-                            if len(beschr):
-                                signalbegriff_nr = int(float(ereignis.get("Wert", 0)))
-                                if signalbegriff_nr >= 0 and signalbegriff_nr <= 63:
-                                    self.richtungsvoranzeiger[ereignis.get("Beschr")] |= 1 << signalbegriff_nr
-                                else:
-                                    logging.warn("{}: Matrix enthaelt Ereignis \"Richtungsvoranzeiger\" mit Signalbegriff-Nr. {}, die nicht im Bereich 0..63 liegt".format(self, signalbegriff_nr))
-                            else:
-                                logging.warn("{}: Matrix enthaelt Ereignis \"Richtungsvoranzeiger\" ohne Text".format(self))
-                self.matrix.append(SignalZelle(naechste_vorsignalgeschwindigkeit, n))
+                                zwischenspeicher_log.warning("{}: Matrix enthaelt Ereignis \"Richtungsvoranzeiger\" mit Signalbegriff-Nr. {}, die nicht im Bereich 0..63 liegt".format(self, signalbegriff_nr))
+                        else:
+                            zwischenspeicher_log.warning("{}: Matrix enthaelt Ereignis \"Richtungsvoranzeiger\" ohne Text".format(self))
+                matrix.append(SignalZelle(naechste_vorsignalgeschwindigkeit, n))
             elif n.tag == "Ersatzsignal":
-                self.hat_ersatzsignal = True
-                for matrixeintrag in n:
-                    if matrixeintrag.tag == "MatrixEintrag":
-                        for ereignis in matrixeintrag:
-                            if ereignis.tag == "Ereignis":
-                                ereignisnr = int(ereignis.get("Er", 0))
-                                if ereignisnr == EREIGNIS_GEGENGLEIS:
-                                    self.hat_gegengleisanzeiger_in_ersatzsignalmatrix = True
-                                    break
-                        if self.hat_gegengleisanzeiger_in_ersatzsignalmatrix:
+                for matrixeintrag in kinder(n, "MatrixEintrag"):
+                    for ereignis in kinder(matrixeintrag, "Ereignis"):
+                        ereignisnr = int(ereignis.get("Er", 0))
+                        if ereignisnr == EREIGNIS_GEGENGLEIS:
+                            hat_gegengleisanzeiger_in_ersatzsignalmatrix = True
                             break
+                    if hat_gegengleisanzeiger_in_ersatzsignalmatrix:
+                        break
 
         vsigeintraege = len(self.spalten)
         signalv = -1
-        for n in self.matrix:
+        for n in matrix:
             vsigeintraege -= 1
-            for ereignis in n.node:
-                if ereignis.tag == "Ereignis":
-                    ereignisnr = int(ereignis.get("Er", 0))
-                    beschr = ereignis.get("Beschr", "")
-                    if ereignisnr == EREIGNIS_SIGNALGESCHWINDIGKEIT and beschr != "vsig":
-                        signalgeschwindigkeit = float(ereignis.get("Wert", 0))
-                        if signalgeschwindigkeit != 0:
-                            signalv = geschw_min(signalv, signalgeschwindigkeit)
+            for ereignis in kinder(n.node, "Ereignis"):
+                ereignisnr = int(ereignis.get("Er", 0))
+                beschr = ereignis.get("Beschr", "")
+                if ereignisnr == EREIGNIS_SIGNALGESCHWINDIGKEIT and beschr != "vsig":
+                    wert = float(ereignis.get("Wert", 0))
+                    if wert != 0:
+                        signalv = geschw_min(signalv, wert)
             if vsigeintraege == 0:
-                self.zs3signalgeschwindigkeiten.append(signalv)
+                zs3signalgeschwindigkeiten.append(signalv)
                 vsigeintraege = len(self.spalten)
                 signalv = -1
-        self.zs3signalgeschwindigkeiten.append(signalv)
+        zs3signalgeschwindigkeiten.append(signalv)
+
+        with _sperre:
+            if self._matrix is None:
+                self._signalgeschwindigkeit = signalgeschwindigkeit
+                self._zs3signalgeschwindigkeiten = zs3signalgeschwindigkeiten
+                self._ist_hilfshauptsignal = ist_hilfshauptsignal
+                self._regelgleisanzeiger = regelgleisanzeiger
+                self._gegengleisanzeiger = gegengleisanzeiger
+                self._hat_gegengleisanzeiger_in_ersatzsignalmatrix = hat_gegengleisanzeiger_in_ersatzsignalmatrix
+                self._richtungsanzeiger = richtungsanzeiger
+                self._richtungsvoranzeiger = richtungsvoranzeiger
+                self._matrix = matrix  # zuletzt, die Properties pruefen anhand von _matrix, ob die Matrix gelesen wurde
 
     def __repr__(self):
         if self.betrst == "" and self.name == "":
@@ -334,6 +524,28 @@ class Signal:
     def signalbeschreibung(self):
         return "{} {}".format(self.betrst, self.name)
 
+    def _get_zeilen_index(self):
+        if self._zeilen_index is None:
+            index = dict()
+            for idx, zeile in enumerate(self.zeilen):
+                index.setdefault((zeile.fahrstr_typ, zeile.hsig_geschw, int(self.matrix[idx * len(self.spalten)].node.get("Signalbild", 0))), idx)
+            self._zeilen_index = index
+        return self._zeilen_index
+
+    def _get_spalten_index(self):
+        if self._spalten_index is None:
+            index = dict()
+            for idx, vsig_geschw in enumerate(self.spalten):
+                index.setdefault((vsig_geschw, int(self.matrix[idx].node.get("Signalbild", 0))), idx)
+            self._spalten_index = index
+        return self._spalten_index
+
+    # Kopie des angegebenen Matrixeintrags, dessen Signalbild um die angegebenen Signalframes erweitert ist.
+    @staticmethod
+    def _erweiterter_eintrag(eintrag, neue_signalframes):
+        return SignalZelle(eintrag.naechste_vorsignalgeschwindigkeit,
+                kopie_mit_attribut(eintrag.node, "Signalbild", str(int(eintrag.node.get("Signalbild", 0)) | neue_signalframes)))
+
     def matrix_geschw(self, zeile, spalte):
         return self.matrix[zeile * len(self.spalten) + spalte].naechste_vorsignalgeschwindigkeit
 
@@ -356,6 +568,22 @@ class Signal:
         return self.ist_hsig_fuer_fahrstr_typ(FAHRSTR_TYP_RANGIER | FAHRSTR_TYP_ZUG | FAHRSTR_TYP_ANZEIGE) and (
             any(zeile.fahrstr_typ & fahrstr_typ != 0 and (self.hat_ersatzsignal or zeile.hsig_geschw != 0) for zeile in self.zeilen))
 
+    # Beitrag des Signals zu Element.knotenklassen
+    def knotenklassen(self):
+        result = 0
+        if self.hsig_fuer != 0:
+            result |= KNOTEN_HSIG_BELIEBIG
+        if self.ist_gleissperre:
+            result |= KNOTEN_GLEISSPERRE
+        for fahrstr_typ in [FAHRSTR_TYP_FAHRWEG, FAHRSTR_TYP_RANGIER, FAHRSTR_TYP_ZUG, FAHRSTR_TYP_ANZEIGE]:
+            if self.ist_hsig_fuer_fahrstr_typ(fahrstr_typ):
+                result |= knoten_hsig(fahrstr_typ)
+            if self.ist_zusatzsignal_fuer_fahrstr_typ(fahrstr_typ):
+                result |= knoten_zusatzsignal(fahrstr_typ)
+            if self.ist_fahrstr_start_sig(fahrstr_typ):
+                result |= knoten_startsignal(fahrstr_typ)
+        return result
+
     def ist_vsig(self):
         # Anders als in der Doku angegeben, ist fuer Zusi anscheinend nur relevant, ob das Signal eine
         # Spalte fuer Geschwindigkeit != -1 hat, also auf die Geschwindigkeit des naechsten Hauptsignals
@@ -366,42 +594,50 @@ class Signal:
     # Das ist normalerweise die Zeile mit der passenden oder naechstkleineren Geschwindigkeit, die groesser als 0 ist.
     # Wenn solche eine Zeile nicht existiert, wird die Zeile mit der naechstgroesseren Geschwindigkeit genommen.
     # Richtungs- und Gegengleisanzeiger werden nicht betrachtet.
-    def get_hsig_zeile(self, fahrstr_typ, zielgeschwindigkeit):
+    # meldung: Funktion (Level, Text) zur Ausgabe von Meldungen
+    def get_hsig_zeile(self, fahrstr_typ, zielgeschwindigkeit, meldung=logging.log):
         assert zielgeschwindigkeit != 0
-        zeile_kleinergleich, geschw_kleinergleich = None, 0
-        zeile_groesser, geschw_groesser = None, -1
+        key = (fahrstr_typ, zielgeschwindigkeit)
+        try:
+            result, kennlichtzeile = self._hsig_zeilen[key]
+        except KeyError:
+            result, kennlichtzeile = self._hsig_zeilen.setdefault(key, self._suche_hsig_zeile(fahrstr_typ, zielgeschwindigkeit))
+        if kennlichtzeile:
+            meldung(logging.WARNING, "{}: Nutze Kennlichtzeile {} (Geschwindigkeit -2) als regulaere Fahrstrassenzeile fuer Fahrstrassentyp {} (Geschwindigkeit {})".format(self, result, str_fahrstr_typ(fahrstr_typ), str_geschw(zielgeschwindigkeit)))
+        return result
 
+    # Suchtabelle fuer get_hsig_zeile: (sortierte Geschwindigkeitsschluessel, jeweils erste Zeile mit dieser Geschwindigkeit,
+    # erste Zeile mit Geschwindigkeit -2) ueber die Zeilen fuer den Fahrstrassentyp.
+    # Zeilen fuer Spezialgeschwindigkeiten werden nicht in die Schluessel aufgenommen.
+    def _get_hsig_tabelle(self, fahrstr_typ):
+        try:
+            return self._hsig_tabellen[fahrstr_typ]
+        except KeyError:
+            pass
+        erste_zeile = dict()  # Geschwindigkeitsschluessel -> Zeile
+        kennlichtzeile = None
         for idx, zeile in enumerate(self.zeilen):
             if zeile.fahrstr_typ & fahrstr_typ == 0:
                 continue
-
-            # Zeilen fuer Spezialgeschwindigkeiten werden nicht betrachtet.
-            if zeile.hsig_geschw == 0.0 or zeile.hsig_geschw == -2.0 or zeile.hsig_geschw == -999.0:
-                continue
-
-            if geschw_kleiner(geschw_kleinergleich, zeile.hsig_geschw) and not geschw_kleiner(zielgeschwindigkeit, zeile.hsig_geschw):
-                # geschw > geschw_kleinergleich und geschw <= zielgeschwindigkeit
-                zeile_kleinergleich = idx
-                geschw_kleinergleich = zeile.hsig_geschw
-
-            elif (zeile_groesser is None or geschw_kleiner(zeile.hsig_geschw, geschw_groesser)) and geschw_kleiner(zielgeschwindigkeit, zeile.hsig_geschw):
-                # geschw < geschw_groesser und geschw > zielgeschwindigkeit
-                zeile_groesser = idx
-                geschw_groesser = zeile.hsig_geschw
-
-        if zeile_kleinergleich is None and zeile_groesser is None:
+            if zeile.hsig_geschw == -2.0:
+                if kennlichtzeile is None:
+                    kennlichtzeile = idx
+            elif zeile.hsig_geschw != 0.0 and zeile.hsig_geschw != -999.0:
+                erste_zeile.setdefault(geschw_schluessel(zeile.hsig_geschw), idx)
+        schluessel = sorted(erste_zeile)
+        return self._hsig_tabellen.setdefault(fahrstr_typ, (schluessel, [erste_zeile[k] for k in schluessel], kennlichtzeile))
+
+    # Gibt (Zeile, Kennlichtzeile als Fahrstrassenzeile genutzt) zurueck, siehe get_hsig_zeile.
+    def _suche_hsig_zeile(self, fahrstr_typ, zielgeschwindigkeit):
+        schluessel, zeilen, kennlichtzeile = self._get_hsig_tabelle(fahrstr_typ)
+        if not schluessel:
             # WORKAROUND zur Kompatibilitaet mit Zusi: Zusi akzeptiert auch Zeile -2 als Hsig-Geschwindigkeit.
-            for idx, zeile in enumerate(self.zeilen):
-                if zeile.fahrstr_typ & fahrstr_typ != 0 and zeile.hsig_geschw == -2.0:
-                    logging.warn("{}: Nutze Kennlichtzeile {} (Geschwindigkeit -2) als regulaere Fahrstrassenzeile fuer Fahrstrassentyp {} (Geschwindigkeit {})".format(self, idx, str_fahrstr_typ(fahrstr_typ), str_geschw(zielgeschwindigkeit)))
-                    return idx
+            return (kennlichtzeile, kennlichtzeile is not None)
 
-        if zeile_kleinergleich is not None:
-            return zeile_kleinergleich
-        else:
-            # Das ist recht normal, falls Signale nicht geschwindigkeitsabhaengig sind (etwa alleinstehende Zs oder GUe)
-            # logging.warn("{}: Nutze Zeile {} (Geschwindigkeit {}) fuer Fahrstrassengeschwindigkeit {}, weil keine Zeile mit kleinerer Geschwindigkeit != 0 existiert.".format(self, zeile_groesser, str_geschw(geschw_groesser), str_geschw(zielgeschwindigkeit)))
-            return zeile_groesser
+        # Zeile mit der groessten Geschwindigkeit <= zielgeschwindigkeit, sonst die mit der kleinsten groesseren Geschwindigkeit.
+        # Das ist recht normal, falls Signale nicht geschwindigkeitsabhaengig sind (etwa alleinstehende Zs oder GUe)
+        pos = bisect_right(schluessel, geschw_schluessel(zielgeschwindigkeit))
+        return (zeilen[pos - 1] if pos > 0 else zeilen[0], False)
 
     # Gibt die Zeile zurueck, die die Zeile Nummer `zeilenidx_original` gemaess dem angegebenen Richtungsanzeiger
     # und der angegebenen Gleisangabe erweitert.
@@ -425,31 +661,38 @@ class Signal:
 
         # Suche existierende Zeile mit dem neuen Signalbild.
         zeile_original = self.zeilen[zeilenidx_original]
-        for idx, zeile in enumerate(self.zeilen):
-            if zeile.fahrstr_typ == zeile_original.fahrstr_typ and zeile.hsig_geschw == zeile_original.hsig_geschw and int(self.matrix[idx * len(self.spalten)].node.get("Signalbild", 0)) == zielsignalbild:
-                return idx
+        zeilen_index = self._get_zeilen_index()
+        key = (zeile_original.fahrstr_typ, zeile_original.hsig_geschw, zielsignalbild)
+        try:
+            return zeilen_index[key]
+        except KeyError:
+            pass
 
         # Nicht gefunden, Matrix erweitern.
 
         # Neuer <HsigBegriff>-Knoten
         self.zeilen.append(self.zeilen[zeilenidx_original])
+        self._hsig_zeilen.clear()
+        self._hsig_tabellen.clear()
         hsig_begriff_knoten = ET.Element("HsigBegriff")
         if self.zeilen[zeilenidx_original].fahrstr_typ != 0:
             hsig_begriff_knoten.set("FahrstrTyp", str(self.zeilen[zeilenidx_original].fahrstr_typ))
         if self.zeilen[zeilenidx_original].hsig_geschw != 0:
             hsig_begriff_knoten.set("HsigGeschw", "{:f}".format(self.zeilen[zeilenidx_original].hsig_geschw).rstrip('0').rstrip('.'))
-        kindknoten_einfuegen(self.xml_knoten, hsig_begriff_knoten, -1)
 
         # Neue <MatrixEintrag>-Knoten
-        for eintrag in self.matrix[zeilenidx_original * len(self.spalten) : (zeilenidx_original+1) * len(self.spalten)]:
-            neuer_eintrag = deepcopy(eintrag)
-            neuer_eintrag.node.set("Signalbild", str(int(neuer_eintrag.node.get("Signalbild", 0)) | neue_signalframes))
-            kindknoten_einfuegen(self.xml_knoten, neuer_eintrag.node, -1)
-            self.matrix.append(neuer_eintrag)
+        neue_eintraege = [self._erweiterter_eintrag(eintrag, neue_signalframes)
+                for eintrag in self.matrix[zeilenidx_original * len(self.spalten) : (zeilenidx_original+1) * len(self.spalten)]]
+        kindknoten_einfuegen(self.xml_knoten, {
+            letzter_kindknoten(self.xml_knoten, "HsigBegriff"): [hsig_begriff_knoten],
+            self.matrix[-1].node: [eintrag.node for eintrag in neue_eintraege],
+        })
+        self.matrix.extend(neue_eintraege)
 
         self.element_richtung.element.modul.geaendert = True
 
         result = len(self.zeilen) - 1
+        zeilen_index[key] = result
         logging.debug("{}: Erweitere Signalmatrix: Neue Zeile {} als Kopie von Zeile {} fuer Gleisangabe \"{}\" und Richtungsanzeiger-Ziel \"{}\"".format(self, result, zeilenidx_original, str_rgl_ggl(rgl_ggl), richtungsanzeiger_ziel))
         return result
 
@@ -463,32 +706,50 @@ class Signal:
     # Gibt die Matrixspalte zurueck, die in diesem Signal fuer die gegebene Geschwindigkeit angesteuert werden soll.
     # Das ist die Zeile mit der passenden oder naechstkleineren Geschwindigkeit.
     def get_vsig_spalte(self, zielgeschwindigkeit):
-        if zielgeschwindigkeit == 0:
-            try:
-                return self.spalten.index(0)
-            except ValueError:
-                return None
+        try:
+            return self._vsig_spalten[zielgeschwindigkeit]
+        except KeyError:
+            return self._vsig_spalten.setdefault(zielgeschwindigkeit, self._suche_vsig_spalte(zielgeschwindigkeit))
+
+    # Suchtabelle fuer get_vsig_spalte: (sortierte Geschwindigkeitsschluessel, jeweils erste Spalte mit dieser Geschwindigkeit,
+    # erste Spalte mit Geschwindigkeit 0, erste Spalte mit Geschwindigkeit -2).
+    # Die Spalten mit Geschwindigkeit 0 und -2 werden nicht in die Schluessel aufgenommen.
+    def _get_vsig_tabelle(self):
+        if self._vsig_tabelle is None:
+            erste_spalte = dict()  # Geschwindigkeitsschluessel -> Spalte
+            nullspalte, kennlichtspalte = None, None
+            for idx, vsig_geschw in enumerate(self.spalten):
+                if vsig_geschw == 0:
+                    if nullspalte is None:
+                        nullspalte = idx
+                elif vsig_geschw == -2.0:
+                    if kennlichtspalte is None:
+                        kennlichtspalte = idx
+                else:
+                    erste_spalte.setdefault(geschw_schluessel(vsig_geschw), idx)
+            schluessel = sorted(erste_spalte)
+            self._vsig_tabelle = (schluessel, [erste_spalte[k] for k in schluessel], nullspalte, kennlichtspalte)
+        return self._vsig_tabelle
 
-        spalte_kleinergleich, geschw_kleinergleich = None, 0
+    def _suche_vsig_spalte(self, zielgeschwindigkeit):
+        schluessel, spalten, nullspalte, kennlichtspalte = self._get_vsig_tabelle()
+        if zielgeschwindigkeit == 0:
+            return nullspalte
 
-        for idx, vsig_geschw in enumerate(self.spalten):
-            # Spalten fuer die Spezialgeschwindigkeit -2 werden nur betrachtet, wenn tatsaechlich nach dieser Geschwindigkeit gesucht wird.
-            if vsig_geschw == -2.0:
-                if zielgeschwindigkeit == -2.0:
-                    return idx
-                continue
+        # Spalten fuer die Spezialgeschwindigkeit -2 werden nur betrachtet, wenn tatsaechlich nach dieser Geschwindigkeit gesucht wird.
+        if zielgeschwindigkeit == -2.0 and kennlichtspalte is not None:
+            return kennlichtspalte
 
-            if (geschw_kleiner(geschw_kleinergleich, vsig_geschw) and not geschw_kleiner(zielgeschwindigkeit, vsig_geschw)) or \
-                    (spalte_kleinergleich is None and vsig_geschw == 0):
-                # geschw > geschw_kleinergleich und geschw <= zielgeschwindigkeit
-                spalte_kleinergleich = idx
-                geschw_kleinergleich = vsig_geschw
+        # Spalte mit der groessten Geschwindigkeit <= zielgeschwindigkeit, sonst die Spalte mit Geschwindigkeit 0.
+        pos = bisect_right(schluessel, geschw_schluessel(zielgeschwindigkeit))
+        if pos > 0:
+            return spalten[pos - 1]
 
-        if spalte_kleinergleich is not None and geschw_kleinergleich == 0 and spalte_kleinergleich != 0 and not self.vsig_verkn_warnung:
-            logging.warn("{}: Spalte mit Geschwindigkeit 0 ist nicht erste Spalte, dies wuerde im 3D-Editor momentan zu einer fehlerhaften Vorsignalverknuepfung fuehren.".format(self))
+        if nullspalte is not None and nullspalte != 0 and not self.vsig_verkn_warnung:
+            zwischenspeicher_log.warning("{}: Spalte mit Geschwindigkeit 0 ist nicht erste Spalte, dies wuerde im 3D-Editor momentan zu einer fehlerhaften Vorsignalverknuepfung fuehren.".format(self))
             self.vsig_verkn_warnung = True
 
-        return spalte_kleinergleich
+        return nullspalte
 
     # Gibt die Spalte zurueck, die die Spalte Nummer `spaltenidx_original` gemaess dem angegebenen Richtungsanzeiger-Ziel
     # und der angegebenen Gleisangabe erweitert.
@@ -511,9 +772,12 @@ class Signal:
         zielsignalbild = int(self.matrix[spaltenidx_original].node.get("Signalbild", 0)) | neue_signalframes
 
         # Suche existierende Spalte mit dem neuen Signalbild.
-        for idx, vsig_geschw in enumerate(self.spalten):
-            if vsig_geschw == self.spalten[spaltenidx_original] and int(self.matrix[idx].node.get("Signalbild", 0)) == zielsignalbild:
-                return idx
+        spalten_index = self._get_spalten_index()
+        key = (self.spalten[spaltenidx_original], zielsignalbild)
+        try:
+            return spalten_index[key]
+        except KeyError:
+            pass
 
         # Nicht gefunden. Matrix erweitern.
         assert len(self.matrix) == len(self.zeilen) * len(self.spalten)
@@ -522,20 +786,26 @@ class Signal:
         vsig_begriff_knoten = ET.Element("VsigBegriff")
         if self.spalten[spaltenidx_original] != 0:
             vsig_begriff_knoten.set("VsigGeschw", "{:f}".format(self.spalten[spaltenidx_original]).rstrip('0').rstrip('.'))
-        kindknoten_einfuegen(self.xml_knoten, vsig_begriff_knoten, -1)
+        einfuegungen = {letzter_kindknoten(self.xml_knoten, "VsigBegriff"): [vsig_begriff_knoten]}
 
-        # Neue <MatrixEintrag>-Knoten
+        # Neue <MatrixEintrag>-Knoten, jeweils am Ende jeder Zeile
+        matrix = []
         for idx in range(0, len(self.zeilen)):
-            neuer_eintrag = deepcopy(self.matrix[idx * (len(self.spalten) + 1) + spaltenidx_original])
-            neuer_eintrag.node.set("Signalbild", str(int(neuer_eintrag.node.get("Signalbild", 0)) | neue_signalframes))
-            neuer_eintrag_idx = idx * (len(self.spalten) + 1) + (len(self.spalten) - 1)
-            kindknoten_einfuegen(self.xml_knoten, neuer_eintrag.node, neuer_eintrag_idx)
-            self.matrix.insert(neuer_eintrag_idx + 1, neuer_eintrag)
+            zeile = self.matrix[idx * len(self.spalten) : (idx+1) * len(self.spalten)]
+            neuer_eintrag = self._erweiterter_eintrag(zeile[spaltenidx_original], neue_signalframes)
+            einfuegungen[zeile[-1].node] = [neuer_eintrag.node]
+            matrix.extend(zeile)
+            matrix.append(neuer_eintrag)
+        kindknoten_einfuegen(self.xml_knoten, einfuegungen)
+        self._matrix = matrix
 
         self.element_richtung.element.modul.geaendert = True
 
         self.spalten.append(self.spalten[spaltenidx_original])
+        self._vsig_spalten.clear()
+        self._vsig_tabelle = None
         result = len(self.spalten) - 1
+        spalten_index[key] = result
         logging.debug("{}: Erweitere Signalmatrix: Neue Spalte {} als Kopie von Spalte {} fuer Gleisangabe \"{}\" und Richtungsvoranzeiger-Ziel \"{}\"".format(self, result, spaltenidx_original, str_rgl_ggl(rgl_ggl), richtungsanzeiger_ziel))
         return result
 
@@ -630,9 +900,43 @@ def _escape(txt):
 
 # Schreibt eine Streckendatei im selben Format wie Zusi, um Diffs zu minimieren:
 # Keine Einrueckung, Attributreihenfolge gleich, Zeilenende CR+LF.
-def writeuglyxml(fp, elem):
+# Der Baum wird ohne Rekursion durchlaufen, die Ausgabe wird blockweise in die Datei geschrieben.
+# anhaengen: {Element: Datei} -- der Inhalt der (binaer geoeffneten) Datei wird als letztes Kind des Elements ausgegeben.
+def writeuglyxml(fp, elem, anhaengen=None):
+    if anhaengen is None:
+        anhaengen = {}
     buf = []
-    do_writeuglyxml(elem, buf)
+    stapel = [iter([elem])]  # Iteratoren ueber die Kindknoten der offenen Knoten
+    offen = []  # Offene Knoten
+    while len(stapel):
+        for kind in stapel[-1]:
+            try:
+                attrib_order = st3_attrib_order[kind.tag]
+            except KeyError:
+                attrib_order = []
+
+            buf.append(u"<{}".format(kind.tag))
+            buf.extend([u" {}=\"{}\"".format(k, _escape(v)) for k, v in sorted(kind.items(), key = lambda i: index_or_9999(attrib_order, i[0]))])
+            if len(kind) or kind in anhaengen:
+                buf.append(u">\r\n")
+                stapel.append(iter(kind))
+                offen.append(kind)
+                break
+            else:
+                buf.append(u"/>\r\n")
+        else:
+            stapel.pop()
+            if len(offen):
+                knoten = offen.pop()
+                if knoten in anhaengen:
+                    fp.write(''.join(buf).encode("utf-8"))
+                    buf = []
+                    shutil.copyfileobj(anhaengen[knoten], fp)
+                buf.append(u"</{}>\r\n".format(knoten.tag))
+
+        if len(buf) >= 8192:
+            fp.write(''.join(buf).encode("utf-8"))
+            buf = []
     fp.write(''.join(buf).encode("utf-8"))
 
 def index_or_9999(l, elem):
@@ -640,19 +944,3 @@ def index_or_9999(l, elem):
         return l.index(elem)
     except ValueError:
         return 9999
-
-def do_writeuglyxml(elem, buf):
-    try:
-        attrib_order = st3_attrib_order[elem.tag]
-    except KeyError:
-        attrib_order = []
-
-    buf.append(u"<{}".format(elem.tag))
-    buf.extend([u" {}=\"{}\"".format(k, _escape(v)) for k, v in sorted(elem.items(), key = lambda i: index_or_9999(attrib_order, i[0]))])
-    if len(elem):
-      buf.append(u">\r\n")
-      for child in elem:
-        do_writeuglyxml(child, buf)
-      buf.append(u"</{}>\r\n".format(elem.tag))
-    else:
-      buf.append(u"/>\r\n")
@@ -1,6 +1,6 @@
 #!/usr/bin/env python3
 
-import xml.etree.ElementTree as ET
+from .xmlbackend import ET
 from collections import namedtuple, defaultdict, OrderedDict
 
 from . import strecke
@@ -8,20 +8,26 @@ from .konstanten import *
 from .strecke import *
 
 import logging
+import threading
 
 # Ein Graph, der eine Strecke auf der untersten uns interessierenden Ebene beschreibt:
 # Knoten sind Elemente mit Weichenfunktion oder, je nach Unterklasse, weiteren Charakteristiken (z.B. Hauptsignal).
+# knoten_maske: Elemente, deren Knotenklassen (siehe Element.knotenklassen) eines dieser Bits enthalten, sind Knoten.
+# Mehrere Suchen duerfen gleichzeitig (aus verschiedenen Threads) auf demselben Graphen laufen: Der Besucht-Zustand
+# liegt in einer Besuchsmarkierung pro Suche (siehe neue_suche), Knoten und zwischengespeicherte Knotendaten
+# werden pro Element bzw. Schluessel nur einmal eingetragen (siehe get_knoten und zwischenspeichern).
 class Streckengraph:
-    def __init__(self):
+    def __init__(self, knoten_maske=KNOTEN_WEICHE):
         self._knoten = {}  # <StrElement> -> Knoten
-        self._besuchszaehler = 1  # Ein Knoten gilt als besucht, wenn sein Besuchszaehler gleich dem Besuchszaehler des Graphen ist. Alle Knoten koennen durch Inkrementieren des Besuchszaehlers als unbesucht markiert werden.
+        self.knoten_maske = knoten_maske
+        self._sperre = threading.Lock()
 
-    def markiere_unbesucht(self):
-        self._besuchszaehler += 1
+    # Gibt eine neue Besuchsmarkierung zurueck, in der alle Knoten als unbesucht gelten.
+    def neue_suche(self):
+        return Besuchsmarkierung()
 
     def _ist_knoten(self, element):
-        return len([n for n in element.xml_knoten if n.tag == "NachNorm" or n.tag == "NachNormModul"]) > 1 or \
-                len([n for n in element.xml_knoten if n.tag == "NachGegen" or n.tag == "NachGegenModul"]) > 1
+        return element is not None and element.knotenklassen() & self.knoten_maske != 0
 
     def _neuer_knoten(self, element):
         raise NotImplementedError("Abstrakte Methode aufgerufen")
@@ -31,15 +37,33 @@ class Streckengraph:
             return self._knoten[element]
         except KeyError:
             result = self._neuer_knoten(element) if self._ist_knoten(element) else None
-            self._knoten[element] = result
-            return result
+            # Haben zwei Threads gleichzeitig einen Knoten angelegt, gewinnt der zuerst eingetragene.
+            return self._knoten.setdefault(element, result)
+
+    # Traegt den (ohne Sperre berechneten) Wert unter speicher[key] ein, falls dort noch None steht,
+    # und gibt den eingetragenen Wert zurueck. Alle Threads erhalten dadurch dasselbe Objekt.
+    def zwischenspeichern(self, speicher, key, wert):
+        with self._sperre:
+            if speicher[key] is None:
+                speicher[key] = wert
+            return speicher[key]
+
+# Besuchte Knoten einer Suche im Streckengraphen.
+class Besuchsmarkierung:
+    def __init__(self):
+        self._besucht = set()
+
+    def ist_besucht(self, knoten):
+        return knoten in self._besucht
+
+    def markiere_besucht(self, knoten):
+        self._besucht.add(knoten)
 
 # Ein Knoten im Streckengraphen ist ein relevantes Streckenelement, also eines, das eine Weiche oder etwas anderweitig Relevantes enthaelt.
 class Knoten:
     def __init__(self, graph, element):
         self.graph = graph  # Streckengraph
         self.element = element  # Element
-        self._besuchszaehler = self.graph._besuchszaehler - 1  # Dokumentation siehe Streckengraph._besuchszaehler
 
     def __repr__(self):
         return "Knoten<{}>".format(repr(self.element))
@@ -47,12 +71,6 @@ class Knoten:
     def __str__(self):
         return str(self.element)
 
-    def ist_besucht(self):
-        return self._besuchszaehler >= self.graph._besuchszaehler
-
-    def markiere_besucht(self):
-        self._besuchszaehler = self.graph._besuchszaehler
-
     def richtung(self, richtung):
         return KnotenUndRichtung(self, richtung)
 
@@ -70,7 +88,7 @@ class KnotenUndRichtung(namedtuple('KnotenUndRichtung', ['knoten', 'richtung']))
         return str(self.knoten) + ("b" if self.richtung == NORM else "g")
 
     def element_und_richtung(self):
-        return ElementUndRichtung(self.knoten.element, self.richtung)
+        return self.knoten.element.richtung(self.richtung)
 
     def signal(self):
         return self.knoten.element.signal(self.richtung)
@@ -2,27 +2,18 @@
 
 from .konstanten import *
 from .streckengraph import Streckengraph, Knoten
-from .strecke import ist_hsig_fuer_fahrstr_typ, ist_fahrstr_start_sig, ist_vsig, geschw_min
+from .strecke import ist_hsig_fuer_fahrstr_typ, ist_fahrstr_start_sig, ist_vsig, geschw_min, zwischenspeicher_log
 
-import logging
 
 # Ein Streckengraph, der zum Finden von Vorsignalen von Fahrstrassen dient.
 # Knoten sind zusaetzlich Zugfahrt-Hauptsignale.
 class VorsignalGraph(Streckengraph):
     def __init__(self):
-        super().__init__()
+        super().__init__(KNOTEN_WEICHE | knoten_hsig(FAHRSTR_TYP_ZUG) | knoten_startsignal(FAHRSTR_TYP_ZUG))
 
     def _neuer_knoten(self, element):
         return VorsignalGraphKnoten(self, element)
 
-    def _ist_knoten(self, element):
-        return element is not None and (
-                super()._ist_knoten(element) or
-                ist_hsig_fuer_fahrstr_typ(element.signal(NORM), FAHRSTR_TYP_ZUG) or
-                ist_hsig_fuer_fahrstr_typ(element.signal(GEGEN), FAHRSTR_TYP_ZUG) or
-                ist_fahrstr_start_sig(element.signal(NORM), FAHRSTR_TYP_ZUG) or
-                ist_fahrstr_start_sig(element.signal(GEGEN), FAHRSTR_TYP_ZUG))
-
 # Eine Kante zwischen zwei Knoten im Streckengraphen, die alle Vorsignale auf dem Weg zwischen zwei Knoten (rueckwaerts) enthaelt.
 # Der Zielknoten ist also ein *Vorgaenger* des Startknotens.
 # Der Zielknoten ist None, wenn die Kante an einem Element ohne Vorgaenger oder mit Ereignis "Vorher keine Vsig-Verknuepfung" endet.
@@ -46,8 +37,8 @@ class VorsignalGraphKnoten(Knoten):
     def get_vorsignale(self, richtung):
         key = 0 if richtung == NORM else 1
         if self.vorsignale[key] is None:
-            logging.debug("Suche Vorsignale ab {}".format(self.richtung(richtung)))
-            self.vorsignale[key] = self._get_vorsignale(richtung)
+            zwischenspeicher_log.debug("Suche Vorsignale ab {}".format(self.richtung(richtung)))
+            return self.graph.zwischenspeichern(self.vorsignale, key, self._get_vorsignale(richtung))
         return self.vorsignale[key]
 
     # Gibt alle von diesem Knoten ausgehenden Vorsignalkanten in der angegebenen Richtung zurueck (gesucht wird also in der Gegenrichtung).
@@ -55,12 +46,13 @@ class VorsignalGraphKnoten(Knoten):
         key = 0 if richtung == NORM else 1
         if self.vorsignal_kanten[key] is None:
             # "Vorher keine Vsig-Verknuepfung" im Element selbst hat keine Auswirkung.
-            logging.debug("Suche Vorsignal-Kanten ab {}".format(self.richtung(richtung)))
-            self.vorsignal_kanten[key] = []
+            zwischenspeicher_log.debug("Suche Vorsignal-Kanten ab {}".format(self.richtung(richtung)))
+            vorsignal_kanten = []
             for v in self.element.richtung(richtung).vorgaenger():
                 if v is not None:
                     kante = VorsignalGraphKante()
-                    self.vorsignal_kanten[key].append(self._neue_vorsignal_kante(kante, v))
+                    vorsignal_kanten.append(self._neue_vorsignal_kante(kante, v))
+            return self.graph.zwischenspeichern(self.vorsignal_kanten, key, vorsignal_kanten)
         return self.vorsignal_kanten[key]
 
     # Erweitert die angegebene Vorsignal-Kante, die am Vorgaenger 'element_richtung' dieses Knotens beginnt.
@@ -70,7 +62,7 @@ class VorsignalGraphKnoten(Knoten):
             if signal is not None and (signal.ist_vsig() or len(signal.richtungsvoranzeiger) > 0):
                 refpunkt = element_richtung.refpunkt(REFTYP_SIGNAL)
                 if refpunkt is None:
-                    logging.warn("Element {} enthaelt ein Vorsignal, aber es existiert kein passender Referenzpunkt. Die Vorsignalverknuepfung wird nicht eingerichtet.".format(element_richtung))
+                    zwischenspeicher_log.warning("Element {} enthaelt ein Vorsignal, aber es existiert kein passender Referenzpunkt. Die Vorsignalverknuepfung wird nicht eingerichtet.".format(element_richtung))
                 else:
                     kante.vorsignale.append(refpunkt)
 
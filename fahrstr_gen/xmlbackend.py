@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+
+# XML-Backend fuer das Lesen und Schreiben von Modul- und Bedingungsdateien.
+# Standardmaessig wird xml.etree.ElementTree verwendet. Ueber die Umgebungsvariable FAHRSTR_GEN_XML=lxml laesst sich lxml
+# auswaehlen, falls installiert (z.B. fuer Vergleichsmessungen); beim Laden grosser Module ist ElementTree schneller und sparsamer.
+# Module importieren "ET" von hier statt direkt aus der Standardbibliothek; beide Backends bieten dieselbe Schnittstelle
+# fuer Element, SubElement, parse, fromstring und tostring. Unterschiede werden in den Funktionen unten behandelt.
+
+import os
+from copy import deepcopy
+
+ET = None
+if os.environ.get("FAHRSTR_GEN_XML", "etree") == "lxml":
+    try:
+        from lxml import etree as ET
+    except ImportError:
+        pass
+
+ist_lxml = ET is not None
+if not ist_lxml:
+    import xml.etree.ElementTree as ET
+
+name = "lxml" if ist_lxml else "ElementTree"
+
+# Ausnahme bei fehlerhaftem XML
+ParseError = ET.XMLSyntaxError if ist_lxml else ET.ParseError
+
+# Wie ET.iterparse. Kommentare und Verarbeitungsanweisungen werden wie bei ElementTree nicht in den Baum uebernommen.
+# Die Datei wird selbst geoeffnet, damit eine fehlende Datei auch bei lxml zu FileNotFoundError fuehrt.
+def iterparse(quelle, events):
+    with open(quelle, 'rb') as fp:
+        if ist_lxml:
+            yield from ET.iterparse(fp, events=events, remove_comments=True, remove_pis=True, huge_tree=True)
+        else:
+            yield from ET.iterparse(fp, events=events)
+
+if ist_lxml:
+    # Liste der Kindknoten von "node" mit dem angegebenen Tag.
+    def kinder(node, tag):
+        return list(node.iterchildren(tag))
+
+    # Schnelle Implementierung von node.find("./tag1/tag2"), wenn tag1 nur einmal vorkommen kann.
+    def find_2(node, tag1, tag2):
+        for n in node.iterchildren(tag1):
+            for n2 in n.iterchildren(tag2):
+                return n2
+            break
+
+    # Schnelle Implementierung von node.findall("./tag1/tag2"), wenn tag1 nur einmal vorkommen kann.
+    def findall_2(node, tag1, tag2):
+        for n in node.iterchildren(tag1):
+            return list(n.iterchildren(tag2))
+        return []
+
+    # Kopie von "node", in der das Attribut "name" auf "wert" gesetzt ist. Bei ElementTree werden die Kindknoten nicht kopiert,
+    # sondern mit dem Original geteilt; sie duerfen daher danach nicht mehr veraendert werden (Signalmatrizen werden nach dem
+    # Laden nur noch um neue Knoten erweitert). Bei lxml hat jeder Knoten genau einen Elternknoten, hier wird alles kopiert.
+    def kopie_mit_attribut(node, name, wert):
+        result = deepcopy(node)
+        result.set(name, wert)
+        return result
+
+else:
+    def kinder(node, tag):
+        return [n for n in node if n.tag == tag]
+
+    def find_2(node, tag1, tag2):
+        for n in node:
+            if n.tag == tag1:
+                for n2 in n:
+                    if n2.tag == tag2:
+                        return n2
+                break
+
+    def findall_2(node, tag1, tag2):
+        for n in node:
+            if n.tag == tag1:
+                return [n2 for n2 in n if n2.tag == tag2]
+        return []
+
+    def kopie_mit_attribut(node, name, wert):
+        result = ET.Element(node.tag, node.attrib)
+        result.set(name, wert)
+        result.text = node.text
+        result.tail = node.tail
+        result.extend(node)
+        return result
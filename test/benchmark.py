@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+
+# Laufzeitmessungen fuer einzelne Teile der Fahrstrassengenerierung auf synthetischen Daten.
+# Aufruf: python3 benchmark.py [Abschnitt ...] (ohne Angabe werden alle Abschnitte ausgefuehrt)
+
+import argparse
+import io
+import logging
+import math
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+from fahrstr_gen import modulverwaltung
+
+def messe(beschreibung, funktion, wiederholungen=1):
+    start = time.perf_counter()
+    for _ in range(wiederholungen):
+        result = funktion()
+    dauer = (time.perf_counter() - start) / wiederholungen
+    print("  {:<50} {:10.2f} ms".format(beschreibung, dauer * 1000))
+    return result
+
+# Zaehlt Aufrufe von Dateisystemfunktionen waehrend der Ausfuehrung von "funktion".
+def zaehle_dateisystemzugriffe(funktion):
+    zaehler = [0]
+    originale = (os.listdir, os.stat, os.path.exists)
+    def gezaehlt(f):
+        def wrapper(*args, **kwargs):
+            zaehler[0] += 1
+            return f(*args, **kwargs)
+        return wrapper
+    os.listdir, os.stat, os.path.exists = (gezaehlt(f) for f in originale)
+    try:
+        funktion()
+    finally:
+        os.listdir, os.stat, os.path.exists = originale
+    return zaehler[0]
+
+# Bisheriges Verfahren (ohne Verzeichnisindex) zum Vergleich.
+def _path_insensitive_ohne_index(path):
+    if path == '' or os.path.exists(path):
+        return path
+    base = os.path.basename(path)
+    dirname = os.path.dirname(path)
+    if not os.path.exists(dirname):
+        dirname = _path_insensitive_ohne_index(dirname)
+        if not dirname:
+            return
+    try:
+        files = os.listdir(dirname)
+    except OSError:
+        return
+    baselow = base.lower()
+    try:
+        return os.path.join(dirname, next(fl for fl in files if fl.lower() == baselow))
+    except StopIteration:
+        return
+
+def benchmark_pfade(args):
+    print("Pfadaufloesung ohne Beachtung der Gross-/Kleinschreibung ({} Ebenen, {} Eintraege pro Verzeichnis)".format(args.tiefe, args.breite))
+    zufall = random.Random(1)
+    basis = tempfile.mkdtemp()
+    try:
+        dateien = []
+        def lege_an(verzeichnis, tiefe):
+            for i in range(args.breite):
+                name = "Eintrag{}_{}".format(tiefe, i)
+                pfad = os.path.join(verzeichnis, name)
+                if tiefe == args.tiefe:
+                    open(pfad + ".st3", 'w').close()
+                    dateien.append(os.path.relpath(pfad + ".st3", basis))
+                else:
+                    os.mkdir(pfad)
+                    lege_an(pfad, tiefe + 1)
+        lege_an(basis, 1)
+
+        # Zusi-Pfade in beliebiger Schreibweise, wie sie in Moduldateien vorkommen.
+        anfragen = [os.path.join(basis, "".join(c.upper() if zufall.random() < 0.5 else c.lower() for c in d))
+                for d in zufall.sample(dateien, min(args.anzahl, len(dateien)))]
+        print("  {} Dateien, {} Anfragen".format(len(dateien), len(anfragen)))
+
+        def ohne_index():
+            for a in anfragen:
+                assert _path_insensitive_ohne_index(a) is not None
+
+        def mit_index():
+            for a in anfragen:
+                assert modulverwaltung._path_insensitive(a) is not None
+
+        def leere_caches():
+            modulverwaltung.path_insensitive_cache.clear()
+            modulverwaltung.verzeichnis_index.clear()
+
+        messe("ohne Index", ohne_index)
+        leere_caches()
+        messe("mit Index (Index wird aufgebaut)", mit_index)
+        messe("mit Index (Index vorhanden)", mit_index, 10)
+        modulverwaltung.path_insensitive_cache.clear()
+        messe("mit Index (ohne Pfad-Cache)", mit_index, 10)
+
+        print("  Dateisystemzugriffe ohne Index: {}".format(zaehle_dateisystemzugriffe(ohne_index)))
+        leere_caches()
+        print("  Dateisystemzugriffe mit Index (Index wird aufgebaut): {}".format(zaehle_dateisystemzugriffe(mit_index)))
+        modulverwaltung.path_insensitive_cache.clear()
+        print("  Dateisystemzugriffe mit Index (Index vorhanden): {}".format(zaehle_dateisystemzugriffe(mit_index)))
+    finally:
+        shutil.rmtree(basis)
+        leere_caches()
+
+# Bisheriges Verfahren (Laenge und Position pro Element aus dem XML-Knoten) zum Vergleich.
+def _laenge_bisher(xml_knoten):
+    b_knoten = xml_knoten.find("b")
+    g_knoten = xml_knoten.find("g")
+    p1 = [float(b_knoten.get("X", 0)), float(b_knoten.get("Y", 0)), float(b_knoten.get("Z", 0))]
+    p2 = [float(g_knoten.get("X", 0)), float(g_knoten.get("Y", 0)), float(g_knoten.get("Z", 0))]
+    return math.sqrt((p1[0]-p2[0])**2 + (p1[1]-p2[1])**2 + (p1[2]-p2[2])**2)
+
+def _pos_xy_bisher(xml_knoten, tag):
+    for n in xml_knoten:
+        if n.tag == tag:
+            return (float(n.get("X", 0)), float(n.get("Y", 0)))
+    return (0, 0)
+
+# Element.laenge und Element.pos_xy lesen die Koordinaten beim ersten Aufruf aus dem XML-Knoten (xml_koordinaten)
+# und speichern sie im Element. Verglichen wird mit dem bisherigen Verfahren (find bei jedem Aufruf) und mit einer
+# Vorberechnung aller Elemente beim Laden des Moduls, die nicht verwendet wird: Von Nachbarmodulen wird meist nur
+# ein kleiner Teil der Elemente befahren, und fuer Module aus dem Modul-Cache liegen die Koordinaten und Laengen
+# ohnehin spaltenweise vor (elementspeicher.ElementSpeicher).
+def benchmark_geometrie(args):
+    from fahrstr_gen.elementspeicher import xml_koordinaten, koordinaten_laenge
+
+    print("Laengen und Positionen der Streckenelemente ({} Elemente)".format(args.elemente))
+    zufall = random.Random(1)
+    strecke = ET.Element("Strecke")
+    for nr in range(1, args.elemente + 1):
+        knoten = ET.SubElement(strecke, "StrElement", {"Nr": str(nr)})
+        for tag in ["b", "g"]:
+            ET.SubElement(knoten, tag, dict((a, "{:.3f}".format(zufall.uniform(-5000, 5000))) for a in ["X", "Y", "Z"]))
+        ET.SubElement(knoten, "InfoNormRichtung", {"vMax": "16.6667"})
+        ET.SubElement(knoten, "NachNorm", {"Nr": str(nr + 1)})
+        ET.SubElement(knoten, "NachGegen", {"Nr": str(nr - 1)})
+    knoten = list(strecke)
+    aufrufe = 3  # Aufrufe von laenge bzw. pos_xy pro Element
+
+    def bisher():
+        for _ in range(aufrufe):
+            for k in knoten:
+                _laenge_bisher(k)
+                _pos_xy_bisher(k, "b")
+                _pos_xy_bisher(k, "g")
+
+    def bei_bedarf(anteil):
+        zwischenspeicher = dict()
+        for _ in range(aufrufe):
+            for k in knoten[:int(len(knoten) * anteil)]:
+                try:
+                    koordinaten, laenge = zwischenspeicher[k]
+                except KeyError:
+                    koordinaten = xml_koordinaten(k)
+                    koordinaten, laenge = zwischenspeicher.setdefault(k, (koordinaten, koordinaten_laenge(*koordinaten)))
+                (koordinaten[0], koordinaten[1])
+                (koordinaten[3], koordinaten[4])
+
+    def vorberechnung():
+        alle_koordinaten = [xml_koordinaten(k) for k in knoten]
+        laengen = [koordinaten_laenge(*k) for k in alle_koordinaten]
+        for _ in range(aufrufe):
+            for idx in range(len(knoten)):
+                koordinaten, laenge = alle_koordinaten[idx], laengen[idx]
+                (koordinaten[0], koordinaten[1])
+                (koordinaten[3], koordinaten[4])
+
+    messe("Bisher: find bei jedem Aufruf ({} Aufrufe)".format(aufrufe), bisher)
+    messe("Bei Bedarf gelesen, alle Elemente", lambda: bei_bedarf(1))
+    messe("Bei Bedarf gelesen, 10% der Elemente", lambda: bei_bedarf(0.1))
+    messe("Vorberechnung beim Laden (nicht verwendet)", vorberechnung)
+    assert all(koordinaten_laenge(*xml_koordinaten(k)) == _laenge_bisher(k) for k in knoten)
+
+def _schreibe_synthetisches_modul(dateiname, anzahl):
+    zufall = random.Random(1)
+    with open(dateiname, 'w', encoding='utf-8', newline='') as fp:
+        fp.write('<?xml version="1.0" encoding="UTF-8"?>\r\n<Zusi>\r\n<Info DateiTyp="Strecke" Version="A.1" MinVersion="A.1"/>\r\n<Strecke>\r\n')
+        for nr in range(1, anzahl + 1):
+            fp.write('<StrElement Nr="{}" Anschluss="0">\r\n'.format(nr))
+            for tag in ["b", "g"]:
+                fp.write('<{} X="{:.3f}" Y="{:.3f}" Z="{:.3f}"/>\r\n'.format(tag, *(zufall.uniform(-5000, 5000) for _ in range(3))))
+            fp.write('<InfoNormRichtung vMax="16.6667" Reg="{}">\r\n<Ereignis Er="{}" Wert="1"/>\r\n</InfoNormRichtung>\r\n'.format(nr % 100, 1000 + nr % 50))
+            fp.write('<NachNorm Nr="{}"/>\r\n<NachGegen Nr="{}"/>\r\n</StrElement>\r\n'.format(nr + 1, nr - 1))
+        for nr in range(1, anzahl + 1, 100):
+            fp.write('<ReferenzElemente ReferenzNr="{}" StrElement="{}" StrNorm="1" RefTyp="2"/>\r\n'.format(nr, nr))
+        for nr in range(1, anzahl + 1, 10):
+            fp.write('<Fahrstrasse FahrstrName="F{}">\r\n'.format(nr) + '<FahrstrRegister Ref="{}"/>\r\n'.format(nr) * 10 + '</Fahrstrasse>\r\n')
+        fp.write('</Strecke>\r\n</Zusi>\r\n')
+
+# Das XML-Backend wird beim Import von fahrstr_gen.xmlbackend festgelegt,
+# daher wird jedes Backend in einem eigenen Prozess (mit gesetzter Umgebungsvariable FAHRSTR_GEN_XML) gemessen.
+def benchmark_xml(args):
+    if "FAHRSTR_GEN_XML" not in os.environ:
+        for backend in ["etree", "lxml"]:
+            subprocess.run([sys.executable, os.path.abspath(__file__), "xml", "--elemente", str(args.elemente)],
+                    env=dict(os.environ, FAHRSTR_GEN_XML=backend), check=True)
+        return
+
+    from fahrstr_gen import xmlbackend
+    from fahrstr_gen.strecke import writeuglyxml
+
+    print("XML-Backend {} ({} Elemente im synthetischen Modul)".format(xmlbackend.name, args.elemente))
+    test_verzeichnis = os.path.dirname(os.path.abspath(__file__))
+    routen = sorted(os.path.join(test_verzeichnis, "routes", st3) for st3 in os.listdir(os.path.join(test_verzeichnis, "routes")))
+    basis = tempfile.mkdtemp()
+    try:
+        synthetisch = os.path.join(basis, "Synthetisch.st3")
+        _schreibe_synthetisches_modul(synthetisch, args.elemente)
+
+        def lese(dateien, vollstaendig=True):
+            return [modulverwaltung.Modul(d, os.path.basename(d), vollstaendig=vollstaendig) for d in dateien]
+
+        def schreibe(module):
+            for m in module:
+                writeuglyxml(io.BytesIO(), m.root)
+
+        def generiere():
+            for st3 in routen:
+                subprocess.run([sys.executable, os.path.join(test_verzeichnis, "..", "fahrstr_gen.py"), "--modus=vergleiche", "--modulcache=aus", st3],
+                        env=dict(os.environ, ZUSI3_DATAPATH=test_verzeichnis), stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        module = messe("Lesen Teststrecken ({} Dateien)".format(len(routen)), lambda: lese(routen), 5)
+        messe("Schreiben Teststrecken", lambda: schreibe(module), 5)
+        messe("Generierung Teststrecken (je ein Prozess)", generiere)
+        messe("Lesen synthetisches Modul als Nachbarmodul", lambda: lese([synthetisch], False))
+        module = messe("Lesen synthetisches Modul", lambda: lese([synthetisch]))
+        messe("Schreiben synthetisches Modul", lambda: schreibe(module))
+    finally:
+        shutil.rmtree(basis)
+
+# Aufbau der Kanten aller Fahrstrassengraphen (Rangier, Zug, Anzeige) der Teststrecken,
+# mit eigenem Segmentgraphen pro Typ bzw. einem gemeinsamen Segmentgraphen.
+def benchmark_segmente(args):
+    from fahrstr_gen.fahrstr_graph import FahrstrGraph
+    from fahrstr_gen.segment_graph import SegmentGraph, SEGMENT_FAHRSTR_TYPEN
+    from fahrstr_gen.konstanten import NORM, GEGEN
+
+    test_verzeichnis = os.path.dirname(os.path.abspath(__file__))
+    os.environ["ZUSI3_DATAPATH"] = test_verzeichnis
+    logging.disable(logging.CRITICAL)
+    module = []
+    for st3 in sorted(os.listdir(os.path.join(test_verzeichnis, "routes"))):
+        modulverwaltung.module = dict()
+        modul = modulverwaltung.get_modul_by_name(modulverwaltung.get_zusi_relpath(os.path.join(test_verzeichnis, "routes", st3)), "", vollstaendig=True)
+        modulverwaltung.lade_nachbarmodule(modul, 1)
+        module.append((modul, modulverwaltung.module))
+
+    def baue_kanten(gemeinsam):
+        anzahl = 0
+        for modul, alle_module in module:
+            modulverwaltung.module = alle_module
+            segment_graph = SegmentGraph() if gemeinsam else None
+            for fahrstr_typ in SEGMENT_FAHRSTR_TYPEN:
+                graph = FahrstrGraph(fahrstr_typ, segment_graph)
+                for element in modul.streckenelemente.values():
+                    knoten = graph.get_knoten(element)
+                    if knoten is not None:
+                        for richtung in [NORM, GEGEN]:
+                            anzahl += len(knoten.get_nachfolger_kanten(richtung))
+        return anzahl
+
+    print("Kanten der Fahrstrassengraphen ({} Teststrecken)".format(len(module)))
+    anzahl_getrennt = messe("Eigener Segmentgraph pro Fahrstrassentyp", lambda: baue_kanten(False), 5)
+    anzahl_gemeinsam = messe("Gemeinsamer Segmentgraph", lambda: baue_kanten(True), 5)
+    assert anzahl_getrennt == anzahl_gemeinsam
+
+abschnitte = {
+    'pfade': benchmark_pfade,
+    'geometrie': benchmark_geometrie,
+    'xml': benchmark_xml,
+    'segmente': benchmark_segmente,
+}
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Laufzeitmessungen fuer fahrstr_gen')
+    parser.add_argument('abschnitte', nargs='*', help="Auszufuehrende Abschnitte: {} (Standard: alle)".format(", ".join(abschnitte.keys())))
+    parser.add_argument('--tiefe', type=int, default=4, help="Verzeichnistiefe fuer Abschnitt \"pfade\"")
+    parser.add_argument('--breite', type=int, default=10, help="Eintraege pro Verzeichnis fuer Abschnitt \"pfade\"")
+    parser.add_argument('--anzahl', type=int, default=2000, help="Anzahl aufzuloesender Pfade fuer Abschnitt \"pfade\"")
+    parser.add_argument('--elemente', type=int, default=100000, help="Anzahl Streckenelemente fuer Abschnitte \"geometrie\" und \"xml\"")
+    args = parser.parse_args()
+    for abschnitt in args.abschnitte:
+        if abschnitt not in abschnitte:
+            parser.error("Unbekannter Abschnitt: {}".format(abschnitt))
+
+    for abschnitt in (args.abschnitte or abschnitte.keys()):
+        abschnitte[abschnitt](args)
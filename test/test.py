@@ -5,6 +5,10 @@ import os
 import subprocess
 import sys
 import re
+import tempfile
+
+# Fuer die Tests, die fahrstr_gen direkt (ohne Unterprozess) aufrufen
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
 
 class TestFahrstrGen(unittest.TestCase):
     def run_fahrstr_gen(self, st3, args=[]):  # return: (retcode, output)
@@ -85,6 +89,14 @@ class TestFahrstrGen(unittest.TestCase):
         (retcode, stderr) = self.run_fahrstr_gen("AlternativeFahrwegeBahnsteigkreuzung.st3", ["--alternative_fahrwege"])
         self.assertEqual(retcode, 0)
 
+    def test_max_fahrstrassen(self):
+        (retcode, stderr) = self.run_fahrstr_gen("AlternativeFahrwegeBahnsteigkreuzung.st3", ["--alternative_fahrwege", "--max_fahrstrassen=1"])
+        self.assertEqual(retcode, 1)
+        self.assertIn("Die Fahrstrassensuche wird abgebrochen", stderr)
+
+        (retcode, stderr) = self.run_fahrstr_gen("AlternativeFahrwegeBahnsteigkreuzung.st3", ["--alternative_fahrwege", "--max_fahrstrassen=100"])
+        self.assertEqual(retcode, 0)
+
     def test_signalgeschwindigkeit_anzeigegefuehrt(self):
         (retcode, stderr) = self.run_fahrstr_gen("SignalgeschwindigkeitAnzeigegefuehrt.st3")
         self.assertEqual(retcode, 0)
@@ -117,6 +129,17 @@ class TestFahrstrGen(unittest.TestCase):
             "Fahrstrasse Anfang A -> Cstadt C (TypZug) existiert in Zusi nicht",
             ]))
 
+    def test_modulcache(self):
+        with tempfile.TemporaryDirectory() as cache_verzeichnis:
+            for modulcache in ["neu", "an"]:
+                (retcode, stderr) = self.run_fahrstr_gen("WeicheAnModulgrenzeModulA3.st3", [f"--modulcache={modulcache}", "--cache_verzeichnis", cache_verzeichnis])
+                self.assertEqual(retcode, 2)
+                self.assertSetEqual(self.get_vergleich_resultat(stderr), set([
+                    "Fahrstrasse Anfang A -> Bheim B (TypZug) existiert in Zusi nicht",
+                    "Fahrstrasse Anfang A -> Cstadt C (TypZug) existiert in Zusi nicht",
+                    ]))
+                self.assertNotEqual(len(os.listdir(cache_verzeichnis)), 0)
+
     def test_zs2_dunkel_in_anzeigefahrstrasse(self):
         (retcode, stderr) = self.run_fahrstr_gen("Zs2DunkelInAnzeigefahrstrasse.st3")
         self.assertEqual(retcode, 0)
@@ -149,6 +172,337 @@ class TestFahrstrGen(unittest.TestCase):
         (retcode, stderr) = self.run_fahrstr_gen("Regelgleisanzeiger.st3")
         self.assertEqual(retcode, 0)
 
+    # Aus dem Modul-Cache geladene Module muessen dieselben Daten liefern wie aus der Moduldatei geladene.
+    def test_modulcache_elemente(self):
+        import xml.etree.ElementTree as ET
+        from fahrstr_gen import modulverwaltung, modulcache
+        from fahrstr_gen.konstanten import NORM, GEGEN
+
+        with tempfile.TemporaryDirectory() as cache_verzeichnis:
+            for st3 in sorted(os.listdir("routes")):
+                dateiname = os.path.join("routes", st3)
+                modul_xml = modulverwaltung.Modul(dateiname, st3)
+                modulcache.schreibe(cache_verzeichnis, modul_xml)
+                cache_daten = modulcache.lese(cache_verzeichnis, dateiname)
+                if modul_xml.vollstaendig:
+                    self.assertIs(cache_daten, True)
+                    continue
+                modul_cache = modulverwaltung.Modul(dateiname, st3, cache_daten=cache_daten)
+
+                self.assertEqual(modul_cache.utm(), modul_xml.utm())
+                self.assertEqual(modul_cache.referenzelemente, modul_xml.referenzelemente)
+                self.assertEqual(list(modul_cache.streckenelemente), list(modul_xml.streckenelemente))
+                for nr in modul_xml.streckenelemente:
+                    element_xml = modul_xml.streckenelemente[nr]
+                    element_cache = modul_cache.streckenelemente[nr]
+                    self.assertEqual(element_cache.laenge(), element_xml.laenge())
+                    self.assertEqual(element_cache.anschluss(), element_xml.anschluss())
+                    for richtung in [NORM, GEGEN]:
+                        self.assertEqual(element_cache.pos_xy(richtung), element_xml.pos_xy(richtung))
+                        self.assertEqual(element_cache.nachfolger_roh(richtung), element_xml.nachfolger_roh(richtung))
+                        self.assertEqual(element_cache.registernr(richtung), element_xml.registernr(richtung))
+                        self.assertEqual(element_cache.hat_koppelweiche(richtung), element_xml.hat_koppelweiche(richtung))
+                        self.assertEqual([dict(e.items()) for e in element_cache.ereignisse(richtung)], [dict(e.items()) for e in element_xml.ereignisse(richtung)])
+                        signal_cache, signal_xml = element_cache.signal(richtung), element_xml.signal(richtung)
+                        self.assertEqual(signal_cache is None, signal_xml is None)
+                        if signal_xml is not None:
+                            self.assertEqual(ET.tostring(signal_cache.xml_knoten).rstrip(), ET.tostring(signal_xml.xml_knoten).rstrip())
+
+    # Nicht zurueckschreibbare Module behalten nur die benoetigten Knoten, alle anderen den kompletten XML-Baum.
+    def test_modul_laden_verwirft_knoten(self):
+        import xml.etree.ElementTree as ET
+        from fahrstr_gen import modulverwaltung
+        from fahrstr_gen.konstanten import EREIGNIS_REGELGLEIS
+
+        def pruefe(dateiname):
+            modul = modulverwaltung.Modul(dateiname, os.path.basename(dateiname))
+            modul_komplett = modulverwaltung.Modul(dateiname, os.path.basename(dateiname), vollstaendig=True)
+            self.assertEqual(ET.tostring(modul_komplett.root), ET.tostring(ET.parse(dateiname).getroot()))
+            self.assertEqual(list(modul.streckenelemente), list(modul_komplett.streckenelemente))
+            self.assertEqual(modul.referenzelemente, modul_komplett.referenzelemente)
+            if modul.vollstaendig:
+                self.assertEqual(ET.tostring(modul.root), ET.tostring(modul_komplett.root))
+            else:
+                self.assertEqual([k.tag for k in modul.root], ["Strecke"])
+                self.assertTrue(all(k.tag in modulverwaltung.strecke_behaltene_knoten for k in modul.root[0]))
+            return modul
+
+        for st3 in sorted(os.listdir("routes")):
+            if st3.endswith(".st3"):
+                pruefe(os.path.join("routes", st3))
+
+        # Erweiterbare Signalmatrix erst hinter einer (bereits verworfenen) Fahrstrasse
+        with tempfile.TemporaryDirectory() as verzeichnis:
+            dateiname = os.path.join(verzeichnis, "Test.st3")
+            with open(dateiname, "w", encoding="utf-8") as fp:
+                fp.write('<Zusi><Info/><Strecke><StrElement Nr="1"><NachNorm Nr="2"/></StrElement><Fahrstrasse FahrstrName="A"><FahrstrStart Ref="1"/></Fahrstrasse>'
+                    '<StrElement Nr="2"><InfoNormRichtung><Signal><SignalFrame/><MatrixEintrag><Ereignis Er="{}" Wert="1"/></MatrixEintrag></Signal></InfoNormRichtung></StrElement>'
+                    '</Strecke></Zusi>'.format(EREIGNIS_REGELGLEIS))
+            self.assertTrue(pruefe(dateiname).vollstaendig)
+
+    # Zeilen und Spalten aus den Suchtabellen muessen fuer zufaellige Signalmatrizen denen der linearen Suche
+    # (bisheriges Verfahren, siehe zeile_linear und spalte_linear) entsprechen.
+    def test_signal_zeile_spalte_zwischengespeichert(self):
+        import logging
+        import random
+        import warnings
+        import xml.etree.ElementTree as ET
+        from fahrstr_gen.strecke import Signal, SignalZeile, geschw_kleiner
+
+        def zeile_linear(zeilen, fahrstr_typ, zielgeschwindigkeit):
+            zeile_kleinergleich, geschw_kleinergleich = None, 0
+            zeile_groesser, geschw_groesser = None, -1
+            for idx, zeile in enumerate(zeilen):
+                if zeile.fahrstr_typ & fahrstr_typ == 0 or zeile.hsig_geschw in [0.0, -2.0, -999.0]:
+                    continue
+                if geschw_kleiner(geschw_kleinergleich, zeile.hsig_geschw) and not geschw_kleiner(zielgeschwindigkeit, zeile.hsig_geschw):
+                    zeile_kleinergleich, geschw_kleinergleich = idx, zeile.hsig_geschw
+                elif (zeile_groesser is None or geschw_kleiner(zeile.hsig_geschw, geschw_groesser)) and geschw_kleiner(zielgeschwindigkeit, zeile.hsig_geschw):
+                    zeile_groesser, geschw_groesser = idx, zeile.hsig_geschw
+            if zeile_kleinergleich is None and zeile_groesser is None:
+                for idx, zeile in enumerate(zeilen):
+                    if zeile.fahrstr_typ & fahrstr_typ != 0 and zeile.hsig_geschw == -2.0:
+                        return idx
+            return zeile_kleinergleich if zeile_kleinergleich is not None else zeile_groesser
+
+        def spalte_linear(spalten, zielgeschwindigkeit):
+            if zielgeschwindigkeit == 0:
+                return spalten.index(0) if 0 in spalten else None
+            spalte_kleinergleich, geschw_kleinergleich = None, 0
+            for idx, vsig_geschw in enumerate(spalten):
+                if vsig_geschw == -2.0:
+                    if zielgeschwindigkeit == -2.0:
+                        return idx
+                    continue
+                if (geschw_kleiner(geschw_kleinergleich, vsig_geschw) and not geschw_kleiner(zielgeschwindigkeit, vsig_geschw)) or \
+                        (spalte_kleinergleich is None and vsig_geschw == 0):
+                    spalte_kleinergleich, geschw_kleinergleich = idx, vsig_geschw
+            return spalte_kleinergleich
+
+        def neues_signal(zeilen, spalten):
+            signal_knoten = ET.Element("Signal")
+            for fahrstr_typ, hsig_geschw in zeilen:
+                ET.SubElement(signal_knoten, "HsigBegriff", {"FahrstrTyp": str(fahrstr_typ), "HsigGeschw": str(hsig_geschw)})
+            for vsig_geschw in spalten:
+                ET.SubElement(signal_knoten, "VsigBegriff", {"VsigGeschw": str(vsig_geschw)})
+            return Signal(None, signal_knoten)
+
+        logging.disable(logging.WARNING)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", DeprecationWarning)  # logging.warn
+                signal = neues_signal([(4, 0), (4, 20), (4, 40), (4, -1), (2, 10), (8, -2)], [0, 20, -1, -2])
+                self.assertEqual([signal.get_hsig_zeile(4, v) for v in [10, 20, 30, 40, 60, -1, -2]], [1, 1, 1, 2, 2, 3, 2])
+                self.assertEqual([signal.get_hsig_zeile(2, v) for v in [5, 10, -1]], [4, 4, 4])
+                self.assertEqual(signal.get_hsig_zeile(8, -1), 5)
+                self.assertEqual(signal.get_hsig_zeile(1, -1), None)
+                self.assertEqual([signal.get_vsig_spalte(v) for v in [0, 10, 20, 60, -1, -2]], [0, 0, 1, 1, 2, 3])
+
+                geschwindigkeiten = [0, -1, -2, -999, 10, 11.111111, 20, 40, 60]
+                zufall = random.Random(1)
+                for _ in range(500):
+                    zeilen = [(zufall.choice([1, 2, 4, 8, 6, 12]), zufall.choice(geschwindigkeiten)) for _ in range(zufall.randint(0, 5))]
+                    spalten = [zufall.choice(geschwindigkeiten) for _ in range(zufall.randint(0, 4))]
+                    signal = neues_signal(zeilen, spalten)
+                    zeilen = [SignalZeile(fahrstr_typ, float(hsig_geschw)) for fahrstr_typ, hsig_geschw in zeilen]
+                    for _ in range(20):
+                        fahrstr_typ = zufall.choice([1, 2, 4, 8])
+                        geschw = zufall.choice(geschwindigkeiten)
+                        if geschw != 0:
+                            self.assertEqual(signal.get_hsig_zeile(fahrstr_typ, geschw), zeile_linear(zeilen, fahrstr_typ, geschw))
+                        self.assertEqual(signal.get_vsig_spalte(geschw), spalte_linear([float(v) for v in spalten], geschw))
+        finally:
+            logging.disable(logging.NOTSET)
+
+    # Erweiterte Zeilen und Spalten muessen an der richtigen Stelle im XML-Baum stehen und beim naechsten Aufruf wiedergefunden werden.
+    def test_signalmatrix_erweitern(self):
+        import types
+        from fahrstr_gen import xmlbackend
+        from fahrstr_gen.strecke import Signal
+        from fahrstr_gen.xmlbackend import ET
+        from fahrstr_gen.konstanten import EREIGNIS_REGELGLEIS, GLEIS_REGELGLEIS
+
+        signal_knoten = ET.fromstring(
+            '<Signal><SignalFrame/><HsigBegriff FahrstrTyp="4"/><HsigBegriff FahrstrTyp="4" HsigGeschw="-1"/><VsigBegriff/><VsigBegriff VsigGeschw="-1"/>'
+            '<MatrixEintrag Signalbild="1"/><MatrixEintrag Signalbild="1"/>'
+            '<MatrixEintrag Signalbild="2"><Ereignis Er="{}" Wert="4"/></MatrixEintrag><MatrixEintrag Signalbild="2"/></Signal>'.format(EREIGNIS_REGELGLEIS))
+        modul = types.SimpleNamespace(geaendert=False)
+        signal = Signal(types.SimpleNamespace(element=types.SimpleNamespace(modul=modul)), signal_knoten)
+
+        self.assertEqual(signal.get_richtungsanzeiger_zeile(1, GLEIS_REGELGLEIS, ""), 2)
+        self.assertEqual(signal.get_richtungsanzeiger_zeile(1, GLEIS_REGELGLEIS, ""), 2)
+        self.assertEqual(signal.get_richtungsvoranzeiger_spalte(1, GLEIS_REGELGLEIS, ""), 2)
+        self.assertEqual(signal.get_richtungsvoranzeiger_spalte(1, GLEIS_REGELGLEIS, ""), 2)
+        self.assertTrue(modul.geaendert)
+
+        self.assertEqual([n.tag for n in signal_knoten], ["SignalFrame"] + ["HsigBegriff"] * 3 + ["VsigBegriff"] * 3 + ["MatrixEintrag"] * 9)
+        self.assertEqual([n.get("Signalbild") for n in signal_knoten if n.tag == "MatrixEintrag"], ["1", "1", "17", "2", "2", "18", "18", "18", "18"])
+        self.assertEqual([n is e.node for n, e in zip((n for n in signal_knoten if n.tag == "MatrixEintrag"), signal.matrix)], [True] * 9)
+        ereignisse = signal_knoten.findall("./MatrixEintrag/Ereignis")
+        self.assertEqual(len(ereignisse), 2)
+        self.assertEqual(dict(ereignisse[0].items()), dict(ereignisse[1].items()))
+        if not xmlbackend.ist_lxml:
+            # Nur der geaenderte Matrixeintrag wird kopiert, seine Kindknoten werden mit dem Original geteilt.
+            self.assertIs(ereignisse[0], ereignisse[1])
+
+    # Zwei gleichzeitig laufende Suchen auf denselben Graphen muessen dieselben Fahrstrassen finden wie eine serielle Suche.
+    def test_gleichzeitige_suchen(self):
+        import threading
+        from unittest import mock
+        from fahrstr_gen import modulverwaltung
+        from fahrstr_gen.konstanten import NORM, GEGEN, FAHRSTR_TYP_ZUG
+        from fahrstr_gen.strecke import ist_fahrstr_start_sig
+        from fahrstr_gen.fahrstr_suche import FahrstrassenSuche
+        from fahrstr_gen.fahrstr_graph import FahrstrGraph
+        from fahrstr_gen.segment_graph import SegmentGraph
+        from fahrstr_gen.vorsignal_graph import VorsignalGraph
+        from fahrstr_gen.flankenschutz_graph import FlankenschutzGraph
+
+        def lade(st3):
+            modulverwaltung.module = dict()
+            modulverwaltung.cache_verzeichnis = None
+            modulverwaltung.dieses_modul = modulverwaltung.get_modul_by_name(
+                    modulverwaltung.get_zusi_relpath(os.path.realpath(os.path.join("routes", st3))), "", vollstaendig=True)
+            graph = FahrstrGraph(FAHRSTR_TYP_ZUG, SegmentGraph())
+            vorsignal_graph, flankenschutz_graph = VorsignalGraph(), FlankenschutzGraph()
+            startpunkte = [(nr, richtung) for nr, element in sorted(modulverwaltung.dieses_modul.streckenelemente.items())
+                    for richtung in [NORM, GEGEN] if ist_fahrstr_start_sig(element.signal(richtung), FAHRSTR_TYP_ZUG)]
+            return graph, vorsignal_graph, flankenschutz_graph, startpunkte
+
+        def suche(graph, vorsignal_graph, flankenschutz_graph, startpunkte, ergebnis):
+            fahrstr_suche = FahrstrassenSuche(FAHRSTR_TYP_ZUG, False, dict(), vorsignal_graph, flankenschutz_graph, [])
+            for nr, richtung in startpunkte:
+                knoten = graph.get_knoten(modulverwaltung.dieses_modul.streckenelemente[nr])
+                if knoten is not None:
+                    ergebnis.extend(f.zu_daten() for f in fahrstr_suche.get_fahrstrassen(knoten, richtung))
+
+        with mock.patch.dict(os.environ, {"ZUSI3_DATAPATH": os.getcwd()}):
+            for st3 in ["AlternativeFahrwegeBahnsteigkreuzung.st3", "FahrstrNummerierungTest.st3", "Zs3Heruntersignalisieren.st3", "VsigV.st3"]:
+                seriell = []
+                suche(*lade(st3), seriell)
+
+                graph, vorsignal_graph, flankenschutz_graph, startpunkte = lade(st3)
+                ergebnisse = [[], []]
+                threads = [threading.Thread(target=suche, args=(graph, vorsignal_graph, flankenschutz_graph, startpunkte, ergebnis))
+                        for ergebnis in ergebnisse]
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+
+                self.assertTrue(len(seriell) > 0)
+                self.assertEqual(ergebnisse[0], seriell)
+                self.assertEqual(ergebnisse[1], seriell)
+
+    # Ohne alternative Fahrwege werden Kanten, die nur zu bereits gefundenen Zielsignalen fuehren, nicht in den
+    # Einzelfahrstrassen-Graphen aufgenommen. Geliefert wird trotzdem die erste Einzelfahrstrasse zu jedem Zielsignal.
+    def test_einzelfahrstrassen_ohne_alternativen(self):
+        from unittest import mock
+        from fahrstr_gen import modulverwaltung
+        from fahrstr_gen.konstanten import NORM, GEGEN, FAHRSTR_TYP_ZUG
+        from fahrstr_gen.strecke import ist_fahrstr_start_sig
+        from fahrstr_gen.fahrstr_suche import FahrstrassenSuche
+        from fahrstr_gen.fahrstr_graph import FahrstrGraph
+        from fahrstr_gen.segment_graph import SegmentGraph
+        from fahrstr_gen.vorsignal_graph import VorsignalGraph
+        from fahrstr_gen.flankenschutz_graph import FlankenschutzGraph
+
+        def anzahl_kanten(einzelfahrstr_graph):
+            return len(einzelfahrstr_graph.startkanten) + sum(len(k) for k in einzelfahrstr_graph.kanten.values())
+
+        with mock.patch.dict(os.environ, {"ZUSI3_DATAPATH": os.getcwd()}):
+            modulverwaltung.module = dict()
+            modulverwaltung.cache_verzeichnis = None
+            modulverwaltung.dieses_modul = modulverwaltung.get_modul_by_name(
+                    modulverwaltung.get_zusi_relpath(os.path.realpath(os.path.join("routes", "AlternativeFahrwegeBahnsteigkreuzung.st3"))), "", vollstaendig=True)
+            graph = FahrstrGraph(FAHRSTR_TYP_ZUG, SegmentGraph())
+            vorsignal_graph, flankenschutz_graph = VorsignalGraph(), FlankenschutzGraph()
+            ohne_alternativen = FahrstrassenSuche(FAHRSTR_TYP_ZUG, False, dict(), vorsignal_graph, flankenschutz_graph, [])
+            mit_alternativen = FahrstrassenSuche(FAHRSTR_TYP_ZUG, True, dict(), vorsignal_graph, flankenschutz_graph, [])
+
+            kanten_ohne, kanten_mit = 0, 0
+            for nr, element in sorted(modulverwaltung.dieses_modul.streckenelemente.items()):
+                for richtung in [NORM, GEGEN]:
+                    if not ist_fahrstr_start_sig(element.signal(richtung), FAHRSTR_TYP_ZUG):
+                        continue
+                    knoten = graph.get_knoten(element)
+                    erste = dict()
+                    for einzelfahrstrasse in mit_alternativen._get_einzelfahrstrassen(knoten, richtung):
+                        erste.setdefault(einzelfahrstrasse.ziel, repr(einzelfahrstrasse))
+                    self.assertEqual([repr(f) for f in ohne_alternativen._get_einzelfahrstrassen(knoten, richtung)], list(erste.values()))
+                    kanten_ohne += anzahl_kanten(ohne_alternativen._get_einzelfahrstrassen(knoten, richtung))
+                    kanten_mit += anzahl_kanten(mit_alternativen._get_einzelfahrstrassen(knoten, richtung))
+
+            self.assertTrue(kanten_ohne < kanten_mit)
+
+    # Die Fahrstrassengenerierung muss mit und ohne Modul-Cache dasselbe Ergebnis liefern.
+    def test_modulcache_identisch(self):
+        with tempfile.TemporaryDirectory() as cache_verzeichnis:
+            for st3 in sorted(os.listdir("routes")):
+                (retcode_xml, stderr_xml) = self.run_fahrstr_gen(st3, ["--modulcache=aus"])
+                for modulcache in ["neu", "an"]:
+                    (retcode, stderr) = self.run_fahrstr_gen(st3, [f"--modulcache={modulcache}", "--cache_verzeichnis", cache_verzeichnis])
+                    self.assertEqual(retcode, retcode_xml)
+                    self.assertSetEqual(self.get_vergleich_resultat(stderr), self.get_vergleich_resultat(stderr_xml))
+
+    # Die Flankenschutz-Stellungen muessen mit und ohne vorab berechnete Flankenschutz-Tabelle dieselben sein.
+    def test_flankenschutz_tabelle_identisch(self):
+        with tempfile.TemporaryDirectory() as cache_verzeichnis:
+            for st3 in sorted(os.listdir("routes")):
+                (retcode_ohne, stderr_ohne) = self.run_fahrstr_gen(st3, ["--flankenschutz", "--modulcache=aus"])
+                for modulcache in ["neu", "an"]:
+                    (retcode, stderr) = self.run_fahrstr_gen(st3, ["--flankenschutz", f"--modulcache={modulcache}", "--cache_verzeichnis", cache_verzeichnis])
+                    self.assertEqual(retcode, retcode_ohne)
+                    self.assertSetEqual(self.get_vergleich_resultat(stderr), self.get_vergleich_resultat(stderr_ohne))
+            # Tabellen gibt es nur fuer Nachbarmodule
+            self.assertTrue(any(f.endswith(".flankenschutz") for f in os.listdir(cache_verzeichnis)))
+
+    # Die Eintraege der Flankenschutz-Tabelle eines Nachbarmoduls muessen den einzeln gesuchten Stellungen entsprechen.
+    def test_flankenschutz_tabelle_nachbarmodul(self):
+        import logging
+        from unittest import mock
+        from fahrstr_gen import modulverwaltung
+        from fahrstr_gen.konstanten import NORM, GEGEN
+        from fahrstr_gen.flankenschutz_graph import FlankenschutzGraph
+
+        def daten(stellungen):
+            return [(w.refpunkt.element_richtung.element.modul.relpath, w.refpunkt.idx, w.weichenlage, w.abstand) for w in stellungen]
+
+        anzahl = 0
+        with mock.patch.dict(os.environ, {"ZUSI3_DATAPATH": os.getcwd()}):
+            for st3 in sorted(os.listdir("routes")):
+                modulverwaltung.module = dict()
+                modulverwaltung.cache_verzeichnis = None
+                modul = modulverwaltung.get_modul_by_name(modulverwaltung.get_zusi_relpath(os.path.realpath(os.path.join("routes", st3))), None)
+                if modul is None or modul.vollstaendig:
+                    continue
+                tabelle, _ = FlankenschutzGraph()._berechne_tabelle(modul)
+                graph = FlankenschutzGraph()
+                for (nr, richtung, idx), eintrag in tabelle.items():
+                    knoten = graph.get_knoten(modul.streckenelemente[nr])
+                    self.assertEqual(eintrag, daten(knoten._get_flankenschutz_stellungen(NORM if richtung == 0 else GEGEN, idx, logging.log)))
+                anzahl += len(tabelle)
+        self.assertTrue(anzahl > 0)
+
+    # Die parallele Fahrstrassensuche muss dasselbe Ergebnis liefern wie die serielle.
+    def test_jobs_identisch(self):
+        for st3 in sorted(os.listdir("routes")):
+            (retcode_seriell, stderr_seriell) = self.run_fahrstr_gen(st3, ["--modulcache=aus"])
+            (retcode, stderr) = self.run_fahrstr_gen(st3, ["--modulcache=aus", "--jobs=3"])
+            self.assertEqual(retcode, retcode_seriell)
+            self.assertSetEqual(self.get_vergleich_resultat(stderr), self.get_vergleich_resultat(stderr_seriell))
+
+    def test_jobs_log_reihenfolge(self):
+        # Meldungen der parallelen Suche erscheinen in derselben Reihenfolge wie bei serieller Suche
+        def meldungen(stderr):
+            return [re.sub("^[0-9]+:", "", line) for line in stderr.splitlines()]
+
+        for st3 in sorted(os.listdir("routes")):
+            (retcode_seriell, stderr_seriell) = self.run_fahrstr_gen(st3, ["--modulcache=aus", "--kompat"])
+            (retcode, stderr) = self.run_fahrstr_gen(st3, ["--modulcache=aus", "--kompat", "--jobs=3"])
+            self.assertEqual(retcode, retcode_seriell)
+            self.assertListEqual(meldungen(stderr), meldungen(stderr_seriell))
+
 
 if __name__ == '__main__':
     unittest.main()